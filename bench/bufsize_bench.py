@@ -0,0 +1,49 @@
+# --                                                            ; {{{1
+#
+# File        : bufsize_bench.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""large download over a socketpair: fixed vs adaptive buffer sizes"""
+
+from __future__ import print_function
+
+import httpony.http as H
+import httpony.stream as S
+import socket
+import sys
+import threading
+import time
+
+SIZE  = int(sys.argv[1]) if len(sys.argv) > 1 else 64 * 1024**2
+DATA  = b"x" * SIZE
+
+def run(name, bufsize, max_size = None):
+  a, b = socket.socketpair()
+  def send():
+    so    = S.OSocketStream(a, bufsize)
+    body  = S.IBytesStream(DATA).readchunks(bufsize, max_size)
+    H.Response(headers = { "Content-Length": SIZE },
+               body = body).unparse_to(so)
+    so.flush()
+  th = threading.Thread(target = send); th.daemon = True
+  t0 = time.time(); th.start(); n = 0
+  resp = next(H.responses(S.ISocketStream(b, bufsize), bufsize))
+  for chunk in resp.body: n += len(chunk)
+  t1 = time.time(); th.join(); a.close(); b.close()
+  assert n == SIZE
+  print("{:18} {:4} MiB: {:7.3f}s {:8.1f} MiB/s"
+        .format(name, SIZE // 1024**2, t1 - t0,
+                SIZE / 1024.0**2 / (t1 - t0)))
+
+if __name__ == "__main__":
+  run("1 KiB"             , 1024)
+  run("64 KiB"            , 64 * 1024)
+  run("adaptive (1-256K)" , S.DEFAULT_BUFSIZE, S.MAX_BUFSIZE)
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -0,0 +1,79 @@
+# --                                                            ; {{{1
+#
+# File        : construct_bench.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""construction of Request/Response objects (time & allocations)"""
+
+from __future__ import print_function
+
+import httpony.http as H
+import httpony.parser as P
+import httpony.stream as S
+import httpony.util as U
+import timeit
+
+try:
+  import tracemalloc
+except ImportError:                                 # python2
+  tracemalloc = None
+
+N       = 50000
+HEADERS = U.idict.from_items([
+  ("Host", "localhost"), ("User-Agent", "bench/1.0"),
+  ("Accept", "*/*"), ("Connection", "keep-alive"),
+])
+REQ     = P.RequestHead("GET", "/foo/bar?x=42", "HTTP/1.1", HEADERS)
+RESP    = P.ResponseHead("HTTP/1.1", 200, "OK", HEADERS)
+
+def body():
+  return S.IStreamTakeChunks(iter(()))
+
+def request_init():
+  return H.Request(method = REQ.method, uri = REQ.uri,
+                   version = REQ.version, headers = REQ.headers,
+                   body = body())
+
+def request_from_head():
+  return H.Request._from_head(REQ, body())
+
+def response_init():
+  return H.Response(version = RESP.version, status = RESP.status,
+                    reason = RESP.reason, headers = RESP.headers,
+                    body = body())
+
+def response_from_head():
+  return H.Response._from_head(RESP, body())
+
+def response_simple():
+  return H.Response(status = 404, body = b"not found")
+
+def allocated(f, n = 1000):
+  """bytes allocated (and kept) per object"""
+  tracemalloc.start(); xs = []
+  before = tracemalloc.get_traced_memory()[0]
+  for i in range(n): xs.append(f())
+  after = tracemalloc.get_traced_memory()[0]; tracemalloc.stop()
+  return (after - before) / n
+
+def run(name, f):
+  t = timeit.timeit(f, number = N)
+  a = "" if tracemalloc is None else \
+      "; {:6.0f} B/obj".format(allocated(f))
+  print("{:22} {:6} x: {:7.3f}s; {:6.2f} us/op{}"
+        .format(name, N, t, t * 1e6 / N, a))
+
+if __name__ == "__main__":
+  run("Request()"             , request_init)
+  run("Request._from_head()"  , request_from_head)
+  run("Response()"            , response_init)
+  run("Response._from_head()" , response_from_head)
+  run("Response(404, ...)"    , response_simple)
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -0,0 +1,91 @@
+# --                                                            ; {{{1
+#
+# File        : idict_bench.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""idict header lookups: interned names vs lower() & (k, v) tuples"""
+
+from __future__ import print_function
+
+import collections
+import httpony.util as U
+import timeit
+
+try:
+  import tracemalloc
+except ImportError:                                 # python2
+  tracemalloc = None
+
+N     = 200000
+ITEMS = [ ("Host", "localhost"), ("User-Agent", "bench/1.0"),
+          ("Accept", "*/*"), ("Accept-Encoding", "gzip, deflate"),
+          ("Cookie", "foo=bar"), ("Connection", "keep-alive"),
+          ("X-Request-Id", "42") ]
+
+class tuple_idict(collections.MutableMapping):                  # {{{1
+
+  """the previous idict: lower() per access, (key, value) tuples"""
+
+  def __init__(self, data = None):
+    self._data = {}
+    if data is not None: self.update(data)
+
+  @classmethod
+  def from_items(cls, items):
+    d = cls(); d._data = { k.lower(): (k, v) for k, v in items }
+    return d
+
+  def __getitem__(self, k):
+    return self._data[k.lower()][1]
+
+  def __setitem__(self, k, v):
+    self._data[k.lower()] = (k, v)
+
+  def __delitem__(self, k):
+    del self._data[k.lower()]
+
+  def __iter__(self):
+    return (k for k, v in self._data.values())
+
+  def __len__(self):
+    return len(self._data)
+
+  def iteritems(self):
+    return (kv for kv in self._data.values())
+                                                                # }}}1
+
+def allocated(f, n = 1000):
+  """bytes allocated (and kept) per call"""
+  tracemalloc.start(); xs = []
+  before = tracemalloc.get_traced_memory()[0]
+  for i in range(n): xs.append(f())
+  after = tracemalloc.get_traced_memory()[0]; tracemalloc.stop()
+  return (after - before) / n
+
+def run(name, f, alloc = False):
+  t = min(timeit.repeat(f, number = N, repeat = 5))
+  a = "" if tracemalloc is None or not alloc else \
+      "; {:6.0f} B/dict".format(allocated(f))
+  print("{:30} {:6} x: {:7.3f}s; {:6.3f} us/op{}"
+        .format(name, N, t, t * 1e6 / N, a))
+
+def bench(cls):
+  n = cls.__name__; d = cls.from_items(ITEMS)
+  run(n + " from_items"       , lambda: cls.from_items(ITEMS), True)
+  run(n + " [Content-Length]" , lambda: "Content-Length" in d)
+  run(n + " .get(Connection)" , lambda: d.get("Connection"))
+  run(n + " [Host]"           , lambda: d["Host"])
+  run(n + " [X-Request-Id]"   , lambda: d["X-Request-Id"])
+  run(n + " [Vary] = ..."     , lambda: d.__setitem__("Vary", "x"))
+  run(n + " iteritems"        , lambda: list(d.iteritems()))
+
+if __name__ == "__main__":
+  bench(tuple_idict); bench(U.idict)
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
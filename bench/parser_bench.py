@@ -0,0 +1,93 @@
+# --                                                            ; {{{1
+#
+# File        : parser_bench.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""requests/sec: readline-based reader vs parser"""
+
+from __future__ import print_function
+
+import httpony.http as H
+import httpony.parser as P
+import httpony.stream as S
+import httpony.util as U
+import time
+
+from httpony.util import STR
+
+N     = 20000
+REQ   = b"GET /foo/bar?x=42 HTTP/1.1\r\nHost: localhost\r\n" \
+        b"User-Agent: bench/1.0\r\nAccept: */*\r\n" \
+        b"Accept-Encoding: gzip, deflate\r\nAccept-Language: en\r\n" \
+        b"Cookie: foo=bar; baz=qux\r\nConnection: keep-alive\r\n\r\n"
+POST  = b"POST /foo HTTP/1.1\r\nHost: localhost\r\n" \
+        b"Transfer-Encoding: chunked\r\n\r\n" + \
+        b"".join(b"4\r\nabcd\r\n" for i in range(16)) + b"0\r\n\r\n"
+
+# NB: the readline-based reader requests() used before the parser,
+# kept here as the baseline
+
+def _messages(si):
+  while True:
+    headers = U.idict()
+    while True:
+      start_line = STR(si.readline())
+      if start_line == "": return
+      if start_line != S.CRLF: break
+    while True:
+      line = STR(si.readline())
+      if line == "": return
+      if line == S.CRLF: break
+      k, v = line.split(":", 1); headers[k] = v.strip()
+    yield start_line.rstrip(S.CRLF), headers
+
+def _chunks(si):
+  while True:
+    n = int(STR(si.readline()), 16)
+    if n == 0: break
+    yield si.split(n)[0].read()
+    si.readline()
+  si.readline()
+
+def legacy(data):
+  """the readline-based reader (w/ bodies)"""
+  si = S.IConnectionStream(S.IBytesStream(data), "discard")
+  for start_line, headers in _messages(si):
+    if headers.get("Transfer-Encoding", "").lower() == "chunked":
+      body, _ = si.splitchunked(_chunks, S.DEFAULT_BUFSIZE)
+    else:
+      cl = int(headers.get("Content-Length", 0))
+      body, _ = si.split(cl, S.DEFAULT_BUFSIZE)
+    yield body
+
+def parser(data):
+  """the incremental parser (w/ bodies)"""
+  for head, body in H.messages(S.IBytesStream(data),
+                               P.RequestParser(), unread = "discard"):
+    yield body
+
+def events(data):
+  """the incremental parser (events only)"""
+  for ev in P.events(P.RequestParser(), S.IBytesStream(data)):
+    if isinstance(ev, P.RequestHead): yield ev
+
+def run(name, f, req, n):
+  data = req * n; t = time.time()
+  m = sum(1 for _ in f(data)); t = time.time() - t
+  assert m == n
+  print("{:8} {:5} {:6} reqs: {:7.3f}s; {:9.0f} reqs/s"
+        .format(name, "chunk" if req is POST else "get", n, t, n / t))
+
+if __name__ == "__main__":
+  for req in [REQ, POST]:
+    for name, f in [("legacy", legacy), ("parser", parser),
+                    ("events", events)]:
+      run(name, f, req, N)
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
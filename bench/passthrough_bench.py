@@ -0,0 +1,47 @@
+# --                                                            ; {{{1
+#
+# File        : passthrough_bench.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""parse + unparse (as a proxy would): raw vs decoded headers"""
+
+from __future__ import print_function
+
+import httpony.http as H
+import httpony.stream as S
+import httpony.util as U
+import timeit
+
+N     = 20000
+RESP  = b"HTTP/1.1 200 OK\r\nServer: upstream/1.0\r\n" \
+        b"Date: Sun, 18 Oct 2026 07:00:00 GMT\r\n" \
+        b"Content-Type: text/html; charset=utf-8\r\n" \
+        b"Cache-Control: no-cache\r\nX-Upstream-Id: 42\r\n" \
+        b'ETag: "d41d8cd98f00b204e9800998ecf8427e"\r\n' \
+        b"Content-Length: 12\r\n\r\n<p>Hi!</p>\r\n"
+
+def relay(decode):
+  resp = next(H.responses(S.IBytesStream(RESP)))
+  if decode:                          # decoded & re-encoded headers
+    headers = U.idict.from_items(resp.headers.iteritems())
+    resp._Immutable___set("headers", headers)
+  return resp.unparse()
+
+def run(name, decode):
+  assert len(relay(decode)) == len(RESP)     # py2: dict order
+  t = min(timeit.repeat(lambda: relay(decode), number = N,
+                        repeat = 3))
+  print("{:10} {:6} x: {:7.3f}s; {:6.2f} us/op"
+        .format(name, N, t, t * 1e6 / N))
+
+if __name__ == "__main__":
+  run("decoded", True)
+  run("raw", False)
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -0,0 +1,83 @@
+# --                                                            ; {{{1
+#
+# File        : pipeline_bench.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""10k pipelined requests over one connection"""
+
+from __future__ import print_function
+
+import httpony.http as H
+import httpony.stream as S
+import httpony.util as U
+import socket
+import threading
+import time
+
+from httpony.util import STR
+
+N     = 10000
+REQ   = b"POST /foo HTTP/1.1\r\nHost: localhost\r\n" \
+        b"Content-Length: 7\r\n\r\n<body1>"
+
+# NB: the readline-based reader requests() used before the flat
+# connection stream and the parser, kept here as the baseline
+
+class _SIWrapper(object):
+  def __init__(self, si): self.si = si
+  def readline(self): return self.si.readline()
+
+def _messages(si):
+  while True:
+    headers = U.idict()
+    while True:
+      start_line = STR(si.readline())
+      if start_line == "": return
+      if start_line != S.CRLF: break
+    while True:
+      line = STR(si.readline())
+      if line == "": return
+      if line == S.CRLF: break
+      k, v = line.split(":", 1); headers[k] = v.strip()
+    yield start_line.rstrip(S.CRLF), headers
+
+def nested_requests(si, bufsize = S.DEFAULT_BUFSIZE):
+  """the old way: every body wraps the rest in another IStreamDrop"""
+  si_ = _SIWrapper(si)
+  for start_line, headers in _messages(si_):
+    cl = int(headers.get("Content-Length", 0))
+    body, si_.si = si_.si.split(cl, bufsize)
+    yield body
+
+def flat_requests(si):
+  for req in H.requests(si): yield req.body
+
+def run(name, f, n):
+  a, b = socket.socketpair()
+  def send():
+    for i in range(n): a.sendall(REQ)
+    a.shutdown(socket.SHUT_WR)
+  th = threading.Thread(target = send); th.daemon = True; th.start()
+  ts = [time.time()]
+  for i, _ in enumerate(f(S.ISocketStream(b))):
+    if (i + 1) % (n // 10) == 0: ts.append(time.time())
+  th.join(); a.close(); b.close()
+  ds = [ (y - x) * 1e6 / (n // 10) for x, y in zip(ts, ts[1:]) ]
+  print("{:6} {:5} reqs: {:7.3f}s; us/req first 10% {:7.1f}, "
+        "last 10% {:7.1f}".format(name, n, ts[-1] - ts[0], ds[0],
+                                  ds[-1]))
+
+# NB: the nested chain recurses once per request, so it cannot get
+# anywhere near N before hitting the recursion limit
+if __name__ == "__main__":
+  run("nested", nested_requests, 200)
+  run("flat"  , flat_requests  , 200)
+  run("flat"  , flat_requests  , N)
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -0,0 +1,98 @@
+# --                                                            ; {{{1
+#
+# File        : take_bench.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""reading a large split part in small pieces: bytes vs bytearray"""
+
+from __future__ import print_function
+
+import httpony.stream as S
+import sys
+import time
+
+SIZE    = int(sys.argv[1]) if len(sys.argv) > 1 else 8 * 1024**2
+CHUNK   = 1024**2
+PIECE   = 1024
+
+class OldTakeChunks(S.IStreamTakeChunks):                       # {{{1
+
+  """the old implementation: bytes buffer, sliced on every read"""
+
+  def __init__(self, chunks, bufsize = S.DEFAULT_BUFSIZE):
+    self.chunks = chunks; self.bufsize = bufsize; self._done = False
+    self.buf = b""
+
+  def read(self, size = None):
+    if size is None:
+      buf = self.buf + b"".join(self.chunks); self.buf = b""
+      self._done = True
+      return buf
+    while size > len(self.buf):
+      x = next(self.chunks, None)
+      if x is None:
+        self._done = True; break
+      self.buf += x
+    buf = self.buf; self.buf = buf[size:]
+    return buf[:size]
+                                                                # }}}1
+
+class OldTake(S.IStreamTake):                                   # {{{1
+
+  """the old implementation: bytes buffer, sliced on every read"""
+
+  def __init__(self, parent, n, bufsize = S.DEFAULT_BUFSIZE):
+    self.parent = parent; self.n = n; self.bufsize = bufsize
+    self.buf = b""
+
+  def peek(self, size = None):
+    if size == -1   : size = self.n
+    if size is None : size = self.bufsize
+    m = min(size, self.n)
+    if m > len(self.buf):
+      self.buf += self.parent.read(m - len(self.buf))
+    return self.buf[:m]
+
+  def read(self, size = None):
+    if size is None: size = self.n
+    m = min(size, self.n); self.n -= m
+    if m <= len(self.buf):
+      buf = self.buf; self.buf = buf[m:]
+      return buf[:m]
+    else:
+      buf = self.buf; self.buf = b""
+      return buf + self.parent.read(m - len(buf))
+                                                                # }}}1
+
+def chunks():
+  data = b"x" * CHUNK
+  for i in range(SIZE // CHUNK): yield data
+
+def drain(t):
+  n = 0
+  while True:
+    x = t.read(PIECE)
+    if not x: break
+    n += len(x)
+  assert n == SIZE
+
+def run(name, mk):
+  t0 = time.time(); drain(mk()); t1 = time.time()
+  print("{:22} {:4} MiB in {} B pieces: {:7.3f}s"
+        .format(name, SIZE // 1024**2, PIECE, t1 - t0))
+
+if __name__ == "__main__":
+  run("old IStreamTakeChunks" , lambda: OldTakeChunks(chunks()))
+  run("IStreamTakeChunks"     , lambda: S.IStreamTakeChunks(chunks()))
+  def peeked(cls):
+    t = cls(S.IBytesStream(b"x" * SIZE), SIZE); t.peek(-1); return t
+  run("old IStreamTake"       , lambda: peeked(OldTake))
+  run("IStreamTake"           , lambda: peeked(S.IStreamTake))
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -0,0 +1,48 @@
+# --                                                            ; {{{1
+#
+# File        : unparse_bench.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""Response.unparse() of a typical response"""
+
+from __future__ import print_function
+
+import httpony.http as H
+import timeit
+
+N       = 50000
+HEADERS = {
+  "Server"        : "httpony.server/0.0.1",
+  "Date"          : "Sun, 18 Oct 2026 07:00:00 GMT",
+  "Content-Type"  : "text/html; charset=utf-8",
+  "Cache-Control" : "no-cache",
+  "ETag"          : '"d41d8cd98f00b204e9800998ecf8427e"',
+  "Keep-Alive"    : "timeout=10",
+}
+BODY    = b"<p>Hi!</p>\n" * 8
+
+def unparse(status):
+  return H.Response(status = status, headers = dict(HEADERS),
+                    body = BODY).unparse()
+
+def unparse_only(resp):
+  return resp.unparse()
+
+def run(name, f, *args):
+  t = timeit.timeit(lambda: f(*args), number = N)
+  print("{:22} {:6} x: {:7.3f}s; {:6.2f} us/op"
+        .format(name, N, t, t * 1e6 / N))
+
+if __name__ == "__main__":
+  run("construct + unparse", unparse, 200)
+  run("construct + unparse", unparse, 404)
+  run("unparse", unparse_only,
+      H.Response(headers = dict(HEADERS), body = BODY))
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -11,9 +11,14 @@
 
 """HTTP server/client/dsl"""
 
-__all__     = "client handler http server stream util".split()
+import sys
+
+__all__     = "client compress handler http server stream " \
+              "util".split()
 __version__ = '0.0.1'
 
+if sys.version_info >= (3, 6): __all__ += ["astream"]
+
 DEFAULT_USER_AGENT  = "httpony.client/{}".format(__version__)
 DEFAULT_SERVER      = "httpony.server/{}".format(__version__)
 
@@ -0,0 +1,206 @@
+# --                                                            ; {{{1
+#
+# File        : httpony/aserver.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""asyncio HTTP server engine (python >= 3.6)"""
+
+from . import astream as A
+from . import handler as H
+from . import http as HTTP
+from . import parser as P
+from . import server as SV
+from . import stream as S
+from . import util as U
+import asyncio
+import collections.abc
+import functools
+import tempfile
+
+# NB: what the Server methods (default_headers, default_env, ...)
+# need to know about a connection; like a RequestHandler
+class _Connection(object):
+  def __init__(self, server, client_address, timeout):
+    self.server = server; self.client_address = client_address
+    self.timeout = timeout
+
+class _Endpoint(object):
+  def __init__(self, scheme, server_address):
+    self.scheme = scheme; self.server_address = server_address
+
+# NB: each connection is a coroutine (that mostly waits for input);
+# the parser is fed directly, each request body is read (spilling to
+# a temporary file if large) before the request is handled; handlers
+# run in the executor (see _respond) and responses are batched and
+# flushed like in the threaded server (see SV.Server)
+async def _serve(s, endpoint, timeout, executor, reader, writer):
+  loop    = asyncio.get_event_loop()
+  conn    = _Connection(endpoint, writer.get_extra_info("peername"),
+                        timeout)
+  si, so  = A.reader_streams(reader, writer, executor)
+  so      = A.AsyncOBatchedStream(so)
+  parser  = P.RequestParser(**s.limits); answered = True
+  try:
+    print("connect {}".format(conn.client_address))
+    try:
+      while True:
+        req, spill = await _next_request(s, parser, si, so, timeout,
+                                         loop, executor)
+        if req is None: break
+        try:
+          answered = False
+          print("request {} {}".format(req.method, req.uri.uri))
+          with_body   = req.method != "HEAD"
+          status, out = await _respond(s, conn, req, with_body, loop,
+                                       executor)
+          answered    = True
+          await _write(out, so, with_body, loop, executor)
+          if not parser.has_head(): await so.flush()
+          print("response {}".format(status))
+        finally:
+          if spill is not None: spill.close()
+        if req.headers.get("Connection", "").lower() == "close": break
+    except P.Error as e:
+      print("rejected: {}".format(e))
+      if e.in_head or not answered:
+        await so.write(s.rejection(conn, e))
+    await so.flush()
+    print("disconnect {}".format(conn.client_address))
+  except asyncio.TimeoutError:
+    print("timeout!")
+  except ConnectionError as e:
+    print("connection lost: {}".format(e))
+  finally:
+    writer.close()
+
+async def _next_event(parser, si, so, bufsize, timeout):
+  while True:
+    ev = parser.next_event()
+    if ev is not P.NEED_DATA: return ev
+    if so.pending(): await so.flush()
+    hint = min(parser.size_hint(), max(bufsize, S.MAX_BUFSIZE))
+    parser.receive_data(
+      await asyncio.wait_for(si.read1(hint or bufsize), timeout)
+    )
+
+# NB: returns the request and the file its body was spilled to (or
+# None), which the caller closes once the response has been written;
+# writing to the file happens in the executor
+async def _next_request(s, parser, si, so, timeout, loop,
+                        executor):                              # {{{1
+  head = await _next_event(parser, si, so, s.bufsize, timeout)
+  if isinstance(head, P.ConnectionClosed): return None, None
+  trailers = U.idict() if P.chunked(head.headers) else None
+  chunks, n, f = [], 0, None
+  try:
+    while True:
+      ev = await _next_event(parser, si, so, s.bufsize, timeout)
+      if not isinstance(ev, P.Data):
+        if ev.trailers: trailers.update(ev.trailers)
+        break
+      n += len(ev.data)
+      if f is not None:
+        await loop.run_in_executor(executor, f.write, ev.data)
+        continue
+      chunks.append(bytes(ev.data))
+      if n > S.DEFAULT_SPILL_SIZE:
+        f = await loop.run_in_executor(executor, _spill, chunks)
+        chunks = None
+  except BaseException:
+    if f is not None: f.close()
+    raise
+  if f is None:
+    body = S.IBytesStream(b"".join(chunks))
+  else:
+    f.seek(0); body = S.IFileStream(f, n)
+  body.trailers = trailers
+  return HTTP.Request._from_head(head, body), f
+                                                                # }}}1
+
+def _spill(chunks):
+  f = tempfile.TemporaryFile(); f.writelines(chunks)
+  return f
+
+def _handle(s, conn, req, with_body):
+  resp = H.handle(s.handler, req, s.default_env(conn))
+  if isinstance(resp, H.Pending): return resp, None
+  return resp, s.finish_response(conn, req, resp, with_body)
+
+# NB: the handler runs in the executor (it may block); a route method
+# that is a coroutine (async def) returns H.Pending there, which is
+# then awaited in the event loop
+async def _respond(s, conn, req, with_body, loop, executor):
+  resp, out = await loop.run_in_executor(
+    executor, _handle, s, conn, req, with_body
+  )
+  if out is None:
+    resp = resp.handler._respond(await resp.awaitable) or \
+           HTTP.canned(404)
+    out  = s.finish_response(conn, req, resp, with_body)
+  return resp.status, out
+
+# NB: bodies that are not Sized (e.g. generators) may block, so they
+# are iterated in the executor; files are sent w/ sendfile; FLUSH
+# (see HTTP.Message._unparse_frames) sends what has been written
+async def _write(out, so, with_body, loop, executor):           # {{{1
+  if isinstance(out, bytes):
+    await so.write(out); return
+  sendfile  = with_body and out._file is not None
+  frames    = out._unparse_frames(with_body and not sendfile)
+  if sendfile or not with_body or \
+      isinstance(out.body, collections.abc.Sized):
+    for frame in frames:
+      await (so.flush() if frame is HTTP.FLUSH else so.writev(frame))
+  else:
+    while True:
+      frame = await loop.run_in_executor(executor, next, frames, None)
+      if frame is None: break
+      await (so.flush() if frame is HTTP.FLUSH else so.writev(frame))
+  if sendfile:
+    out._check_sent(await so.sendfile(out._file, out._content_length))
+                                                                # }}}1
+
+async def start(server, host = "localhost", port = 0, ssl = None,
+                timeout = None, executor = None):               # {{{1
+  """start serving w/ server (a Server) on the current event loop;
+  returns the asyncio.Server"""
+  if timeout is None: timeout = SV.DEFAULT_TIMEOUT
+  if not ssl:
+    ctx = None
+  elif isinstance(ssl, collections.abc.Mapping):
+    ctx = SV.ssl_context(**dict(ssl))
+  else:
+    ctx = SV.ssl_context(*ssl)
+  scheme    = HTTP.HTTPS_SCHEME if ctx else HTTP.HTTP_SCHEME
+  endpoint  = _Endpoint(scheme, (host, port))
+  serve     = functools.partial(_serve, server, endpoint, timeout,
+                                executor)
+  aserver   = await asyncio.start_server(serve, host, port, ssl = ctx)
+  endpoint.server_address = aserver.sockets[0].getsockname()[:2]
+  return aserver
+                                                                # }}}1
+
+def run(server, host = "localhost", port = None, ssl = None,
+        timeout = None, executor = None):                       # {{{1
+  """run server (a Server) on a new event loop (until interrupted)"""
+  loop = asyncio.new_event_loop(); asyncio.set_event_loop(loop)
+  aserver = loop.run_until_complete(
+    start(server, host, port, ssl, timeout, executor)
+  )
+  try:
+    print("listening on {}:{}".format(host, port))
+    loop.run_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    aserver.close(); loop.run_until_complete(aserver.wait_closed())
+    loop.close()
+                                                                # }}}1
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -0,0 +1,568 @@
+# --                                                            ; {{{1
+#
+# File        : httpony/astream.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""asyncio stream abstraction (python >= 3.6)"""
+
+from . import stream as S
+from .stream import DEFAULT_BUFSIZE, DEFAULT_SPILL_SIZE, MAX_BUFSIZE, \
+                    BATCH_MAX_SIZE, LineTooLong
+from .util import BY
+from io import BytesIO
+import asyncio
+import tempfile
+
+class AsyncIStream(object):                                     # {{{1
+
+  """async input stream"""
+
+  executor = None   # for blocking calls (None: the loop's default)
+
+  async def read(self, size = None):
+    """read up to size bytes from stream"""
+    raise NotImplementedError
+
+  async def readinto(self, buffer):
+    """read up to len(buffer) bytes into buffer; returns count"""
+    v = S._byteview(buffer); data = await self.read(len(v))
+    v[:len(data)] = data
+    return len(data)
+
+  async def readline(self, max_line = None):
+    """read line (of at most max_line bytes, newline included)"""
+    raise NotImplementedError
+
+  async def readlines(self):
+    """lines iterator"""
+    while True:
+      line = await self.readline()
+      if not line: break
+      yield line
+
+  def __aiter__(self):
+    return self.readlines()
+
+  async def readchunks(self, size = DEFAULT_BUFSIZE, max_size = None):
+    """chunk (of up to size bytes) iterator"""
+    while True:
+      chunk = await self.read(size)
+      if not chunk: break
+      yield chunk
+      size = S._grow(size, len(chunk), max_size)
+
+  def split(self, n, bufsize = DEFAULT_BUFSIZE):
+    """split stream at pos n"""
+    t = AsyncIStreamTake(self, n, bufsize)
+    d = AsyncIStreamDrop(self, t); t.executor = self.executor
+    return (t, d)
+
+  def splitchunked(self, chunks, bufsize = DEFAULT_BUFSIZE):
+    """split stream after chunks (an async iterator function)"""
+    t = AsyncIStreamTakeChunks(chunks(self), bufsize)
+    d = AsyncIStreamDrop(self, t); t.executor = self.executor
+    return (t, d)
+
+  async def close(self):
+    """close stream"""
+    raise NotImplementedError
+
+  def length(self):
+    """length (int or None if unknown)"""
+    return None
+
+  def fileno(self):
+    """underlying file descriptor (or None)"""
+    return None
+                                                                # }}}1
+
+class _AsyncIStreamTakeBase(S._PartBuffer, AsyncIStream):       # {{{1
+
+  async def detach(self, unread = "buffer",
+                   max_size = DEFAULT_SPILL_SIZE):
+    """stop using the parent stream: buffer, spill or discard rest"""
+    self._check_unread(unread)
+    if self._detached or self.done(): return
+    if unread == "buffer":
+      await self.peek(-1)
+    elif unread == "spill":
+      await self.spill(max_size)
+    else:
+      await self.drain()
+    self._detached = True
+
+  _spooled = None
+
+  # NB: the parent stream is not closed, just the temporary file the
+  # rest was spilled to (if any)
+  async def close(self):
+    if self._spooled is not None: await self._spooled.close()
+
+  # NB: the temporary file may roll over to disk, so it is written in
+  # the executor
+  async def _spool(self, max_size, chunks):
+    f = tempfile.SpooledTemporaryFile(max_size); e = self.executor
+    await _blocking(f.write, self._peek_buf(self._buffered()),
+                    executor = e)
+    n = self._buffered()
+    async for x in chunks:
+      await _blocking(f.write, x, executor = e); n += len(x)
+    f.seek(0); self._reset_buf()
+    self._spooled = AsyncIFileStream(f, n)
+    return self._spooled
+
+  async def readline(self, max_line = None):
+    i = self.pos
+    while True:
+      j = self.buf.find(b"\n", i)
+      if j != -1:
+        n = j + 1 - self.pos; break
+      i = len(self.buf); n = i - self.pos
+      if max_line is not None and n > max_line: break
+      if not await self._more(self.bufsize): break
+    if max_line is not None and n > max_line:
+      raise LineTooLong("line exceeds {} bytes".format(max_line))
+    return await self.read(n)
+                                                                # }}}1
+
+class AsyncIStreamTake(_AsyncIStreamTakeBase):                  # {{{1
+
+  """first part (n bytes) of split stream"""
+
+  def __init__(self, parent, n, bufsize = DEFAULT_BUFSIZE):
+    super(AsyncIStreamTake, self).__init__(bufsize)
+    self.parent = parent; self.n = n
+
+  def done(self):
+    """has this part been read entirely?"""
+    return self.n == 0
+
+  async def _more(self, size):
+    m = min(size, self.n - self._buffered())
+    data = await self.parent.read(m) if m > 0 else b""
+    self.buf.extend(data)
+    return data != b""
+
+  async def peek(self, size = None):
+    """peek at first size bytes (read w/o consume)"""
+    if size == -1   : size = self.n
+    if size is None : size = self.bufsize
+    m = min(size, self.n); k = self._buffered()
+    if m > k: self.buf.extend(await self.parent.read(m - k))
+    return self._peek_buf(m)
+
+  # NB: a spilled part closes its temporary file once read entirely
+  async def read(self, size = None):
+    if size is None: size = self.n
+    m = min(size, self.n); self.n -= m; k = self._buffered()
+    if m <= k:
+      data = self._take_buf(m)
+    elif k == 0:
+      data = await self.parent.read(m)
+    else:
+      data = self._take_buf(k) + await self.parent.read(m - k)
+    if self.n == 0: await self.close()
+    return data
+
+  async def readinto(self, buffer):
+    v = S._byteview(buffer)[:self.n]; n = self._take_buf_into(v)
+    if n < len(v): n += await self.parent.readinto(v[n:]) or 0
+    self.n -= n
+    if self.n == 0: await self.close()
+    return n
+
+  async def _rest(self):
+    m = self.n - self._buffered()
+    while m > 0:
+      data = await self.parent.read(min(m, self.bufsize))
+      if not data: break
+      m -= len(data); yield data
+
+  async def drain(self):
+    """read and discard the rest of this part"""
+    async for data in self._rest(): pass
+    self._reset_buf(); self.n = 0
+
+  async def spill(self, max_size = DEFAULT_SPILL_SIZE):
+    """move the rest of this part to a temporary file"""
+    self.parent = await self._spool(max_size, self._rest())
+    self.n      = self.parent.length()
+                                                                # }}}1
+
+class AsyncIStreamTakeChunks(_AsyncIStreamTakeBase):            # {{{1
+
+  """first part of splitchunked stream"""
+
+  def __init__(self, chunks, bufsize = DEFAULT_BUFSIZE):
+    super(AsyncIStreamTakeChunks, self).__init__(bufsize)
+    self.chunks = chunks; self._done = False
+
+  def done(self):
+    """has this part been read entirely?"""
+    return self._done
+
+  async def _next(self):
+    try:
+      return await self.chunks.__anext__()
+    except StopAsyncIteration:
+      self._done = True; return None
+
+  async def _more(self, size):
+    x = await self._next()
+    if x is None: return False
+    self.buf.extend(x)
+    return True
+
+  async def _fill(self, size):
+    while size > self._buffered():
+      if not await self._more(size): return False
+    return True
+
+  async def peek(self, size = None):
+    """peek at first size bytes (read w/o consume)"""
+    if size == -1:
+      async for x in self.chunks: self.buf.extend(x)
+      return self._peek_buf(self._buffered())
+    if size is None: size = self.bufsize
+    await self._fill(size)
+    return self._peek_buf(size)
+
+  async def read(self, size = None):
+    if size is None:
+      rest = b"".join([ x async for x in self.chunks ])
+      self._done = True
+      if self._buffered() == 0: return rest
+      return self._take_buf(self._buffered()) + rest
+    await self._fill(size)
+    return self._take_buf(min(size, self._buffered()))
+
+  async def readinto(self, buffer):
+    v = S._byteview(buffer); n = self._take_buf_into(v)
+    while n < len(v):
+      x = await self._next()
+      if x is None: break
+      k = min(len(x), len(v) - n); x = memoryview(x)
+      v[n:n + k] = x[:k]; n += k
+      if k < len(x): self.buf += x[k:]
+    return n
+
+  async def drain(self):
+    """read and discard the rest of this part"""
+    async for x in self.chunks: pass
+    self._reset_buf(); self._done = True
+
+  async def spill(self, max_size = DEFAULT_SPILL_SIZE):
+    """move the rest of this part to a temporary file"""
+    f = await self._spool(max_size, self.chunks)
+    self.chunks = _closing_chunks(f, self.bufsize)  # done once read
+                                                                # }}}1
+
+class AsyncIStreamDrop(AsyncIStream):                           # {{{1
+
+  """rest of split stream"""
+
+  def __init__(self, parent, take, unread = "buffer",
+               spill_size = DEFAULT_SPILL_SIZE):
+    self.parent = parent; self.take = take
+    self.unread = unread; self.spill_size = spill_size
+
+  async def _force_take(self):
+    await self.take.detach(self.unread, self.spill_size)
+
+  async def read(self, size = None):
+    await self._force_take()
+    return await self.parent.read(size)
+
+  async def readinto(self, buffer):
+    await self._force_take()
+    return await self.parent.readinto(buffer)
+
+  async def readline(self, max_line = None):
+    await self._force_take()
+    return await self.parent.readline(max_line)
+
+  async def close(self):
+    return await self.parent.close()
+                                                                # }}}1
+
+class AsyncIConnectionStream(AsyncIStream):                     # {{{1
+
+  """connection input stream (split w/o nesting)"""
+
+  def __init__(self, parent, unread = "buffer",
+               spill_size = DEFAULT_SPILL_SIZE):
+    self.parent = parent; self.take = None
+    self.unread = unread; self.spill_size = spill_size
+    self.executor = parent.executor
+
+  async def _force_take(self):
+    if self.take is not None:
+      await self.take.detach(self.unread, self.spill_size)
+      self.take = None
+
+  async def read(self, size = None):
+    await self._force_take()
+    return await self.parent.read(size)
+
+  async def readinto(self, buffer):
+    await self._force_take()
+    return await self.parent.readinto(buffer)
+
+  async def readline(self, max_line = None):
+    await self._force_take()
+    return await self.parent.readline(max_line)
+
+  # NB: not a coroutine (like AsyncIStream.split), so the part to
+  # force is only recorded here and forced on the next read
+  def split(self, n, bufsize = DEFAULT_BUFSIZE):
+    return self._split(AsyncIStreamTake(self.parent, n, bufsize))
+
+  def splitchunked(self, chunks, bufsize = DEFAULT_BUFSIZE):
+    return self._split(AsyncIStreamTakeChunks(chunks(self.parent),
+                                              bufsize))
+
+  def _split(self, take):
+    if self.take is not None and not self.take.done():
+      raise S.Error("previous part has not been forced")
+    self.take = take; take.executor = self.executor
+    return (take, self)
+
+  async def close(self):
+    return await self.parent.close()
+                                                                # }}}1
+
+class AsyncOStream(object):                                     # {{{1
+
+  """async output stream"""
+
+  executor = None   # for blocking calls (None: the loop's default)
+
+  async def write(self, data):
+    """write data to stream"""
+    raise NotImplementedError
+
+  async def writev(self, buffers):
+    """write several buffers to stream; returns total length"""
+    n = 0
+    for data in buffers:
+      await self.write(data); n += len(data)
+    return n
+
+  async def close(self):
+    """close stream"""
+    raise NotImplementedError
+
+  async def flush(self):
+    """flush stream"""
+    raise NotImplementedError
+
+  # NB: si is a blocking stream, so it is read in the executor
+  async def sendfile(self, si, count = None):
+    """write (up to count bytes of) input stream si; returns count"""
+    n = 0; size = DEFAULT_BUFSIZE
+    while count is None or n < count:
+      m     = size if count is None else min(size, count - n)
+      data  = await _blocking(si.read, m, executor = self.executor)
+      if not data: break
+      await self.write(data); n += len(data)
+      size  = S._grow(size, len(data), MAX_BUFSIZE)
+    return n
+                                                                # }}}1
+
+class AsyncIFileStream(AsyncIStream):                           # {{{1
+
+  """file input stream (for files that do not block, e.g. BytesIO)"""
+
+  def __init__(self, file, length = None):
+    self.file = file; self._length = length
+
+  async def read(self, size = None):
+    return self.file.read(-1 if size is None else size)
+
+  async def readinto(self, buffer):
+    return self.file.readinto(S._byteview(buffer))
+
+  async def readline(self, max_line = None):
+    if max_line is None: return self.file.readline()
+    line = self.file.readline(max_line + 1)
+    if len(line) > max_line:
+      raise LineTooLong("line exceeds {} bytes".format(max_line))
+    return line
+
+  async def close(self):
+    return self.file.close()
+
+  def length(self):
+    return self._length
+                                                                # }}}1
+
+class AsyncIBytesStream(AsyncIFileStream):                      # {{{1
+
+  """bytes input stream"""
+
+  def __init__(self, data):
+    data = BY(data)
+    super(AsyncIBytesStream, self).__init__(BytesIO(data), len(data))
+                                                                # }}}1
+
+class AsyncOBytesStream(AsyncOStream):                          # {{{1
+
+  """bytes output stream"""
+
+  def __init__(self):
+    self.file = BytesIO()
+
+  async def write(self, data):
+    return self.file.write(BY(data))
+
+  async def close(self):
+    return self.file.close()
+
+  async def flush(self):
+    pass
+
+  def getvalue(self):
+    return self.file.getvalue()
+                                                                # }}}1
+
+class AsyncIReaderStream(AsyncIStream):                         # {{{1
+
+  """asyncio.StreamReader input stream"""
+
+  def __init__(self, reader, writer = None):
+    self.reader = reader; self.writer = writer
+
+  # NB: like a blocking file, read(n) only returns fewer than n bytes
+  # at EOF; see read1()
+  async def read(self, size = None):
+    if size is None or size < 0: return await self.reader.read()
+    try:
+      return await self.reader.readexactly(size)
+    except asyncio.IncompleteReadError as e:
+      return e.partial
+
+  async def read1(self, size = DEFAULT_BUFSIZE):
+    """read up to size bytes (whatever is available)"""
+    return await self.reader.read(size)
+
+  # NB: the reader's own limit (64 KiB by default) applies as well
+  async def readline(self, max_line = None):
+    try:
+      line = await self.reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+      line = e.partial
+    except asyncio.LimitOverrunError as e:
+      raise LineTooLong("line exceeds reader limit") from e
+    if max_line is not None and len(line) > max_line:
+      raise LineTooLong("line exceeds {} bytes".format(max_line))
+    return line
+
+  async def close(self):
+    if self.writer is not None: await _close_writer(self.writer)
+                                                                # }}}1
+
+class AsyncOWriterStream(AsyncOStream):                         # {{{1
+
+  """asyncio.StreamWriter output stream"""
+
+  def __init__(self, writer):
+    self.writer = writer
+
+  # NB: like S.OFileStream, takes any bytes-like object w/o copying
+  async def write(self, data):
+    self.writer.write(BY(data) if isinstance(data, str) else data)
+    await self.writer.drain()
+
+  async def writev(self, buffers):
+    bufs = [ BY(x) if isinstance(x, str) else x for x in buffers ]
+    self.writer.writelines(bufs)
+    await self.writer.drain()
+    return sum(map(len, bufs))
+
+  async def close(self):
+    await _close_writer(self.writer)
+
+  async def flush(self):
+    await self.writer.drain()
+
+  # NB: loop.sendfile() (python >= 3.7) uses os.sendfile() where it
+  # can and falls back to reading & writing otherwise (e.g. SSL)
+  async def sendfile(self, si, count = None):
+    loop = asyncio.get_event_loop()
+    if not S._regular_file(si) or not hasattr(loop, "sendfile"):
+      return await super(AsyncOWriterStream, self).sendfile(si, count)
+    await self.writer.drain()
+    return await loop.sendfile(self.writer.transport, si.file,
+                               si.file.tell(), count)
+                                                                # }}}1
+
+class AsyncOBatchedStream(AsyncOStream):                        # {{{1
+
+  """async output stream that batches writes until flush (see
+  S.OBatchedStream)"""
+
+  def __init__(self, parent, max_size = BATCH_MAX_SIZE):
+    self.parent = parent; self.max_size = max_size
+    self._batch = []; self._size = 0
+
+  async def write(self, data):
+    if isinstance(data, str): data = BY(data)
+    elif not isinstance(data, bytes):
+      data = memoryview(data).tobytes()
+    self._batch.append(data); self._size += len(data)
+    if self._size >= self.max_size: await self._send()
+    return len(data)
+
+  async def close(self):
+    await self._send(); return await self.parent.close()
+
+  async def flush(self):
+    await self._send(); return await self.parent.flush()
+
+  async def sendfile(self, si, count = None):
+    await self._send(); return await self.parent.sendfile(si, count)
+
+  def pending(self):
+    """number of bytes written but not yet sent"""
+    return self._size
+
+  async def _send(self):
+    if self._batch:
+      batch, self._batch, self._size = self._batch, [], 0
+      await self.parent.writev(batch)
+                                                                # }}}1
+
+def _blocking(f, *args, executor = None):
+  """run blocking f(*args) in executor (awaitable; None: the loop's
+  default executor)"""
+  return asyncio.get_event_loop().run_in_executor(executor, f, *args)
+
+async def _closing_chunks(si, bufsize):
+  """chunks of si, which is closed once they have been read (or the
+  iterator is closed)"""
+  try:
+    async for x in si.readchunks(bufsize): yield x
+  finally:
+    await si.close()
+
+async def _close_writer(writer):
+  writer.close()
+  if hasattr(writer, "wait_closed"): await writer.wait_closed()
+
+def reader_streams(reader, writer, executor = None):
+  """input & output stream for asyncio StreamReader & StreamWriter
+  (blocking calls run in executor)"""
+  si = AsyncIReaderStream(reader, writer)
+  so = AsyncOWriterStream(writer)
+  si.executor = so.executor = executor
+  return (si, so)
+
+# ...
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -13,6 +13,7 @@
 
 from . import handler as H
 from . import http as HTTP
+from . import parser as P
 from . import stream as S
 import httpony  # for DEFAULT_USER_AGENT
 import socket
@@ -32,13 +33,19 @@ class Client(object):                                           # {{{1
   persistent  = False
   max_tries   = 2
 
+  # NB: limits override P.DEFAULT_LIMITS; a response that exceeds
+  # them raises a P.Error
   def __init__(self, base_uri = "", handler = None,
                persistent = None,
-               user_agent = httpony.DEFAULT_USER_AGENT):
+               user_agent = httpony.DEFAULT_USER_AGENT,
+               bufsize = S.DEFAULT_BUFSIZE, pool = None,
+               limits = None):
     for m in ["request"] + [m.lower() for m in HTTP.HTTP_METHODS]:
       setattr(self, m, getattr(self, "_i_" + m)) # "overload"
     self.base_uri   = base_uri; self.handler = handler
-    self.user_agent = user_agent
+    self.user_agent = user_agent; self.bufsize = bufsize
+    self.pool       = pool
+    self.limits     = dict(P.DEFAULT_LIMITS, **(limits or {}))
     self._state     = None
     if persistent is not None: self.persistent = persistent
 
@@ -78,8 +85,10 @@ class Client(object):                                           # {{{1
         if not prev or prev.host_and_port != req.uri.host_and_port:
           if sock: sock.close()
           sock  = self._socket(req.uri)
-          resps = HTTP.responses(S.ISocketStream(sock))
-          so    = S.OSocketStream(sock)
+          resps = HTTP.responses(S.ISocketStream(sock, self.bufsize),
+                                 self.bufsize, pool = self.pool,
+                                 **self.limits)
+          so    = S.OSocketStream(sock, self.bufsize, self.pool)
         for chunk in req.unparse_chunked(): so.write(chunk)
         so.flush();
         resp = next(resps, None)
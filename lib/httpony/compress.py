@@ -0,0 +1,127 @@
+# --                                                            ; {{{1
+#
+# File        : httpony/compress.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""HTTP content-encoding (gzip, deflate)"""
+
+from . import http as H
+from . import stream as S
+from .util import BY
+import zlib
+
+ENCODINGS         = "gzip deflate".split()  # in order of preference
+DEFAULT_MIN_SIZE  = 1024
+DEFAULT_LEVEL     = 6
+
+# NB: types that are (almost always) already compressed
+INCOMPRESSIBLE_TYPES = set("""
+  application/gzip application/x-gzip application/zip
+  application/x-bzip2 application/x-xz application/x-7z-compressed
+  application/x-rar-compressed application/zstd application/pdf
+  application/octet-stream font/woff font/woff2
+""".split())
+INCOMPRESSIBLE_PREFIXES = "image/ audio/ video/".split()
+COMPRESSIBLE_TYPES      = set("image/svg+xml image/bmp".split())
+
+def accepted_encoding(accept_encoding):                         # {{{1
+  """preferred encoding (gzip or deflate) acceptable according to the
+  Accept-Encoding header (or None)"""
+  qs = {}
+  for x in (accept_encoding or "").split(","):
+    enc, _, params = x.partition(";"); enc = enc.strip().lower()
+    q = 1.0
+    for p in params.split(";"):
+      k, _, v = p.partition("=")
+      if k.strip().lower() == "q":
+        try:
+          q = float(v)
+        except ValueError:
+          q = 0.0
+    if enc: qs[enc] = q
+  best = None
+  for enc in ENCODINGS:
+    q = qs.get(enc, qs.get("*", 0.0))
+    if q > 0 and (best is None or q > best[1]): best = (enc, q)
+  return best and best[0]
+                                                                # }}}1
+
+def compressible(content_type):
+  """is content of this type worth compressing?"""
+  t = (content_type or "").split(";")[0].strip().lower()
+  if t in COMPRESSIBLE_TYPES: return True
+  if t in INCOMPRESSIBLE_TYPES: return False
+  return not any(t.startswith(p) for p in INCOMPRESSIBLE_PREFIXES)
+
+def compressor(encoding, level = DEFAULT_LEVEL):
+  """zlib compressor for encoding (gzip or deflate)"""
+  wbits = zlib.MAX_WBITS | (16 if encoding == "gzip" else 0)
+  return zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+def compress_chunks(chunks, encoding, level = DEFAULT_LEVEL):
+  """incrementally compress iterable of chunks"""
+  z = compressor(encoding, level)
+  for chunk in chunks:
+    if chunk is H.FLUSH:
+      data = z.flush(zlib.Z_SYNC_FLUSH)
+      if data: yield data
+      yield H.FLUSH
+    else:
+      data = z.compress(BY(chunk))
+      if data: yield data
+  yield z.flush()
+
+def body_length(resp):
+  """length of response body (or None if unknown w/o reading it)"""
+  if resp._content_length is not None: return resp._content_length
+  if isinstance(resp.body, tuple): return sum(map(len, resp.body))
+  return None
+
+# NB: returns resp itself when it is not compressed; small bodies are
+# compressed eagerly (so they keep a Content-Length), others are
+# compressed while being sent (w/ chunked transfer encoding); partial
+# content (206, Content-Range) is never compressed
+def compress_response(req, resp, min_size = DEFAULT_MIN_SIZE,
+                      level = DEFAULT_LEVEL,
+                      eager_size = S.DEFAULT_SPILL_SIZE):       # {{{1
+  """compress response body according to request's Accept-Encoding
+  (if the content type is compressible and the body is large
+  enough); sets Content-Encoding and Vary"""
+  if resp.status < 200 or resp.status in (204, 206, 304) or \
+      "Content-Encoding" in resp.headers or \
+      "Content-Range" in resp.headers or \
+      not compressible(resp.headers.get("Content-Type")):
+    return resp
+  n = body_length(resp)
+  if n is not None and n < min_size: return resp
+  _add_vary(resp.headers, "Accept-Encoding")
+  enc = accepted_encoding(req.headers.get("Accept-Encoding"))
+  if enc is None: return resp
+  headers = resp.headers.copy(); headers["Content-Encoding"] = enc
+  headers.pop("Content-Length", None)
+  etag = headers.get("ETag")
+  if etag and not etag.startswith("W/"): headers["ETag"] = "W/" + etag
+  body = compress_chunks(resp.body, enc, level)
+  if isinstance(resp.body, tuple) and n <= eager_size:
+    body = (b"".join(body),)
+  return H.Response(version = resp.version, status = resp.status,
+                    reason = resp.reason, headers = headers,
+                    body = body)
+                                                                # }}}1
+
+def _add_vary(headers, name):
+  vary = headers.get("Vary")
+  if not vary:
+    headers["Vary"] = name
+  else:
+    xs = [x.strip().lower() for x in vary.split(",")]
+    if "*" not in xs and name.lower() not in xs:
+      headers["Vary"] = vary + ", " + name
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
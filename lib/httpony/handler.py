@@ -14,13 +14,23 @@
 from . import http as H
 from . import stream as S
 from . import util as U
+import collections
 import email.utils as EU
 import hashlib
+import inspect
+import mimetypes
 import os
 import re
 
 RE_TYPE = type(re.compile(""))
 
+_isawaitable = getattr(inspect, "isawaitable", lambda x: False)
+
+# NB: returned (instead of a response) by a handler whose route method
+# is a coroutine (async def); only the asyncio engine (see aserver)
+# can await it and then calls handler._respond() w/ the result
+Pending = collections.namedtuple("Pending", "handler awaitable")
+
 # TODO
 class HandlerBase(object):                                      # {{{1
 
@@ -36,8 +46,18 @@ class HandlerBase(object):                                      # {{{1
     self.headers  = U.idict()
     handler       = self._match(request)
     if handler is None: return None
-    self.response = H.response(handler(self, *self.route_args))
+    resp          = handler(self, *self.route_args)
+    if _isawaitable(resp): return Pending(self, resp)
+    return self._respond(resp)
+                                                                # }}}2
+
+  def _respond(self, resp):                                     # {{{2
+    """response from route method result"""
+    self.response = H.canned(resp) if isinstance(resp, int) \
+                                   else H.response(resp)
     if self.response:
+      if self.headers and isinstance(self.response, H.CannedResponse):
+        self.response = self.response.thaw()
       for (k,v) in self.headers.iteritems():
         self.response.headers.setdefault(k, v)
     return self.response
@@ -79,19 +99,24 @@ class HandlerBase(object):                                      # {{{1
                                                                 # }}}2
 
   # TODO
+  # NB: not canned: each location would take a slot in the LRU cache
   def redirect(self, uri, status = None):
     """redirect"""
     if status is None:
       status = 302 if self.request.method == "GET" else 303
-    return H.response((status, dict(Location = uri), ""))
+    return H.Response(status = status, headers = dict(Location = uri))
 
   # TODO
+  # NB: the Content-Type is guessed from the file name (unknown types
+  # are application/octet-stream, which is not compressed)
   def serve_file(self, path):                                   # {{{2
     """serve file"""
     s = os.stat(path); t = int(s.st_mtime)
     i = U.BY(str(t)) + b"|" + U.BY(str(s.st_size))
     e = 'W/"' + hashlib.sha1(i).hexdigest() + '"'
-    h = { "Last-Modified": EU.formatdate(t), "ETag": e }
+    c = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    h = { "Last-Modified": EU.formatdate(t), "ETag": e,
+          "Content-Type": c }
     if "If-Modified-Since" in self.request.headers:
       ims = self.request.headers["If-Modified-Since"]
       t2  = int(EU.mktime_tz(EU.parsedate_tz(ims)))
@@ -198,7 +223,7 @@ def handle(handler, request, env = None):
   request.env.setdefault("context_args"   , [])
   request.env.setdefault("context_params" , {})
   request.env.setdefault("original_uri"   , request.uri)
-  return handler()(request) or H.response(404)
+  return handler()(request) or H.canned(404)
 
 @handler
 class Static:                                                   # {{{1
@@ -11,12 +11,14 @@
 
 """HTTP URIs, requests, responses, streams"""
 
+from . import parser as P
 from . import stream as S
 from . import util as U
 from .util import BY, STR
 from functools import reduce
 import collections
 import operator
+import time
 
 try:
   import urlparse                 # python2
@@ -58,6 +60,7 @@ HTTP_STATUS_CODES = {                                           # {{{1
   415 : "Unsupported Media Type",
   416 : "Requested Range Not Satisfiable",
   417 : "Expectation Failed",
+  431 : "Request Header Fields Too Large",
   500 : "Internal Server Error",
   501 : "Not Implemented",
   502 : "Bad Gateway",
@@ -66,6 +69,14 @@ HTTP_STATUS_CODES = {                                           # {{{1
   505 : "HTTP Version Not Supported"
 }                                                               # }}}1
 
+# NB: pre-serialized status lines and header names (w/ ": ") for
+# Message.unparse*; other names are encoded when used
+STATUS_LINES = dict(
+  (code, BY("HTTP/1.1 {} {}\r\n".format(code, reason)))
+  for code, reason in HTTP_STATUS_CODES.items()
+)
+HEADER_NAMES = dict((k, BY(k + ": ")) for k in U.HEADER_NAMES)
+
 HTTP_DEFAULT_PORT   = 80
 HTTPS_DEFAULT_PORT  = 443
 
@@ -74,6 +85,23 @@ HTTPS_SCHEME        = "https"
 
 HTTP_METHODS        = "OPTIONS GET HEAD POST PUT DELETE".split()
 
+URI_FIELDS          = "scheme username password host port path " \
+                      "query query_params fragment".split()
+URI_CACHE_SIZE      = 1024
+CANNED_CACHE_SIZE   = 256
+
+CHUNK_MIN_SIZE      = 8192
+CHUNK_MAX_DELAY     = 0.1   # seconds
+
+_now = getattr(time, "monotonic", time.time)
+
+class _Flush(object):
+  def __repr__(self): return "FLUSH"
+
+# NB: a (chunked) body can yield FLUSH to have everything it yielded
+# so far sent right away (w/o waiting for CHUNK_MIN_SIZE bytes)
+FLUSH = _Flush()
+
 # TODO
 class Error(RuntimeError):
   pass
@@ -82,27 +110,53 @@ class URI(U.Immutable):                                         # {{{1
 
   """HTTP(S) URI"""
 
-  __slots__ = "scheme username password host port path \
-               query query_params fragment".split()
+  # NB: the components are properties that parse the uri on first
+  # access (w/ an LRU cache of URI_CACHE_SIZE parsed uris);
+  # query_params is only parsed when used; with_* build derived URIs
+  # from the components w/o parsing again
+  __slots__ = "_uri _parts _query_params".split()
+
+  _cache    = U.LRUCache(URI_CACHE_SIZE)
 
   def __init__(self, uri):
-    if not (uri.startswith(HTTP_SCHEME  + "://") or \
-            uri.startswith(HTTPS_SCHEME + "://")):
-      uri = HTTP_SCHEME + "://" + uri
-    u = urlparse.urlparse(uri)
-    q = urlparse.parse_qs(u.query, True, True) if u.query else {}
-    for k in q:
-      if len(q[k]) == 1: q[k] = q[k][0]
-    port = u.port
-    if not port:
-      port = HTTPS_DEFAULT_PORT if u.scheme == HTTPS_SCHEME \
-                                else HTTP_DEFAULT_PORT
-    super(URI, self).__init__(
-      scheme = u.scheme, username = u.username,
-      password = u.password, host = u.hostname or "",
-      port = port, path = u.path or "/", query = u.query,
-      query_params = q, fragment = u.fragment
-    )
+    self._Immutable___set("_uri", uri)
+    self._Immutable___set("_parts", None)
+    self._Immutable___set("_query_params", None)
+
+  @classmethod
+  def _from_parts(cls, parts):
+    return cls._make(_parts = parts)
+
+  @property
+  def _Immutable___slots(self):
+    return URI_FIELDS
+
+  def _parsed(self):
+    if self._parts is None:
+      parts = self._cache.get(self._uri)
+      if parts is None:
+        parts = self._cache[self._uri] = _parse_uri(self._uri)
+      self._Immutable___set("_parts", parts)
+    return self._parts
+
+  scheme    = property(lambda self: self._parsed()[0])
+  username  = property(lambda self: self._parsed()[1])
+  password  = property(lambda self: self._parsed()[2])
+  host      = property(lambda self: self._parsed()[3])
+  port      = property(lambda self: self._parsed()[4])
+  path      = property(lambda self: self._parsed()[5])
+  query     = property(lambda self: self._parsed()[6])
+  fragment  = property(lambda self: self._parsed()[7])
+
+  @property
+  def query_params(self):
+    if self._query_params is None:
+      q = urlparse.parse_qs(self.query, True, True) if self.query \
+                                                    else {}
+      for k in q:
+        if len(q[k]) == 1: q[k] = q[k][0]
+      self._Immutable___set("_query_params", q)
+    return self._query_params
 
   @property
   def uri_with_fragment(self):
@@ -137,6 +191,7 @@ class URI(U.Immutable):                                         # {{{1
   @property
   def host_and_port(self):
     s = self.host or ""
+    if ":" in s: s = "[" + s + "]"                 # IPv6
     if self.non_default_port: s += ":" + str(self.port)
     return s
 
@@ -156,20 +211,29 @@ class URI(U.Immutable):                                         # {{{1
 
   def with_scheme(self, scheme):
     """with other scheme"""
-    return type(self)(scheme + "://" + self.schemeless_uri)
+    _, un, pw, host, port, path, query, _ = self._parsed()
+    if not self.non_default_port: port = _default_port(scheme)
+    return self._from_parts((scheme, un, pw, host, port, path, query,
+                             ""))
 
   def with_host_and_port(self, host_and_port):
     """with other host:port"""
-    return type(self)(self.scheme + "://" +
-                      self.username_and_password + host_and_port +
-                      self.relative_uri)
+    scheme, un, pw, _, _, path, query, _ = self._parsed()
+    host, port = _split_host_and_port(host_and_port)
+    return self._from_parts((scheme, un, pw, host,
+                             port or _default_port(scheme), path,
+                             query, ""))
 
   def with_path(self, path):
     """with other path"""
     if not path.startswith("/"): path = "/" + path
-    return type(self)(self.scheme + "://" +
-                      self.username_and_password +
-                      self.host_and_port + path + self.query_string)
+    if "?" in path or "#" in path:
+      return type(self)(self.scheme + "://" +
+                        self.username_and_password +
+                        self.host_and_port + path + self.query_string)
+    scheme, un, pw, host, port, _, query, _ = self._parsed()
+    return self._from_parts((scheme, un, pw, host, port, path, query,
+                             ""))
 
   def __eq__(self, rhs):
     if isinstance(rhs, str  ): rhs = type(self)(rhs)
@@ -177,23 +241,66 @@ class URI(U.Immutable):                                         # {{{1
     return super(URI, self).__eq__(rhs)
                                                                 # }}}1
 
+def _parse_uri(uri):                                            # {{{1
+  if uri.startswith("/"):   # origin-form: the usual request target
+    rest, _, fragment = uri.partition("#")
+    path, _, query    = rest.partition("?")
+    return (HTTP_SCHEME, None, None, "", HTTP_DEFAULT_PORT, path,
+            query, fragment)
+  if not (uri.startswith(HTTP_SCHEME  + "://") or \
+          uri.startswith(HTTPS_SCHEME + "://")):
+    uri = HTTP_SCHEME + "://" + uri
+  u = urlparse.urlsplit(uri)
+  return (u.scheme, u.username, u.password, u.hostname or "",
+          u.port or _default_port(u.scheme), u.path or "/", u.query,
+          u.fragment)
+                                                                # }}}1
+
+def _split_host_and_port(s):
+  if s.startswith("["):                           # IPv6
+    host, _, port = s[1:].partition("]"); port = port[1:]
+  else:
+    host, _, port = s.partition(":")
+  return host.lower(), (int(port) if port.isdigit() else None)
+
+def _default_port(scheme):
+  return HTTPS_DEFAULT_PORT if scheme == HTTPS_SCHEME \
+                            else HTTP_DEFAULT_PORT
+
 class Message(U.Immutable):                                     # {{{1
 
   """HTTP request or response message (base class)"""
 
+  chunk_min_size  = CHUNK_MIN_SIZE    # see coalesce
+  chunk_max_delay = CHUNK_MAX_DELAY
+
+  # NB: a body that is a regular file (w/ known length) is kept in
+  # _file as well, so unparse_to() can send it w/ sendfile()
   def __init__(self, **kw):
     super(Message, self).__init__(self._defaults(), **kw)
-    self._Immutable___set("_content_length", None)
     if not isinstance(self.headers, U.idict):
       self._Immutable___set("headers", U.idict(self.headers))
-    if isinstance(self.body, str):
-      self._Immutable___set("body", (BY(self.body),))
-    elif isinstance(self.body, bytes):
-      self._Immutable___set("body", (self.body,))
-    elif isinstance(self.body, S.IStream):
-      if self.body.length() is not None:
-        self._Immutable___set("_content_length", self.body.length())
-      self._Immutable___set("body", self.body.readchunks())
+    body = self.body
+    if isinstance(body, str):
+      self._Immutable___set("body", (BY(body),))
+    elif isinstance(body, bytes):
+      self._Immutable___set("body", (body,))
+    elif isinstance(body, S.IStream):
+      self._Immutable___set("_trailers", body.trailers)
+      if body.length() is not None:
+        self._Immutable___set("_content_length", body.length())
+        if S._regular_file(body):
+          self._Immutable___set("_file", body)
+      self._Immutable___set("body", _stream_chunks(body))
+
+  # NB: for messages() only: body must be a stream w/o length
+  # (S.IStreamTakeChunks); the head (from the parser) is not
+  # validated (again); a parsed Content-Length is kept, so relaying
+  # the message keeps its framing (and raw headers)
+  @classmethod
+  def _from_head(cls, head, body):
+    """message from parser head event and body stream"""
+    raise NotImplementedError
 
   def unparse(self, with_body = True):
     """request/response as string"""
@@ -201,37 +308,110 @@ class Message(U.Immutable):                                     # {{{1
 
   def unparse_chunked(self, with_body = True):
     """iterate over chunks of request/response as string"""
-    if not isinstance(self.body, collections.Sized):
-      self.headers["Transfer-Encoding"] = "chunked"
+    for frame in self._unparse_frames(with_body):
+      if frame is FLUSH: continue
+      for piece in frame: yield piece
+
+  # NB: yields lists of pieces that belong together (the head, a
+  # chunked frame, ...) w/o concatenating them, so they can be written
+  # w/ a single writev(); and FLUSH after the head and each frame of a
+  # body that is not Sized (e.g. a generator), which may be streamed
+  # NB: the framing headers are only set when they differ, so parsed
+  # headers that pass through untouched (see U.raw_idict) are written
+  # out as is, w/o decoding or encoding them; a message is never
+  # written w/ both Transfer-Encoding and Content-Length (removing
+  # one modifies the headers, so the raw block is not used)
+  def _unparse_frames(self, with_body):
+    headers = self.headers
+    if self._content_length is None and \
+        not isinstance(self.body, collections.Sized):
+      if headers.get("Transfer-Encoding") != "chunked":
+        headers["Transfer-Encoding"] = "chunked"
+      if "Content-Length" in headers: del headers["Content-Length"]
       chunked = True
     else:
+      if "Transfer-Encoding" in headers:
+        del headers["Transfer-Encoding"]
       if self._content_length is None:
         self._Immutable___set(
           "_content_length",
           reduce(operator.add, map(len, self.body))
         )
-      self.headers["Content-Length"] = self._content_length
+      n = self._content_length
+      if headers.get("Content-Length") != str(n):
+        headers["Content-Length"] = n
       chunked = False
-    start_line = BY(self.unparse_start_line())
-    headers = [BY("{}: {}".format(k, v))
-               for (k,v) in U.iteritems(self.headers)]
-    yield b"".join(line + S.CRLFb
-                   for line in [start_line] + headers + [b""])
+    head = [self._start_line_bytes()]; raw = headers.raw()
+    if raw is not None:
+      head.append(raw)
+    else:
+      for (k, v) in headers.iteritems():
+        head += [HEADER_NAMES.get(k) or BY(k + ": "), BY(str(v)),
+                 S.CRLFb]
+    head.append(S.CRLFb); head = b"".join(head)
     if not with_body:
-      pass
+      yield [head]
     elif chunked:
-      for chunk in (BY(c) for c in self.body):
-        yield BY(hex(len(chunk))[2:]) + S.CRLFb + chunk + S.CRLFb
-      yield b"0" + S.CRLFb + S.CRLFb
+      yield [head]; yield FLUSH
+      for pieces in coalesce(self.body, self.chunk_min_size,
+                             self.chunk_max_delay):
+        if pieces is FLUSH: continue
+        n = sum(map(len, pieces))
+        yield [BY("{:x}".format(n)) + S.CRLFb] + pieces + [S.CRLFb]
+        yield FLUSH
+      yield [b"0" + S.CRLFb + S.CRLFb]
+    elif isinstance(self.body, collections.Sized):
+      yield [head] + [BY(c) for c in self.body]
     else:
-      for chunk in self.body: yield chunk
+      yield [head]; yield FLUSH
+      for chunk in self.body:
+        if chunk is FLUSH: continue
+        yield [BY(chunk)]; yield FLUSH
+
+  def unparse_to(self, so, with_body = True):
+    """write request/response to output stream (sendfile for files)"""
+    sendfile = with_body and self._file is not None
+    for frame in self._unparse_frames(with_body and not sendfile):
+      if frame is FLUSH:
+        so.flush()
+      else:
+        so.writev(frame)
+    if sendfile:
+      self._check_sent(so.sendfile(self._file, self._content_length))
+
+  # NB: the head has been sent already, so the connection can only be
+  # closed when the file turns out to be shorter than Content-Length
+  def _check_sent(self, n):
+    if n != self._content_length:
+      raise Error("file truncated: sent {} of {} bytes"
+                  .format(n, self._content_length))
+
+  def _start_line_bytes(self):
+    return BY(self.unparse_start_line()) + S.CRLFb
+
+  # NB: a copy w/ the same body keeps what is known about the body
+  # (its length, file & trailers), which lives in private slots
+  def copy(self, **kw):
+    x = super(Message, self).copy(**kw)
+    if "body" not in kw:
+      for k in "_content_length _file _trailers".split():
+        x._Immutable___set(k, getattr(self, k))
+    return x
+
+  # NB: the idict is filled once the body has been read
+  @property
+  def trailers(self):
+    """trailers of a parsed chunked body (or None)"""
+    return self._trailers
 
   @property
   def force_body(self):
     """force body into a 1-tuple and return its only element"""
     if not (isinstance(self.body, tuple) and len(self.body) == 1):
-      self._Immutable___set("body",
-                            (b"".join(BY(c) for c in self.body),))
+      self._Immutable___set("body", (b"".join(
+        BY(c) for c in self.body if c is not FLUSH
+      ),))
+      self._Immutable___set("_file", None)
     return self.body[0]
                                                                 # }}}1
 
@@ -240,7 +420,7 @@ class Request(Message):                                         # {{{1
   """HTTP request"""
 
   __slots__ = "method uri version headers body env " \
-              "_content_length".split()
+              "_content_length _file _trailers".split()
 
   def __init__(self, data = None, **kw):
     if data is not None:
@@ -259,6 +439,18 @@ class Request(Message):                                         # {{{1
       self._Immutable___set("uri",
                             self.uri.with_scheme(self.env["scheme"]))
 
+  @classmethod
+  def _from_head(cls, head, body):
+    uri = URI(head.uri); host = head.headers.get("Host")
+    if host is not None and not uri.host:
+      uri = uri.with_host_and_port(host)
+    return cls._make(
+      method = head.method, uri = uri, version = head.version,
+      headers = head.headers, body = _stream_chunks(body), env = {},
+      _content_length = _parsed_length(head),
+      _trailers = body.trailers
+    )
+
   # TODO
   def params(self):
     """query_params + context_params"""
@@ -290,7 +482,7 @@ class Response(Message):                                        # {{{1
   """HTTP response"""
 
   __slots__ = "version status reason headers body " \
-              "_content_length".split()
+              "_content_length _file _trailers".split()
 
   def __init__(self, data = None, **kw):
     if data is not None:
@@ -321,9 +513,25 @@ class Response(Message):                                        # {{{1
     if "reason" not in kw:
       self._Immutable___set("reason", HTTP_STATUS_CODES[self.status])
 
+  @classmethod
+  def _from_head(cls, head, body):
+    return cls._make(
+      version = head.version, status = head.status,
+      reason = head.reason, headers = head.headers,
+      body = _stream_chunks(body),
+      _content_length = _parsed_length(head),
+      _trailers = body.trailers
+    )
+
   def unparse_start_line(self):
     return "{} {} {}".format(self.version, self.status, self.reason)
 
+  def _start_line_bytes(self):
+    if self.version == "HTTP/1.1" and \
+        self.reason == HTTP_STATUS_CODES.get(self.status):
+      return STATUS_LINES[self.status]
+    return super(Response, self)._start_line_bytes()
+
   def _defaults(self):
     return dict(
       version = "HTTP/1.1", status = 200, headers = U.idict(),
@@ -331,82 +539,150 @@ class Response(Message):                                        # {{{1
     )
                                                                 # }}}1
 
-class _SIWrapper(object):
-  def __init__(self, si): self.si = si
-  def readline(self): return self.si.readline()
-
-# NB: si is probably a _SIWrapper; only use .readline()
-def generic_messages(si):                                       # {{{1
-  """iterate over stream of HTTP messages (requests or responses)"""
-  while True:
-    headers = U.idict()
-    while True:
-      start_line = STR(si.readline())
-      if start_line == "": return
-      if start_line != S.CRLF: break
-    while True:
-      line = STR(si.readline())
-      if line == "": return
-      if line == S.CRLF: break
-      k, v = line.split(":", 1); headers[k] = v.strip()
-    yield dict(
-      start_line = start_line.rstrip(S.CRLF), headers = headers,
-      body = si
-    )
-                                                                # }}}1
+class CannedResponse(Response):                                 # {{{1
+
+  """response that is serialized only once; the headers passed to
+  unparse_canned() (e.g. Date, Connection) are added per request"""
+
+  # NB: canned responses are meant to be shared between requests, so
+  # their headers must not be modified; use thaw() for a copy that
+  # can be
+  __slots__ = "version status reason headers body _content_length " \
+              "_file _trailers _canned_head _canned_body".split()
+
+  def __init__(self, data = None, **kw):
+    super(CannedResponse, self).__init__(data, **kw)
+    body = self.force_body
+    head = b"".join(next(self.thaw()._unparse_frames(False)))
+    self._Immutable___set("_canned_head", head[:-len(S.CRLFb)])
+    self._Immutable___set("_canned_body", S.CRLFb + body)
+
+  def unparse_canned(self, headers = None, with_body = True):
+    """response as string, w/ extra headers (unless already set)"""
+    data = [self._canned_head]
+    if headers:
+      for (k, v) in U.iteritems(headers):
+        if k not in self.headers:
+          data += [HEADER_NAMES.get(k) or BY(k + ": "), BY(str(v)),
+                   S.CRLFb]
+    data.append(self._canned_body if with_body else S.CRLFb)
+    return b"".join(data)
+
+  def unparse_chunked(self, with_body = True):
+    yield self.unparse_canned(None, with_body)
 
-# TODO: extensions, trailer
-def http_chunked_chunks(si):                                    # {{{1
-  while True:
-    n = int(STR(si.readline()), 16)
-    if n == 0: break
-    yield si.split(n)[0].read()
-    si.readline()
-  si.readline()
+  def unparse_to(self, so, with_body = True):
+    so.write(self.unparse_canned(None, with_body))
+
+  def thaw(self):
+    """modifiable (non-canned) copy"""
+    return Response(version = self.version, status = self.status,
+                    reason = self.reason, body = self.body,
+                    headers = self.headers.copy())
                                                                 # }}}1
 
-def split_body(si, msg, bufsize):                               # {{{1
-  """split stream into body and rest"""
-  te = msg["headers"].get("Transfer-Encoding", "")
-  cl = msg["headers"].get("Content-Length", 0)
-  if te.lower() == "chunked":
-    return si.splitchunked(http_chunked_chunks, bufsize)
-  else:
-    return si.split(int(cl), bufsize)
+# NB: each body is an IStreamTakeChunks over the parser's Data events;
+# it is detached (see S._IStreamTakeBase.detach for unread &
+# spill_size) before the next message is parsed
+def messages(si, parser, bufsize = S.DEFAULT_BUFSIZE,
+             unread = "buffer", spill_size = S.DEFAULT_SPILL_SIZE,
+             pool = None):                                      # {{{1
+  """iterate over (head event, body stream) pairs parsed from si"""
+  evs = P.events(parser, si, bufsize, pool)
+  for ev in evs:
+    if isinstance(ev, P.ConnectionClosed): return
+    trailers  = U.idict() if P.chunked(ev.headers) else None
+    data      = _body_data(evs, trailers)
+    body      = S.IStreamTakeChunks(data, bufsize)
+    body.pool = pool; body.trailers = trailers
+    yield ev, body
+    body.detach(unread, spill_size)
                                                                 # }}}1
 
-def requests(si, bufsize = S.DEFAULT_BUFSIZE):                  # {{{1
-  """iterate over HTTP requests"""
-  si_ = _SIWrapper(si)
-  for msg in generic_messages(si_):
-    method, uri, version = msg["start_line"].split(" ")
-    co = msg["headers"].get("Connection", "keep-alive").lower()
-    body, si_.si = split_body(si_.si, msg, bufsize)
-    yield Request(
-      method = method, uri = uri, version = version,
-      headers = msg["headers"], body = body
-    )
+def _body_data(evs, trailers):
+  for ev in evs:
+    if not isinstance(ev, P.Data):
+      if ev.trailers: trailers.update(ev.trailers)
+      return
+    yield ev.data
+
+# NB: limits (max_line, max_header_size, ...) are passed to the
+# parser; exceeding them raises a P.Error (w/ a status to reply w/)
+def requests(si, bufsize = S.DEFAULT_BUFSIZE, unread = "buffer",
+             spill_size = S.DEFAULT_SPILL_SIZE, pool = None,
+             parser = None, **limits):                          # {{{1
+  """iterate over HTTP requests (parsed w/ parser, a RequestParser
+  w/ the limits by default)"""
+  if parser is None: parser = P.RequestParser(**limits)
+  for head, body in messages(si, parser, bufsize, unread, spill_size,
+                             pool):
+    co = head.headers.get("Connection", "keep-alive").lower()
+    yield Request._from_head(head, body)
     if co == "close":
-      si_.si.close(); return
+      si.close(); return
                                                                 # }}}1
 
-def responses(si, bufsize = S.DEFAULT_BUFSIZE):                 # {{{1
+def responses(si, bufsize = S.DEFAULT_BUFSIZE, unread = "buffer",
+              spill_size = S.DEFAULT_SPILL_SIZE, pool = None,
+              **limits):                                        # {{{1
   """iterate over HTTP responses"""
-  si_ = _SIWrapper(si)
-  for msg in generic_messages(si_):
-    version, status, reason = msg["start_line"].split(" ", 2)
-    body, si_.si = split_body(si_.si, msg, bufsize)
-    yield Response(
-      version = version, status = int(status), reason = reason,
-      headers = msg["headers"], body = body
-    )
+  for head, body in messages(si, P.ResponseParser(**limits), bufsize,
+                             unread, spill_size, pool):
+    yield Response._from_head(head, body)
                                                                 # }}}1
 
+# NB: the parser has validated the Content-Length (see P.Parser)
+def _parsed_length(head):
+  cl = head.headers.get("Content-Length")
+  if cl is None or P.chunked(head.headers): return None
+  return int(cl)
+
+def _stream_chunks(si):
+  return si.readchunks(S.DEFAULT_BUFSIZE, S.MAX_BUFSIZE)
+
 def force_bodies(xs):
   """force bodies in message stream"""
   for msg in xs:
     msg.force_body; yield msg
 
+# NB: the delay is only checked when the next chunk arrives; a body
+# that may block for a while before yielding again should yield FLUSH
+def coalesce(chunks, min_size = CHUNK_MIN_SIZE,
+             max_delay = CHUNK_MAX_DELAY):                      # {{{1
+  """group chunks into lists of at least min_size bytes (unless a
+  FLUSH, max_delay seconds since the first chunk in the list or the
+  end comes first); FLUSH is passed on; empty chunks are dropped"""
+  pieces, n, t = [], 0, None
+  for chunk in chunks:
+    if chunk is FLUSH:
+      if pieces:
+        yield pieces; pieces, n = [], 0
+      t = None; yield FLUSH; continue
+    chunk = BY(chunk)
+    if not chunk: continue
+    pieces.append(chunk); n += len(chunk)
+    if n >= min_size:
+      yield pieces; pieces, n, t = [], 0, None
+    elif max_delay is not None:
+      if t is None:
+        t = _now()
+      elif _now() - t >= max_delay:
+        yield pieces; pieces, n, t = [], 0, None
+  if pieces: yield pieces
+                                                                # }}}1
+
+_canned = U.LRUCache(CANNED_CACHE_SIZE)
+
+def canned(status, headers = None, body = b""):
+  """shared CannedResponse (cached by status, headers and body)"""
+  key = (status, tuple(sorted(U.iteritems(headers or {}))), BY(body))
+  resp = _canned.get(key)
+  if resp is None:
+    resp = _canned[key] = CannedResponse(
+      status = status, headers = dict(headers or {}), body = body
+    )
+  return resp
+
 def request(x):
   """make a Request (if x is not already one)"""
   if isinstance(x, Request): return x
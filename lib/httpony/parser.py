@@ -0,0 +1,488 @@
+# --                                                            ; {{{1
+#
+# File        : httpony/parser.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+"""incremental (sans-IO) HTTP/1.1 message parser"""
+
+from . import stream as S
+from . import util as U
+from .util import LATIN1
+import collections
+import re
+
+# NB: feed the parser w/ receive_data() and call next_event() until
+# it returns NEED_DATA; the parser does no I/O itself, so it can be
+# driven by blocking streams (see events) and async engines alike
+
+# NB: Data.data is a memoryview of the parser's buffer (no copy);
+# Data.extensions are the extensions of the chunk that starts w/ this
+# event (if any); EndOfMessage.trailers are the trailers of a chunked
+# body (if any)
+
+RequestHead     = collections.namedtuple(
+                    "RequestHead", "method uri version headers")
+ResponseHead    = collections.namedtuple(
+                    "ResponseHead", "version status reason headers")
+Data            = collections.namedtuple("Data", "data extensions")
+EndOfMessage    = collections.namedtuple("EndOfMessage", "trailers")
+ConnectionClosed = collections.namedtuple("ConnectionClosed", "")
+
+Data.__new__.__defaults__         = (None,)
+EndOfMessage.__new__.__defaults__ = (None,)
+
+NEED_DATA         = object()
+COMPACT_SIZE      = 4096
+MAX_CHUNK_LINE    = 4096      # size line + extensions (w/o max_line)
+MAX_CHUNK_DIGITS  = 16
+MAX_TRAILER_SIZE  = 8192      # (w/o max_header_size)
+
+# NB: limits used by the server and client (the parser itself has
+# none by default); see Parser
+DEFAULT_MAX_LINE        = 8192
+DEFAULT_MAX_HEADER_SIZE = 64 * 1024
+DEFAULT_MAX_HEADERS     = 100
+DEFAULT_LIMITS          = dict(
+  max_line        = DEFAULT_MAX_LINE,
+  max_header_size = DEFAULT_MAX_HEADER_SIZE,
+  max_headers     = DEFAULT_MAX_HEADERS,
+  max_body_size   = None
+)
+
+_START_LINE, _BODY, _CHUNK_SIZE, _CHUNK_DATA, _CHUNK_CRLF, \
+  _TRAILERS, _CLOSED = range(7)
+
+_CRLF = bytearray(b"\r\n")
+_HEX  = b"0123456789abcdefABCDEF"
+_SIZE = re.compile(br"([0-9a-fA-F]{1,16})[ \t]*(;[^\r\n]*)?\r?\n")
+_EXT  = re.compile(r'''[ \t]*;[ \t]*([^\s;="]+)(?:[ \t]*=[ \t]*
+                      ("(?:[^"\\]|\\.)*"|[^\s;"]*))?[ \t]*''', re.X)
+
+# NB: header lines (w/o the start line) of a valid head
+_FIELDS = re.compile(br"(?:[^:\r\n]+:[^\n]*\n)*\Z")
+_CL     = re.compile(br"^content-length:([^\n]*)", re.I | re.M)
+_DIGITS = re.compile(r"[0-9]+\Z")
+
+# NB: status is the status of the response to reject a request w/;
+# in_head is True when the error is about the head of a message
+# (i.e. it was raised before there was a message to handle)
+class Error(RuntimeError):
+  status = 400; in_head = False
+
+class LineTooLong(Error):
+  status = 431
+
+class RequestLineTooLong(LineTooLong):
+  status = 414
+
+class HeadersTooLarge(Error):
+  status = 431
+
+class BodyTooLarge(Error):
+  status = 413
+
+class Parser(object):                                           # {{{1
+
+  """incremental HTTP/1.1 message parser (base class)"""
+
+  _start_line_error = LineTooLong
+
+  # NB: limits (None means no limit): max_line for any line, incl.
+  # the start line; max_header_size for the whole head (or trailers);
+  # max_headers for the number of header (trailer) fields;
+  # max_body_size for the (decoded) body; a Content-Length that
+  # exceeds it is rejected before the body is read
+  def __init__(self, max_line = None, max_header_size = None,
+               max_headers = None, max_body_size = None):
+    self.max_line         = max_line
+    self.max_header_size  = max_header_size
+    self.max_headers      = max_headers
+    self.max_body_size    = max_body_size
+    self._buf     = bytearray(); self._pos = self._scan = 0
+    self._state   = _START_LINE; self._eof = False
+    self._remaining = self._body_size = 0
+    self._exported  = False; self._ext = None
+
+  # NB: while memoryviews of the buffer may still be in use, it can't
+  # be resized; the unparsed rest is moved to a new buffer instead
+  def receive_data(self, data):
+    """feed bytes to the parser; empty data means EOF"""
+    if not data:
+      self._eof = True; return
+    if self._exported:
+      self._buf = self._buf[self._pos:]; self._exported = False
+      self._scan -= self._pos; self._pos = 0
+    elif self._pos > COMPACT_SIZE and 2 * self._pos > len(self._buf):
+      del self._buf[:self._pos]
+      self._scan -= self._pos; self._pos = 0
+    self._buf += data
+
+  def buffered(self):
+    """number of bytes received but not yet parsed"""
+    return len(self._buf) - self._pos
+
+  def size_hint(self):
+    """number of bytes the current body (chunk) still needs (0 when
+    waiting for a line of unknown length)"""
+    if self._state in (_BODY, _CHUNK_DATA):
+      return max(1, self._remaining - self.buffered())
+    return 0
+
+  # NB: the rest of a body w/ a Content-Length is skipped; a chunked
+  # body is not (so that returns False)
+  def has_head(self):
+    """whether the next message head has been received completely"""
+    buf = self._buf; n = len(buf); pos = self._pos; s = self._state
+    if s == _BODY:
+      pos += self._remaining
+    elif s != _START_LINE:
+      return False
+    while pos < n and buf[pos] in _CRLF: pos += 1
+    return buf.find(b"\n\r\n", pos) != -1 or \
+           buf.find(b"\n\n", pos) != -1
+
+  def next_event(self):
+    """next event or NEED_DATA"""
+    s = self._state
+    if s == _START_LINE:
+      try:
+        return self._next_head()
+      except Error as e:
+        e.in_head = True; raise
+    if s == _BODY: return self._next_body()
+    if s == _CLOSED: return ConnectionClosed()
+    return self._next_chunk()
+
+  # NB: the head is parsed in one go once all of it has been received:
+  # one find() for its end; each byte is scanned once (see self._scan)
+  # no matter how the head is split over calls to receive_data(); only
+  # the start line is decoded here: the header lines are checked (one
+  # regex match) and kept as bytes in a U.raw_idict, which decodes
+  # them lazily (and not at all when they pass through untouched)
+  def _next_head(self):                                         # {{{2
+    buf = self._buf; n = len(buf); pos = self._pos
+    while pos < n and buf[pos] in _CRLF: pos += 1 # between msgs
+    self._pos = pos; ie = self._find_block(self.max_header_size)
+    if ie is None: return self._need_data()
+    i, end = ie; k = buf.find(b"\n", pos, i + 1)
+    start_line  = LATIN1(buf[pos:k]).rstrip("\r")
+    raw         = bytes(buf[k + 1:i + 1])
+    self._pos   = self._scan = end
+    if self.max_line is not None and i + 1 - pos > self.max_line:
+      self._check_start_line(k + 1 - pos)
+      self._check_line(max(map(len, bytes(buf[pos:i]).split(b"\n")))
+                       + 1)
+    nl = raw.count(b"\n"); self._check_fields(nl)
+    if not _FIELDS.match(raw): raise Error("invalid header line")
+    if raw.count(b"\r\n") == nl:
+      headers = U.raw_idict(raw)
+    else:                                   # bare LFs: not as is
+      headers = _headers(LATIN1(raw).split("\n")[:-1])
+    head = self._head(start_line, headers)
+    self._framing(head, raw); return head
+                                                                # }}}2
+
+  # NB: trailers are parsed like the head; the common case -- no
+  # trailers -- only needs to look at the next (empty) line
+  def _next_trailers(self):
+    buf = self._buf; pos = self._pos
+    if buf.startswith(b"\r\n", pos) or buf.startswith(b"\n", pos):
+      self._pos = self._scan = buf.find(b"\n", pos) + 1
+      trailers = None
+    else:
+      lines = self._block(self.max_header_size or MAX_TRAILER_SIZE)
+      if lines is None: return self._need_data()
+      self._check_fields(len(lines))
+      trailers = _headers(lines)
+    self._state = _START_LINE; return EndOfMessage(trailers)
+
+  def _block(self, max_size):
+    """lines of the block (trailers) at the current position"""
+    ie = self._find_block(max_size)
+    if ie is None: return None
+    i, end = ie; lines = LATIN1(self._buf[self._pos:i]).split("\n")
+    self._pos = self._scan = end
+    if self.max_line is not None:
+      self._check_line(max(map(len, lines)) + 1)
+    return lines
+
+  # NB: finds the end of a block of lines (the head, trailers) in one
+  # find(); each byte is scanned once (see self._scan) no matter how
+  # it is split over calls to receive_data(); returns the position of
+  # the last line's LF and of the end of the block (or None)
+  def _find_block(self, max_size):                              # {{{2
+    buf = self._buf; n = len(buf); pos = self._pos
+    scan = max(self._scan, pos)
+    i = buf.find(b"\n\r\n", scan)
+    j = buf.find(b"\n\n", scan, n if i == -1 else i + 2)
+    if j != -1 and (i == -1 or j < i):
+      i, end = j, j + 2
+    elif i != -1:
+      end = i + 3
+    else:
+      self._scan = max(pos, n - 2)
+      self._check_size(n - pos, max_size)
+      if self.max_line is not None:   # the last (partial) line
+        k = buf.rfind(b"\n", pos)
+        if k == -1 and self._state == _START_LINE:
+          self._check_start_line(n - pos)
+        else:
+          self._check_line(n - 1 - max(k, pos - 1))
+      return None
+    self._check_size(end - pos, max_size)
+    return i, end
+                                                                # }}}2
+
+  def _check_size(self, n, max_size):
+    if max_size is not None and n > max_size:
+      raise HeadersTooLarge("header section exceeds {} bytes"
+                            .format(max_size))
+
+  def _check_fields(self, n):
+    if self.max_headers is not None and n > self.max_headers:
+      raise HeadersTooLarge("more than {} header fields"
+                            .format(self.max_headers))
+
+  def _check_start_line(self, n):
+    if n > self.max_line:
+      raise self._start_line_error("start line exceeds {} bytes"
+                                   .format(self.max_line))
+
+  def _check_line(self, n, max_line = None):
+    max_line = max_line or self.max_line
+    if n > max_line:
+      raise LineTooLong("line exceeds {} bytes".format(max_line))
+
+  def _next_body(self):
+    if self._remaining == 0:
+      self._state = _START_LINE; return EndOfMessage()
+    return self._data() or self._need_data()
+
+  # NB: consecutive chunks that have already been received are
+  # returned as a single Data event, unless they have extensions;
+  # chunk data is never copied into separate objects per chunk
+  def _next_chunk(self):                                        # {{{2
+    buf = self._buf; pieces = []; ext, self._ext = self._ext, None
+    max_line = self.max_line or MAX_CHUNK_LINE
+    while True:
+      s = self._state
+      if s == _CHUNK_SIZE and ext is None:
+        self._whole_chunks(pieces, max_line)
+      if s == _CHUNK_DATA:
+        n = min(len(buf) - self._pos, self._remaining)
+        if n: pieces.append(self._take(n))
+        if self._remaining: break
+        if buf.startswith(b"\r\n", self._pos):
+          self._pos += 2; self._scan = self._pos
+          self._state = _CHUNK_SIZE
+        else:
+          self._state = _CHUNK_CRLF
+        if ext is not None: break
+        continue
+      if s == _TRAILERS:
+        if pieces: break
+        return self._next_trailers()
+      m = _SIZE.match(buf, self._pos) if s == _CHUNK_SIZE else None
+      if m and m.end() - self._pos <= max_line:   # fast path
+        n, x = int(bytes(m.group(1)), 16), m.group(2)
+        if x is not None: x = _chunk_extensions(x[1:])
+        self._pos = self._scan = m.end()
+      else:
+        line = self._line(max_line)
+        if line is None: break
+        if s == _CHUNK_CRLF:
+          if line.strip():
+            raise Error("missing CRLF after chunk")
+          self._state = _CHUNK_SIZE; continue
+        n, x = _chunk_size(line)
+      self._add_body_size(n)
+      if n == 0:
+        self._state = _TRAILERS
+      else:
+        self._remaining = n; self._state = _CHUNK_DATA
+        if x is not None:
+          if pieces:
+            self._ext = x; break
+          ext = x
+    if pieces:
+      data = pieces[0] if len(pieces) == 1 else _join(pieces)
+      return Data(data, ext)
+    self._ext = ext; return self._need_data()
+                                                                # }}}2
+
+  # NB: fast path for chunks w/o extensions that have been received
+  # completely (size line, data & CRLF)
+  def _whole_chunks(self, pieces, max_line):
+    buf = self._buf; pos = start = self._pos; size = len(buf)
+    match = _SIZE.match; v = None; total = 0
+    while True:
+      m = match(buf, pos)
+      if m is None or m.group(2) is not None: break
+      i = m.end(); n = int(bytes(m.group(1)), 16)
+      if n == 0 or i - pos > max_line or i + n + 2 > size or \
+          not buf.startswith(b"\r\n", i + n): break
+      if v is None: v = memoryview(buf)
+      pieces.append(v[i:i + n]); total += n; pos = i + n + 2
+    if pos != start:
+      self._add_body_size(total)
+      self._pos = self._scan = pos; self._exported = True
+
+  def _data(self):
+    n = min(len(self._buf) - self._pos, self._remaining)
+    if n == 0: return None
+    return Data(self._take(n))
+
+  def _take(self, n):
+    data = memoryview(self._buf)[self._pos:self._pos + n]
+    self._pos += n; self._scan = self._pos; self._remaining -= n
+    self._exported = True; return data
+
+  def _line(self, limit):
+    i = self._buf.find(b"\n", self._scan)
+    if i == -1:
+      self._scan = len(self._buf)
+      self._check_line(self.buffered(), limit); return None
+    self._check_line(i + 1 - self._pos, limit)
+    line = bytes(self._buf[self._pos:i + 1])
+    self._pos = self._scan = i + 1
+    return line
+
+  def _add_body_size(self, n):
+    self._body_size += n
+    if self.max_body_size is not None and \
+        self._body_size > self.max_body_size:
+      raise BodyTooLarge("body exceeds {} bytes"
+                         .format(self.max_body_size))
+
+  def _need_data(self):
+    if not self._eof: return NEED_DATA
+    if self._state == _START_LINE and \
+        not bytes(self._buf[self._pos:]).strip():
+      self._state = _CLOSED; return ConnectionClosed()
+    raise Error("connection closed in the middle of a message")
+
+  # NB: the only supported transfer coding is chunked; duplicate
+  # Content-Length headers must agree (the headers keep the last one);
+  # a message w/ both Transfer-Encoding and Content-Length is rejected
+  # (see RFC 7230 3.3.3), as it could be framed differently elsewhere
+  def _framing(self, head, raw):
+    self._body_size = 0; headers = head.headers
+    te = headers.get("Transfer-Encoding")
+    if te is not None:
+      if te.lower() != "chunked":
+        raise Error("unsupported Transfer-Encoding")
+      if "Content-Length" in headers:
+        raise Error("both Transfer-Encoding and Content-Length")
+      self._state = _CHUNK_SIZE; return
+    cl = headers.get("Content-Length")
+    if cl is None:
+      n = 0
+    elif not _DIGITS.match(cl):
+      raise Error("invalid Content-Length")
+    elif len(set(v.strip() for v in _CL.findall(raw))) > 1:
+      raise Error("conflicting Content-Length headers")
+    else:
+      n = int(cl)
+    self._state = _BODY; self._remaining = n
+    self._add_body_size(self._remaining)
+
+  def _head(self, start_line, headers):
+    raise NotImplementedError
+                                                                # }}}1
+
+def chunked(headers):
+  """does a message w/ these headers have a chunked body?"""
+  te = headers.get("Transfer-Encoding", "")
+  return te.lower() == "chunked"
+
+def _headers(lines):
+  try:
+    items = [ (k, v.strip()) for k, v in
+              [ l.split(":", 1) for l in lines ] ]
+  except ValueError:
+    raise Error("invalid header line")
+  return U.idict.from_items(items)
+
+def _chunk_size(line):
+  """chunk size and extensions (or None) from chunk size line"""
+  size, sep, ext = line.partition(b";"); size = size.strip()
+  if not size or len(size) > MAX_CHUNK_DIGITS or \
+      size.translate(None, _HEX):
+    raise Error("invalid chunk size")
+  return int(size, 16), (_chunk_extensions(ext) if sep else None)
+
+def _chunk_extensions(s):
+  """parse chunk extensions into tuple of (name, value or None)"""
+  s = ";" + LATIN1(s).rstrip("\r\n"); exts = []; i = 0
+  while i < len(s):
+    m = _EXT.match(s, i)
+    if not m or m.end() == i: raise Error("invalid chunk extension")
+    k, v = m.groups()
+    if v and v.startswith('"'): v = re.sub(r"\\(.)", r"\1", v[1:-1])
+    exts.append((k, v)); i = m.end()
+  return tuple(exts)
+
+def _join(pieces):
+  return b"".join(map(U.BUF, pieces))
+
+class RequestParser(Parser):                                    # {{{1
+
+  """incremental HTTP/1.1 request parser"""
+
+  _start_line_error = RequestLineTooLong   # 414, not 431
+
+  def _head(self, start_line, headers):
+    try:
+      method, uri, version = start_line.split(" ")
+    except ValueError:
+      raise Error("invalid request line")
+    return RequestHead(method, uri, version, headers)
+                                                                # }}}1
+
+class ResponseParser(Parser):                                   # {{{1
+
+  """incremental HTTP/1.1 response parser"""
+
+  def _head(self, start_line, headers):
+    try:
+      version, status, reason = start_line.split(" ", 2)
+      status = int(status)
+    except ValueError:
+      raise Error("invalid status line")
+    return ResponseHead(version, status, reason, headers)
+
+  def _framing(self, head, raw):
+    if head.status < 200 or head.status in (204, 304):
+      self._state = _BODY; self._remaining = 0
+    else:
+      super(ResponseParser, self)._framing(head, raw)
+                                                                # }}}1
+
+# NB: reads w/ read1() so a (keep-alive) connection never blocks
+# waiting for more than the client sent; the size hint makes large
+# bodies use larger reads
+# NB: w/ a pool (see S.BufferPool), data is read into a pooled buffer
+# (which the parser copies from) instead of a new bytes object
+def events(parser, si, bufsize = S.DEFAULT_BUFSIZE, pool = None):
+  """iterate over the events parsed from (blocking) input stream si"""
+  while True:
+    ev = parser.next_event()
+    if ev is NEED_DATA:
+      hint = min(parser.size_hint(), max(bufsize, S.MAX_BUFSIZE))
+      size = hint if hint else bufsize
+      if pool is None:
+        parser.receive_data(si.read1(size)); continue
+      with pool.buffer() as buf:
+        v = memoryview(buf)[:size]
+        parser.receive_data(v[:si.readinto1(v)])
+    else:
+      yield ev
+      if isinstance(ev, ConnectionClosed): return
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
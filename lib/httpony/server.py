@@ -13,8 +13,10 @@
 
 from __future__ import print_function # DEBUG
 
+from . import compress as C
 from . import handler as H
 from . import http as HTTP
+from . import parser as P
 from . import stream as S
 from . import util as U
 import collections
@@ -29,6 +31,13 @@ except ImportError:
   import socketserver as SS # python3
 
 DEFAULT_TIMEOUT = 10  # TODO
+ENGINES         = "threads asyncio".split()
+
+def ssl_context(certfile, keyfile = None, password = None):
+  """server-side SSL context"""
+  ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+  ctx.load_cert_chain(certfile, keyfile, password)
+  return ctx
 
 class _ThreadedTCPServer(SS.ThreadingMixIn, SS.TCPServer):
   scheme = HTTP.HTTP_SCHEME
@@ -46,8 +55,7 @@ class _ThreadedSSLTCPServer(_ThreadedTCPServer):                # {{{1
                                 RequestHandlerClass)
 
   def server_bind(self):
-    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-    ctx.load_cert_chain(**self.ssl_config)
+    ctx = ssl_context(**self.ssl_config)
     self.socket = ctx.wrap_socket(self.socket, server_side = True)
     return _ThreadedTCPServer.server_bind(self)
                                                                 # }}}1
@@ -57,8 +65,23 @@ class Server(object):                                           # {{{1
 
   """HTTP server"""
 
-  def __init__(self, handler, server_info = httpony.DEFAULT_SERVER):
+  # NB: one pool is shared by all connections (threads); size it
+  # using pool.stats() (e.g. high_water) and the number of workers;
+  # compress is False, True or a dict of options for
+  # compress.compress_response(); limits override P.DEFAULT_LIMITS
+  # (requests that exceed them are rejected w/ 400, 413, 414 or 431);
+  # bufsize (if given) also sets the sizes of the request handler's
+  # socket file buffers, which otherwise keep their (io) defaults
+  def __init__(self, handler, server_info = httpony.DEFAULT_SERVER,
+               bufsize = None, pool = None, compress = False,
+               limits = None):
     self.handler = handler; self.server_info = server_info
+    self.bufsize  = S.DEFAULT_BUFSIZE if bufsize is None else bufsize
+    self.socket_bufsize = bufsize
+    self.pool     = pool if pool is not None else S.BufferPool()
+    self.compress = dict(compress) if isinstance(compress, dict) \
+                      else {} if compress else None
+    self.limits   = dict(P.DEFAULT_LIMITS, **(limits or {}))
 
   # TODO
   def default_headers(self, rh):
@@ -68,6 +91,33 @@ class Server(object):                                           # {{{1
       "Keep-Alive"  : "timeout={}".format(rh.timeout)
     }
 
+  # NB: shared by both engines; returns the response to send: bytes
+  # for a canned response, a (possibly compressed) Response otherwise
+  def finish_response(self, rh, req, resp, with_body = True):   # {{{2
+    """response w/ default headers (and compression, if enabled)"""
+    if isinstance(resp, H.Pending):
+      resp.awaitable.close()    # never awaited
+      raise TypeError("async route method needs the asyncio engine")
+    hs = self.default_headers(rh)
+    if req.headers.get("Connection", "").lower() == "close":
+      hs["Connection"] = "close"
+    if isinstance(resp, HTTP.CannedResponse):
+      return resp.unparse_canned(hs, with_body)
+    for (k, v) in U.iteritems(hs):
+      if k == "Connection":
+        resp.headers[k] = v
+      else:
+        resp.headers.setdefault(k, v)
+    if self.compress is not None:
+      resp = C.compress_response(req, resp, **self.compress)
+    return resp
+                                                                # }}}2
+
+  def rejection(self, rh, error):
+    """response to a request rejected by the parser (w/ error)"""
+    hs = dict(self.default_headers(rh), Connection = "close")
+    return HTTP.canned(error.status).unparse_canned(hs)
+
   # TODO
   def default_env(self, rh):
     """default env"""
@@ -84,25 +134,46 @@ class Server(object):                                           # {{{1
 
       timeout = DEFAULT_TIMEOUT
 
+      # NB: responses are batched (see S.OBatchedStream) and sent
+      # after each response unless the parser already has the next
+      # request (and before reading more input); so responses to
+      # pipelined requests that arrived together are sent together;
+      # streamed bodies are sent as they are produced (see
+      # HTTP.Message._unparse_frames); a request the parser rejects
+      # gets an error response (unless it already got a response,
+      # e.g. when its unread body is too large) and the connection
+      # is closed
       # TODO; DEBUG
       def handle(self):
         s = self.httpony_server
         try:
           print("connect {}".format(self.client_address))
-          reqs  = HTTP.requests(S.IRequestHandlerStream(self))
-          so    = S.ORequestHandlerStream(self)
-          for req in reqs:
-            print("request {} {}".format(req.method, req.uri.uri))
-            with_body = req.method != "HEAD"  # TODO
-            resp = H.handle(s.handler, req, s.default_env(self))
-            for (k, v) in U.iteritems(s.default_headers(self)):
-              resp.headers.setdefault(k, v)
-            if req.headers.get("Connection", "").lower() == "close":
-              resp.headers["Connection"] = "close"
-            for chunk in resp.unparse_chunked(with_body):
-              so.write(chunk)
-            so.flush()
-            print("response {}".format(resp.status))
+          so    = S.OBatchedStream(S.ORequestHandlerStream(self,
+                                                         s.pool))
+          si    = S.IFlushingStream(S.IRequestHandlerStream(self), so)
+          p     = P.RequestParser(**s.limits)
+          reqs  = HTTP.requests(si, s.bufsize, unread = "discard",
+                                pool = s.pool, parser = p)
+          answered = True
+          try:
+            for req in reqs:
+              answered = False
+              print("request {} {}".format(req.method, req.uri.uri))
+              with_body = req.method != "HEAD"  # TODO
+              resp = H.handle(s.handler, req, s.default_env(self))
+              out  = s.finish_response(self, req, resp, with_body)
+              answered = True
+              if isinstance(out, bytes):
+                so.write(out)
+              else:
+                out.unparse_to(so, with_body)
+              if not p.has_head(): so.flush()
+              print("response {}".format(resp.status))
+          except P.Error as e:
+            print("rejected: {}".format(e))
+            if e.in_head or not answered:
+              so.write(s.rejection(self, e))
+          so.flush()
           print("disconnect {}".format(self.client_address))
         except socket.timeout:
           print("timeout!") # TODO
@@ -113,15 +184,29 @@ class Server(object):                                           # {{{1
             raise
 
     RequestHandler.httpony_server = self
+    if self.socket_bufsize is not None:
+      RequestHandler.rbufsize     = self.socket_bufsize
+      RequestHandler.wbufsize     = self.socket_bufsize
     return RequestHandler
                                                                 # }}}2
 
+  # NB: the "threads" engine uses one thread per connection; the
+  # "asyncio" engine (python >= 3.6; see aserver) serves all
+  # connections from one event loop and runs the (sync) handlers in
+  # an executor
   def run(self, host = "localhost", port = None, ssl = None,
-          timeout = None):                                      # {{{2
+          timeout = None, engine = "threads"):                  # {{{2
     """run the server"""
+    if engine not in ENGINES:
+      raise ValueError("unknown engine: {}".format(engine))
+    if engine == "asyncio" and sys.version_info < (3, 6):
+      raise ValueError("the asyncio engine needs python >= 3.6")
     if port is None:
       port = HTTP.HTTP_DEFAULT_PORT if not ssl else \
              HTTP.HTTPS_DEFAULT_PORT
+    if engine == "asyncio":
+      from . import aserver
+      return aserver.run(self, host, port, ssl, timeout)
     self.requesthandler = self._requesthandler()
     if timeout is not None:
       self.requesthandler.timeout = timeout
@@ -148,7 +233,8 @@ if __name__ == "__main__":
   opts = dict( x.split("=", 1) for x in sys.argv[1:] )
   s = Server(H.static(path = opts.get("path", "."), listdirs = True))
   s.run(port    = int(opts.get("port", 8000)),
-        timeout = int(opts.get("timeout", DEFAULT_TIMEOUT)))
+        timeout = int(opts.get("timeout", DEFAULT_TIMEOUT)),
+        engine  = opts.get("engine", "threads"))
 
 # X = H.Handler()
 # @X.get("/*")
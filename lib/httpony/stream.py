@@ -11,24 +11,111 @@
 
 """stream abstraction"""
 
-from .util import BY
+from .util import BY, BUF, LRUCache
 from io import BytesIO
+import contextlib
+import mmap
 import os
+import ssl
+import stat
+import tempfile
+import threading
 
 CRLF            =  "\r\n"
 CRLFb           = b"\r\n"
 DEFAULT_BUFSIZE = 1024
+MAX_BUFSIZE     = 256 * 1024
+
+DEFAULT_SPILL_SIZE  = 1024 * 1024
+POOL_BUFSIZE        = 64 * 1024
+POOL_MAX_BUFFERS    = 64
+UNREAD_MODES        = "buffer spill discard".split()
+
+IOV_MAX             = 1024
+BATCH_MAX_SIZE      = 64 * 1024
+MMAP_CACHE_SIZE     = 64
+
+class Error(RuntimeError):
+  pass
+
+class LineTooLong(Error):
+  """line exceeds max_line bytes"""
+
+class BufferPool(object):                                       # {{{1
+
+  """pool of reusable fixed-size bytearrays (thread-safe)"""
+
+  def __init__(self, bufsize = POOL_BUFSIZE,
+               max_buffers = POOL_MAX_BUFFERS):
+    self.bufsize = bufsize; self.max_buffers = max_buffers
+    self._free = []; self._lock = threading.Lock()
+    self.hits = self.misses = self.in_use = self.high_water = 0
+
+  def get(self):
+    """check out a buffer"""
+    with self._lock:
+      self.in_use += 1
+      self.high_water = max(self.high_water, self.in_use)
+      if self._free:
+        self.hits += 1; return self._free.pop()
+      self.misses += 1
+    return bytearray(self.bufsize)
+
+  def put(self, buf):
+    """return a buffer"""
+    with self._lock:
+      self.in_use -= 1
+      if len(self._free) < self.max_buffers: self._free.append(buf)
+
+  @contextlib.contextmanager
+  def buffer(self):
+    """check out a buffer for the duration of a with block"""
+    buf = self.get()
+    try:
+      yield buf
+    finally:
+      self.put(buf)
+
+  def stats(self):
+    """hits, misses, in_use, high_water, free, bufsize"""
+    with self._lock:
+      return dict(hits = self.hits, misses = self.misses,
+                  in_use = self.in_use, high_water = self.high_water,
+                  free = len(self._free), bufsize = self.bufsize)
+                                                                # }}}1
 
+# NB: streams w/ a pool (see BufferPool) use its buffers instead of
+# allocating new ones where they can (draining, spilling, copying);
+# trailers are those of a chunked body, once it has been read
 class IStream(object):                                          # {{{1
 
   """input stream"""
 
+  pool = trailers = None
+
   def read(self, size = None):
     """read up to size bytes from stream"""
     raise NotImplementedError
 
-  def readline(self):
-    """read line"""
+  def read1(self, size = DEFAULT_BUFSIZE):
+    """read up to size bytes (w/o blocking for more once some are
+    available, where the stream supports that)"""
+    return self.read(size)
+
+  def readinto(self, buffer):
+    """read up to len(buffer) bytes into buffer; returns count"""
+    v = _byteview(buffer); data = self.read(len(v))
+    v[:len(data)] = data
+    return len(data)
+
+  def readinto1(self, buffer):
+    """readinto() like read1(); returns count"""
+    v = _byteview(buffer); data = self.read1(len(v))
+    v[:len(data)] = data
+    return len(data)
+
+  def readline(self, max_line = None):
+    """read line (of at most max_line bytes, newline included)"""
     raise NotImplementedError
 
   def readlines(self):
@@ -41,12 +128,16 @@ class IStream(object):                                          # {{{1
   def __iter__(self):
     return self.readlines()
 
-  def readchunks(self, size = DEFAULT_BUFSIZE):
+  # NB: w/ max_size, the size doubles (up to max_size) whenever a
+  # chunk comes back full, so large bodies are read in large chunks
+  # while small ones never allocate more than they need
+  def readchunks(self, size = DEFAULT_BUFSIZE, max_size = None):
     """chunk (of up to size bytes) iterator"""
     while True:
       chunk = self.read(size)
       if not chunk: break
       yield chunk
+      size = _grow(size, len(chunk), max_size)
 
   def split(self, n, bufsize = DEFAULT_BUFSIZE):
     """split stream at pos n"""
@@ -66,20 +157,101 @@ class IStream(object):                                          # {{{1
 
   def length(self):
     """length (int or None if unknown)"""
+    return None
+
+  def fileno(self):
+    """underlying file descriptor (or None)"""
     return None
                                                                 # }}}1
 
-class _IStreamTakeBase(IStream):                                # {{{1
+# NB: the parts buffer in a bytearray w/ an offset cursor; consuming
+# bytes only copies what is returned, and the buffer is compacted once
+# the consumed prefix dominates it, so reading a large part in small
+# pieces takes linear time
+class _PartBuffer(object):                                      # {{{1
+
+  def __init__(self, bufsize):
+    self.bufsize = bufsize; self.buf = bytearray(); self.pos = 0
+    self._detached = False
+
+  def _buffered(self):
+    return len(self.buf) - self.pos
+
+  def _peek_buf(self, m):
+    return memoryview(self.buf)[self.pos:self.pos + m].tobytes()
+
+  def _reset_buf(self):
+    del self.buf[:]; self.pos = 0
+
+  def _take_buf(self, m):
+    data = self._peek_buf(m); self._skip_buf(m)
+    return data
+
+  def _take_buf_into(self, v):
+    k = min(len(v), self._buffered())
+    v[:k] = memoryview(self.buf)[self.pos:self.pos + k]
+    self._skip_buf(k)
+    return k
+
+  def _skip_buf(self, m):
+    self.pos += m
+    if self.pos == len(self.buf):
+      self._reset_buf()
+    elif self.pos > self.bufsize and 2 * self.pos > len(self.buf):
+      del self.buf[:self.pos]; self.pos = 0
+
+  def _check_unread(self, unread):
+    if unread not in UNREAD_MODES:
+      raise ValueError("unread must be one of: " +
+                       ", ".join(UNREAD_MODES))
+                                                                # }}}1
+
+class _IStreamTakeBase(_PartBuffer, IStream):                   # {{{1
+
+  # NB: buffer keeps the rest in memory, spill moves it to a temporary
+  # file (in memory up to max_size bytes), discard drops it
+  def detach(self, unread = "buffer", max_size = DEFAULT_SPILL_SIZE):
+    """stop using the parent stream: buffer, spill or discard rest"""
+    self._check_unread(unread)
+    if self._detached or self.done(): return
+    if unread == "buffer":
+      self.peek(-1)
+    elif unread == "spill":
+      self.spill(max_size)
+    else:
+      self.drain()
+    self._detached = True
 
-  def readline(self):
-    buf = b""
+  _spooled = None
+
+  # NB: the parent stream is not closed, just the temporary file the
+  # rest was spilled to (if any)
+  def close(self):
+    if self._spooled is not None: self._spooled.close()
+
+  def _spool(self, max_size, chunks):
+    f = tempfile.SpooledTemporaryFile(max_size)
+    f.write(self._peek_buf(self._buffered())); n = self._buffered()
+    for x in chunks:
+      f.write(BUF(x)); n += len(x)
+    f.seek(0); self._reset_buf()
+    self._spooled = IFileStream(f, n)
+    return self._spooled
+
+  # NB: only scans bytes it has not seen yet; nothing is consumed
+  # when LineTooLong is raised
+  def readline(self, max_line = None):
+    i = self.pos
     while True:
-      data = self.peek(self.bufsize)
-      if data == b"": break
-      i = data.find(b"\n")
-      if i != -1: return buf + self.read(i + 1)
-      buf += self.read(self.bufsize)
-    return buf
+      j = self.buf.find(b"\n", i)
+      if j != -1:
+        n = j + 1 - self.pos; break
+      i = len(self.buf); n = i - self.pos
+      if max_line is not None and n > max_line: break
+      if not self._more(self.bufsize): break
+    if max_line is not None and n > max_line:
+      raise LineTooLong("line exceeds {} bytes".format(max_line))
+    return self.read(n)
                                                                 # }}}1
 
 class IStreamTake(_IStreamTakeBase):                            # {{{1
@@ -87,31 +259,71 @@ class IStreamTake(_IStreamTakeBase):                            # {{{1
   """first part (n bytes) of split stream"""
 
   def __init__(self, parent, n, bufsize = DEFAULT_BUFSIZE):
-    self.parent = parent; self.n = n; self.bufsize = bufsize
-    self.buf = b""
+    super(IStreamTake, self).__init__(bufsize)
+    self.parent = parent; self.n = n
 
   def done(self):
     """has this part been read entirely?"""
     return self.n == 0
 
+  def _more(self, size):
+    m = min(size, self.n - self._buffered())
+    data = self.parent.read(m) if m > 0 else b""
+    self.buf.extend(data)
+    return data != b""
+
   def peek(self, size = None):
     """peek at first size bytes (read w/o consume)"""
     if size == -1   : size = self.n
     if size is None : size = self.bufsize
-    m = min(size, self.n)
-    if m > len(self.buf):
-      self.buf += self.parent.read(m - len(self.buf))
-    return self.buf[:m]
+    m = min(size, self.n); k = self._buffered()
+    if m > k: self.buf.extend(self.parent.read(m - k))
+    return self._peek_buf(m)
 
+  # NB: a spilled part closes its temporary file once read entirely
   def read(self, size = None):
     if size is None: size = self.n
-    m = min(size, self.n); self.n -= m
-    if m <= len(self.buf):
-      buf = self.buf; self.buf = buf[m:]
-      return buf[:m]
+    m = min(size, self.n); self.n -= m; k = self._buffered()
+    if m <= k:
+      data = self._take_buf(m)
+    elif k == 0:
+      data = self.parent.read(m)
     else:
-      buf = self.buf; self.buf = b""
-      return buf + self.parent.read(m - len(buf))
+      data = self._take_buf(k) + self.parent.read(m - k)
+    if self.n == 0: self.close()
+    return data
+
+  def readinto(self, buffer):
+    v = _byteview(buffer)[:self.n]; n = self._take_buf_into(v)
+    if n < len(v): n += self.parent.readinto(v[n:]) or 0
+    self.n -= n
+    if self.n == 0: self.close()
+    return n
+
+  def _rest(self):
+    m = self.n - self._buffered()
+    if self.pool is None:
+      while m > 0:
+        data = self.parent.read(min(m, self.bufsize))
+        if not data: break
+        m -= len(data); yield data
+    else:
+      with self.pool.buffer() as buf:
+        v = memoryview(buf)
+        while m > 0:
+          k = self.parent.readinto(v[:m])
+          if not k: break
+          m -= k; yield v[:k]
+
+  def drain(self):
+    """read and discard the rest of this part"""
+    for data in self._rest(): pass
+    self._reset_buf(); self.n = 0
+
+  def spill(self, max_size = DEFAULT_SPILL_SIZE):
+    """move the rest of this part to a temporary file"""
+    self.parent = self._spool(max_size, self._rest())
+    self.n      = self.parent.length()
                                                                 # }}}1
 
 class IStreamTakeChunks(_IStreamTakeBase):                      # {{{1
@@ -119,56 +331,136 @@ class IStreamTakeChunks(_IStreamTakeBase):                      # {{{1
   """first part of splitchunked stream"""
 
   def __init__(self, chunks, bufsize = DEFAULT_BUFSIZE):
-    self.chunks = chunks; self.bufsize = bufsize; self._done = False
-    self.buf = b""
+    super(IStreamTakeChunks, self).__init__(bufsize)
+    self.chunks = chunks; self._done = False
 
   def done(self):
     """has this part been read entirely?"""
     return self._done
 
+  def _more(self, size):
+    x = next(self.chunks, None)
+    if x is None:
+      self._done = True; return False
+    self.buf += x
+    return True
+
+  def _fill(self, size):
+    while size > self._buffered():
+      if not self._more(size): return False
+    return True
+
   def peek(self, size = None):
     """peek at first size bytes (read w/o consume)"""
     if size == -1:
-      self.buf += b"".join(self.chunks)
-      return self.buf
+      for x in self.chunks: self.buf += x
+      return self._peek_buf(self._buffered())
     if size is None: size = self.bufsize
-    while size > len(self.buf):
-      x = next(self.chunks, None)
-      if x is None: break
-      self.buf += x
-    return self.buf[:size]
+    self._fill(size)
+    return self._peek_buf(size)
 
   def read(self, size = None):
     if size is None:
-      buf = self.buf + b"".join(self.chunks); self.buf = b""
-      self._done = True
-      return buf
-    while size > len(self.buf):
+      rest = b"".join(map(BUF, self.chunks)); self._done = True
+      if self._buffered() == 0: return rest
+      return self._take_buf(self._buffered()) + rest
+    self._fill(size)
+    return self._take_buf(min(size, self._buffered()))
+
+  def readinto(self, buffer):
+    v = _byteview(buffer); n = self._take_buf_into(v)
+    while n < len(v):
       x = next(self.chunks, None)
       if x is None:
         self._done = True; break
-      self.buf += x
-    buf = self.buf; self.buf = buf[size:]
-    return buf[:size]
+      k = min(len(x), len(v) - n); x = memoryview(x)
+      v[n:n + k] = x[:k]; n += k
+      if k < len(x): self.buf += x[k:]
+    return n
+
+  def drain(self):
+    """read and discard the rest of this part"""
+    for x in self.chunks: pass
+    self._reset_buf(); self._done = True
+
+  def spill(self, max_size = DEFAULT_SPILL_SIZE):
+    """move the rest of this part to a temporary file"""
+    f = self._spool(max_size, self.chunks)
+    self.chunks = _closing_chunks(f, self.bufsize)  # done once read
                                                                 # }}}1
 
 class IStreamDrop(IStream):                                     # {{{1
 
   """rest of split stream"""
 
-  def __init__(self, parent, take):
+  def __init__(self, parent, take, unread = "buffer",
+               spill_size = DEFAULT_SPILL_SIZE):
     self.parent = parent; self.take = take
+    self.unread = unread; self.spill_size = spill_size
 
   def _force_take(self):
-    if not self.take.done(): self.take.peek(-1)
+    self.take.detach(self.unread, self.spill_size)
 
   def read(self, size = None):
     self._force_take()
     return self.parent.read(size)
 
-  def readline(self):
+  def readinto(self, buffer):
+    self._force_take()
+    return self.parent.readinto(buffer)
+
+  def readline(self, max_line = None):
     self._force_take()
-    return self.parent.readline()
+    return self.parent.readline(max_line)
+
+  def close(self):
+    return self.parent.close()
+                                                                # }}}1
+
+# NB: unlike IStreamDrop, splitting does not nest: the rest is the
+# connection stream itself, so the cost per read stays the same no
+# matter how many parts have been split off; unread determines what
+# happens to the unread rest of a part when the connection moves on
+# (see _IStreamTakeBase.detach); the library itself no longer uses it
+# (see http.messages), it is kept for readline-based readers
+class IConnectionStream(IStream):                               # {{{1
+
+  """connection input stream (split w/o nesting)"""
+
+  def __init__(self, parent, unread = "buffer",
+               spill_size = DEFAULT_SPILL_SIZE, pool = None):
+    self.parent = parent; self.take = None
+    self.unread = unread; self.spill_size = spill_size
+    self.pool   = pool
+
+  def _force_take(self):
+    if self.take is not None:
+      self.take.detach(self.unread, self.spill_size)
+      self.take = None
+
+  def read(self, size = None):
+    self._force_take()
+    return self.parent.read(size)
+
+  def readinto(self, buffer):
+    self._force_take()
+    return self.parent.readinto(buffer)
+
+  def readline(self, max_line = None):
+    self._force_take()
+    return self.parent.readline(max_line)
+
+  def split(self, n, bufsize = DEFAULT_BUFSIZE):
+    self._force_take()
+    self.take = IStreamTake(self.parent, n, bufsize)
+    self.take.pool = self.pool
+    return (self.take, self)
+
+  def splitchunked(self, chunks, bufsize = DEFAULT_BUFSIZE):
+    self._force_take()
+    self.take = IStreamTakeChunks(chunks(self.parent), bufsize)
+    self.take.pool = self.pool
+    return (self.take, self)
 
   def close(self):
     return self.parent.close()
@@ -178,10 +470,19 @@ class OStream(object):                                          # {{{1
 
   """output stream"""
 
+  pool = None
+
   def write(self, data):
     """write data to stream"""
     raise NotImplementedError
 
+  def writev(self, buffers):
+    """write several buffers to stream; returns total length"""
+    n = 0
+    for data in buffers:
+      self.write(data); n += len(data)
+    return n
+
   def close(self):
     """close stream"""
     raise NotImplementedError
@@ -189,6 +490,28 @@ class OStream(object):                                          # {{{1
   def flush(self):
     """flush stream"""
     raise NotImplementedError
+
+  def sendfile(self, si, count = None):
+    """write (up to count bytes of) input stream si; returns count"""
+    if self.pool is not None: return self._sendfile_pooled(si, count)
+    n = 0; size = DEFAULT_BUFSIZE
+    while count is None or n < count:
+      m     = size if count is None else min(size, count - n)
+      data  = si.read(m)
+      if not data: break
+      self.write(data); n += len(data)
+      size  = _grow(size, len(data), MAX_BUFSIZE)
+    return n
+
+  def _sendfile_pooled(self, si, count):
+    n = 0
+    with self.pool.buffer() as buf:
+      v = memoryview(buf)
+      while count is None or n < count:
+        k = si.readinto(v if count is None else v[:count - n])
+        if not k: break
+        self.write(v[:k]); n += k
+    return n
                                                                 # }}}1
 
 class IFileStream(IStream):                                     # {{{1
@@ -199,10 +522,31 @@ class IFileStream(IStream):                                     # {{{1
     self.file = file; self._length = length
 
   def read(self, size = None):
-    return self.file.read(size)
-
-  def readline(self):
-    return self.file.readline()
+    return self.file.read(-1 if size is None else size)
+
+  # NB: python2 socket files have no read1(); readline() at least
+  # returns as soon as it sees a newline
+  def read1(self, size = DEFAULT_BUFSIZE):
+    if hasattr(self.file, "read1"): return self.file.read1(size)
+    return self.file.readline(size)
+
+  def readinto(self, buffer):
+    if not hasattr(self.file, "readinto"):
+      return super(IFileStream, self).readinto(buffer)
+    return self.file.readinto(_byteview(buffer))
+
+  def readinto1(self, buffer):
+    if not hasattr(self.file, "readinto1"):
+      return super(IFileStream, self).readinto1(buffer)
+    return self.file.readinto1(_byteview(buffer))
+
+  # NB: the line is consumed even when LineTooLong is raised
+  def readline(self, max_line = None):
+    if max_line is None: return self.file.readline()
+    line = self.file.readline(max_line + 1)
+    if len(line) > max_line:
+      raise LineTooLong("line exceeds {} bytes".format(max_line))
+    return line
 
   def readlines(self):
     return self.file.__iter__()
@@ -212,23 +556,57 @@ class IFileStream(IStream):                                     # {{{1
 
   def length(self):
     return self._length
+
+  def fileno(self):
+    try:
+      return self.file.fileno()
+    except (AttributeError, IOError, ValueError):
+      return None
                                                                 # }}}1
 
 class OFileStream(OStream):                                     # {{{1
 
   """file output stream"""
 
-  def __init__(self, file):
-    self.file = file
+  def __init__(self, file, pool = None):
+    self.file = file; self.pool = pool
 
   def write(self, data):
-    return self.file.write(BY(data))
+    return self.file.write(BUF(data))
 
   def close(self):
     return self.file.close()
 
   def flush(self):
     return self.file.flush()
+
+  # NB: socket.sendfile() uses os.sendfile() where possible and falls
+  # back to send() for e.g. SSL sockets; python2 has neither
+  def sendfile(self, si, count = None):
+    sock = self._socket()
+    if sock is None or not _regular_file(si) or \
+        not hasattr(sock, "sendfile"):
+      return super(OFileStream, self).sendfile(si, count)
+    self.flush()
+    return sock.sendfile(si.file, si.file.tell(), count)
+
+  # NB: SSL sockets do not support sendmsg(), nor does python 2
+  def writev(self, buffers):
+    """write several buffers w/ sendmsg() (socket files) or as blocks
+    of up to BATCH_MAX_SIZE bytes (otherwise); returns total length"""
+    sock = self._socket()
+    if sock is None or not hasattr(sock, "sendmsg") or \
+        isinstance(sock, ssl.SSLSocket):
+      n = 0
+      for data in _joined(buffers, BATCH_MAX_SIZE):
+        self.write(data); n += len(data)
+      return n
+    self.flush()
+    return _sendmsg_all(sock, [BY(x) if isinstance(x, str) else x
+                               for x in buffers])
+
+  def _socket(self):
+    return None
                                                                 # }}}1
 
 class IBytesStream(IFileStream):                                # {{{1
@@ -251,13 +629,143 @@ class OBytesStream(OFileStream):                                # {{{1
     return self.file.getvalue()
                                                                 # }}}1
 
+# NB: readers made w/ reader() share the mapping; it is unmapped when
+# the last of them is gone
+class IMmapStream(IStream):                                     # {{{1
+
+  """memory-mapped file input stream"""
+
+  def __init__(self, map, start = 0, end = None,
+               bufsize = DEFAULT_BUFSIZE):
+    self.map    = map
+    self.start  = start
+    self.end    = len(map) if end is None else end
+    self.pos    = start
+    self.bufsize = bufsize
+
+  def _stop(self, size):
+    if size is None or size < 0: return self.end
+    return min(self.pos + size, self.end)
+
+  def read(self, size = None):
+    i, self.pos = self.pos, self._stop(size)
+    return self.map[i:self.pos]
+
+  def readinto(self, buffer):
+    v = _byteview(buffer); i = self.pos; self.pos = self._stop(len(v))
+    v[:self.pos - i] = _mapview(self.map, i, self.pos)
+    return self.pos - i
+
+  def readline(self, max_line = None):
+    j = self.map.find(b"\n", self.pos, self.end)
+    n = (self.end if j == -1 else j + 1) - self.pos
+    if max_line is not None and n > max_line:
+      raise LineTooLong("line exceeds {} bytes".format(max_line))
+    return self.read(n)
+
+  def peek(self, size = None):
+    """view of next size bytes (w/o consume)"""
+    if size is None: size = self.bufsize
+    return self.view(self.pos - self.start,
+                     self._stop(size) - self.start)
+
+  def view(self, start = 0, end = None):
+    """view of bytes start..end (relative to this stream)"""
+    end = self.length() if end is None else min(end, self.length())
+    return _mapview(self.map, self.start + start, self.start + end)
+
+  def reader(self, start = 0, end = None):
+    """new stream sharing the mapping (for bytes start..end)"""
+    end = self.length() if end is None else min(end, self.length())
+    return type(self)(self.map, self.start + start, self.start + end,
+                      self.bufsize)
+
+  def close(self):
+    self.map = b""; self.start = self.end = self.pos = 0
+
+  def length(self):
+    return self.end - self.start
+                                                                # }}}1
+
+# NB: writes are collected (w/o joining them) and sent w/ a single
+# writev() on flush() (or once there are max_size bytes); mutable
+# buffers are copied, since they may be reused before they are sent
+class OBatchedStream(OStream):                                  # {{{1
+
+  """output stream that batches writes until flush"""
+
+  def __init__(self, parent, max_size = BATCH_MAX_SIZE):
+    self.parent = parent; self.max_size = max_size
+    self._batch = []; self._size = 0
+
+  @property
+  def pool(self):
+    return self.parent.pool
+
+  def write(self, data):
+    if isinstance(data, str): data = BY(data)
+    elif not isinstance(data, bytes):
+      data = memoryview(data).tobytes()
+    self._batch.append(data); self._size += len(data)
+    if self._size >= self.max_size: self._send()
+    return len(data)
+
+  def close(self):
+    self._send(); return self.parent.close()
+
+  def flush(self):
+    self._send(); return self.parent.flush()
+
+  def sendfile(self, si, count = None):
+    self._send(); return self.parent.sendfile(si, count)
+
+  def pending(self):
+    """number of bytes written but not yet sent"""
+    return self._size
+
+  def _send(self):
+    if self._batch:
+      batch, self._batch, self._size = self._batch, [], 0
+      self.parent.writev(batch)
+                                                                # }}}1
+
+# NB: flushes so before each read from parent (which may block); so
+# w/ an OBatchedStream, the responses to pipelined requests that have
+# already been received are sent together, once there is no more
+# input to handle w/o waiting
+class IFlushingStream(IStream):                                 # {{{1
+
+  """input stream that flushes an output stream before reading"""
+
+  def __init__(self, parent, so):
+    self.parent = parent; self.so = so
+
+  def read(self, size = None):
+    self.so.flush(); return self.parent.read(size)
+
+  def read1(self, size = DEFAULT_BUFSIZE):
+    self.so.flush(); return self.parent.read1(size)
+
+  def readinto(self, buffer):
+    self.so.flush(); return self.parent.readinto(buffer)
+
+  def readinto1(self, buffer):
+    self.so.flush(); return self.parent.readinto1(buffer)
+
+  def readline(self, max_line = None):
+    self.so.flush(); return self.parent.readline(max_line)
+
+  def close(self):
+    return self.parent.close()
+                                                                # }}}1
+
 class ISocketStream(IFileStream):                               # {{{1
 
   """socket input stream"""
 
   def __init__(self, sock, bufsize = DEFAULT_BUFSIZE):
     self.sock     = sock
-    self.bufsize  = DEFAULT_BUFSIZE
+    self.bufsize  = bufsize
     file          = sock.makefile("rb", bufsize)
     super(ISocketStream, self).__init__(file)
 
@@ -270,15 +778,18 @@ class OSocketStream(OFileStream):                               # {{{1
 
   """socket output stream"""
 
-  def __init__(self, sock, bufsize = DEFAULT_BUFSIZE):
+  def __init__(self, sock, bufsize = DEFAULT_BUFSIZE, pool = None):
     self.sock     = sock
-    self.bufsize  = DEFAULT_BUFSIZE
+    self.bufsize  = bufsize
     file          = sock.makefile("wb", bufsize)
-    super(OSocketStream, self).__init__(file)
+    super(OSocketStream, self).__init__(file, pool)
 
   def close(self):
     self.sock.shutdown(); self.sock.close()
     return super(OSocketStream, self).close()
+
+  def _socket(self):
+    return self.sock
                                                                 # }}}1
 
 class IRequestHandlerStream(IFileStream):                       # {{{1
@@ -294,15 +805,95 @@ class ORequestHandlerStream(OFileStream):                       # {{{1
 
   """SocketServer request handler output stream"""
 
-  def __init__(self, handler):
+  def __init__(self, handler, pool = None):
     self.handler = handler
-    super(ORequestHandlerStream, self).__init__(handler.wfile)
+    super(ORequestHandlerStream, self).__init__(handler.wfile, pool)
+
+  def _socket(self):
+    return self.handler.connection
                                                                 # }}}1
 
+# NB: sendfile() can only send regular files, not pipes, sockets etc.
+def _regular_file(si):
+  """is si a stream backed by a regular file?"""
+  fd = si.fileno()
+  return fd is not None and stat.S_ISREG(os.fstat(fd).st_mode)
+
+def _closing_chunks(si, bufsize):
+  """chunks of si, which is closed once they have been read (or the
+  iterator is closed)"""
+  try:
+    for x in si.readchunks(bufsize): yield x
+  finally:
+    si.close()
+
+def _grow(size, n, max_size):
+  """next (adaptive) read size after reading n of size bytes"""
+  if max_size is None or n < size: return size
+  return min(2 * size, max_size)
+
+def _joined(buffers, max_size):
+  """buffers joined into blocks of up to max_size bytes (larger
+  buffers are passed on as they are)"""
+  block, size = [], 0
+  for x in map(BUF, buffers):
+    if block and size + len(x) > max_size:
+      yield b"".join(block); block, size = [], 0
+    if len(x) >= max_size:
+      yield x
+    else:
+      block.append(x); size += len(x)
+  if block: yield b"".join(block)
+
+def _sendmsg_all(sock, buffers):
+  """sendmsg() all buffers (IOV_MAX at a time), handle short writes"""
+  vs = [ memoryview(x) for x in buffers if len(x) ]; i = total = 0
+  while i < len(vs):
+    n = sock.sendmsg(vs[i:i + IOV_MAX]); total += n
+    while i < len(vs) and n >= len(vs[i]):
+      n -= len(vs[i]); i += 1
+    if n: vs[i] = vs[i][n:]
+  return total
+
+if hasattr(memoryview, "cast"):
+  def _byteview(buffer):
+    """writable memoryview of bytes"""
+    v = memoryview(buffer)
+    return v if v.format == "B" and v.ndim == 1 else v.cast("B")
+else:
+  def _byteview(buffer):
+    """writable memoryview of bytes"""
+    return memoryview(buffer)
+
+def _mapview(map, start, end):
+  """zero-copy view of map[start:end]"""
+  try:
+    return memoryview(map)[start:end]
+  except TypeError:                   # python2 mmap
+    return buffer(map, start, end - start)
+
 def ifile_stream(name):
   """file stream (w/ size)"""
   return IFileStream(open(name, "rb"), os.stat(name).st_size)
 
+# NB: empty files cannot be mapped
+# NB: mappings are cached (by path, inode, size and mtime, so a
+# changed file is mapped again) and shared by all streams of the same
+# file; a mapping lives as long as the cache or a stream refers to it
+_MMAP_CACHE = LRUCache(MMAP_CACHE_SIZE)
+
+def immap_stream(name, bufsize = DEFAULT_BUFSIZE):
+  """memory-mapped file stream"""
+  with open(name, "rb") as f:
+    st  = os.fstat(f.fileno())
+    if st.st_size == 0: return IMmapStream(b"", bufsize = bufsize)
+    key = (os.path.abspath(name), st.st_ino, st.st_size, st.st_mtime)
+    m   = _MMAP_CACHE.get(key)
+    if m is None:
+      m = _MMAP_CACHE[key] = mmap.mmap(f.fileno(), 0,
+                                       access = mmap.ACCESS_READ)
+  return IMmapStream(m, bufsize = bufsize)
+
 # ...
 
 # vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -13,50 +13,119 @@
 
 import collections
 import sys
+import threading
+
+_intern = getattr(sys, "intern", None) or intern  # python2 builtin
+
+# NB: canonical names of common HTTP headers; HEADER_KEYS maps these
+# and their lowercase forms to (interned) lowercase keys, so idict
+# doesn't need to call lower() for them; CANONICAL_NAMES maps the
+# keys back
+HEADER_NAMES = tuple("""
+  Accept Accept-Charset Accept-Encoding Accept-Language Accept-Ranges
+  Age Allow Authorization Cache-Control Connection Content-Disposition
+  Content-Encoding Content-Language Content-Length Content-Location
+  Content-Range Content-Type Cookie Date ETag Expect Expires Host
+  If-Match If-Modified-Since If-None-Match If-Range
+  If-Unmodified-Since Keep-Alive Last-Modified Location Origin Pragma
+  Range Referer Server Set-Cookie TE Trailer Transfer-Encoding
+  Upgrade User-Agent Vary Via WWW-Authenticate X-Forwarded-For
+  X-Forwarded-Proto X-Requested-With
+""".split())
+HEADER_KEYS     = {}
+CANONICAL_NAMES = {}
+_RAW_NEEDLES    = {}  # key -> b"\n<key>:" (see raw_idict)
+
+for _name in HEADER_NAMES:
+  _key = _intern(_name.lower())
+  HEADER_KEYS[_name] = HEADER_KEYS[_key] = _key
+  CANONICAL_NAMES[_key] = _name
+  _RAW_NEEDLES[_key] = ("\n" + _key + ":").encode("latin-1")
+del _name, _key
 
 class idict(collections.MutableMapping):                        # {{{1
 
   """case-insensitive dict"""
 
+  # NB: _data maps lowercase keys to values; _names maps them to the
+  # original keys, but only where these differ from the canonical
+  # name (or the key itself); so there is no (key, value) tuple per
+  # entry, and headers w/ the usual names need no _names at all
   def __init__(self, data = None, **kw):
-    self._data = {}
+    self._data = {}; self._names = {}
     if data is not None: self.update(data)
     self.update(**kw)
 
+  @classmethod
+  def from_items(cls, items):
+    """make idict from (key, value) pairs in one go"""
+    d = cls.__new__(cls); data = d._data = {}; names = d._names = {}
+    keys = HEADER_KEYS; canon = CANONICAL_NAMES
+    for k, v in items:
+      lk = keys.get(k) or k.lower(); data[lk] = v
+      if k != canon.get(lk, lk):
+        names[lk] = k
+      elif names:
+        names.pop(lk, None)
+    return d
+
   # implement abstract methods ...
 
   def __getitem__(self, k):
-    return self._data[k.lower()][1]
+    return self._data[HEADER_KEYS.get(k) or k.lower()]
 
   def __setitem__(self, k, v):
-    self._data[k.lower()] = (k, v)
+    lk = HEADER_KEYS.get(k) or k.lower(); self._data[lk] = v
+    if k != CANONICAL_NAMES.get(lk, lk):
+      self._names[lk] = k
+    elif self._names:
+      self._names.pop(lk, None)
 
   def __delitem__(self, k):
-    del self._data[k.lower()]
+    lk = HEADER_KEYS.get(k) or k.lower(); del self._data[lk]
+    self._names.pop(lk, None)
 
   # original keys
   def __iter__(self):
-    return (k for k, v in self._data.values())
+    names = self._names; canon = CANONICAL_NAMES
+    if not names: return (canon.get(k, k) for k in self._data)
+    return (names.get(k) or canon.get(k, k) for k in self._data)
 
   def __len__(self):
     return len(self._data)
 
   # ... and these are nice to have ...
 
-  if sys.version_info.major != 2:
-    def iteritems(self):
-      return (x for x in self.items())
+  def __contains__(self, k):
+    return (HEADER_KEYS.get(k) or k.lower()) in self._data
+
+  def get(self, k, default = None):
+    return self._data.get(HEADER_KEYS.get(k) or k.lower(), default)
+
+  # (original key, value) pairs
+  def iteritems(self):
+    names = self._names; canon = CANONICAL_NAMES
+    if not names:
+      return ((canon.get(k, k), v) for k, v in iteritems(self._data))
+    return ((names.get(k) or canon.get(k, k), v)
+            for k, v in iteritems(self._data))
 
   # lowercase keys
   def iteritems_lower(self):
-    return ((k, v[1]) for k, v in iteritems(self._data))
+    return (kv for kv in iteritems(self._data))
 
   if sys.version_info.major != 2:
     def items_lower(self):
       return list(self.iteritems_lower())
 
   def copy(self):
-    return type(self)(self._data.values())
+    d = type(self).__new__(type(self))
+    d._data = dict(self._data); d._names = dict(self._names)
+    return d
+
+  def raw(self):
+    """raw header block (see raw_idict) or None"""
+    return None
 
   # ... and we also need to override these
 
@@ -96,6 +165,109 @@ class idict(collections.MutableMapping):                        # {{{1
     )
                                                                 # }}}1
 
+class raw_idict(idict):                                         # {{{1
+
+  """idict over a raw header block (bytes), decoded lazily"""
+
+  # NB: lookups (get, [], in) of an unmodified raw_idict search the
+  # (lowercased) raw block and decode just the value they find;
+  # anything else decodes the whole block into the usual storage
+  # (see __getattr__); the block has one "name: value\r\n" line per
+  # header; raw() returns it until the headers are modified, so
+  # untouched headers can be written out as is
+  _raw = _lower = None
+
+  def __init__(self, raw):
+    self._raw = raw
+
+  # NB: only called when _data/_names haven't been set (yet)
+  def __getattr__(self, k):
+    if k not in ("_data", "_names") or self._raw is None:
+      raise AttributeError(k)
+    d = idict.from_items(
+      (k, v.strip()) for k, v in
+      [ l.split(":", 1) for l in LATIN1(self._raw).split("\n") if l ]
+    )
+    self._data = d._data; self._names = d._names
+    return self.__dict__[k]
+
+  def _lookup(self, k):
+    lower = self._lower
+    if lower is None: lower = self._lower = b"\n" + self._raw.lower()
+    lk = HEADER_KEYS.get(k) or k.lower()
+    needle = _RAW_NEEDLES.get(lk) or \
+             ("\n" + lk + ":").encode("latin-1")
+    i = lower.rfind(needle)                   # the last one wins
+    if i == -1: return None
+    i += len(needle) - 1; j = self._raw.find(b"\n", i)
+    return LATIN1(self._raw[i:j]).strip()
+
+  def __getitem__(self, k):
+    if self._raw is None: return idict.__getitem__(self, k)
+    v = self._lookup(k)
+    if v is None: raise KeyError(k)
+    return v
+
+  def __setitem__(self, k, v):
+    idict.__setitem__(self, k, v); self._raw = None
+
+  def __delitem__(self, k):
+    idict.__delitem__(self, k); self._raw = None
+
+  def __contains__(self, k):
+    if self._raw is None: return idict.__contains__(self, k)
+    return self._lookup(k) is not None
+
+  def get(self, k, default = None):
+    if self._raw is None: return idict.get(self, k, default)
+    v = self._lookup(k)
+    return default if v is None else v
+
+  def copy(self):
+    if self._raw is not None: return raw_idict(self._raw)
+    d = idict.__new__(idict)
+    d._data = dict(self._data); d._names = dict(self._names)
+    return d
+
+  def raw(self):
+    """raw header block (or None once modified)"""
+    return self._raw
+                                                                # }}}1
+
+class LRUCache(object):                                         # {{{1
+
+  """bounded mapping that evicts the least recently used entries
+  (thread-safe)"""
+
+  def __init__(self, maxsize = 128):
+    self.maxsize  = maxsize
+    self._data    = collections.OrderedDict()
+    self._lock    = threading.Lock()
+
+  def get(self, k, default = None):
+    with self._lock:
+      try:
+        v = self._data.pop(k)
+      except KeyError:
+        return default
+      self._data[k] = v
+      return v
+
+  def __setitem__(self, k, v):
+    with self._lock:
+      self._data.pop(k, None); self._data[k] = v
+      if len(self._data) > self.maxsize: self._data.popitem(False)
+
+  def __len__(self):
+    return len(self._data)
+
+  def clear(self):
+    with self._lock:
+      self._data.clear()
+                                                                # }}}1
+
+_setattr = object.__setattr__
+
 class Immutable(object):                                        # {{{1
 
   """immutable base class"""
@@ -104,25 +276,48 @@ class Immutable(object):                                        # {{{1
 
   args_are_mandatory = False
 
+  # NB: the (public, private) slots of each class are computed once
+  # (see _slot_table); subclasses may override ___slots (e.g. w/
+  # fields that are properties)
   @property
   def ___slots(self):
-    return [x for x in self.__slots__ if not x.startswith("_")]
-
+    return self._slot_table()[0]
+
+  @classmethod
+  def _slot_table(cls):
+    """(public, private) slots of cls (computed once per class)"""
+    t = cls.__dict__.get("_Immutable__slot_table")
+    if t is None:
+      ss = cls.__slots__
+      t  = (tuple(x for x in ss if not x.startswith("_")),
+            tuple(x for x in ss if x.startswith("_")))
+      cls.__slot_table = t
+    return t
+
+  # NB: private slots are set to None
   def __init__(self, data = None, **kw):
     x = data if data is not None else {}; x.update(kw)
-    ks = set(x.keys()); ss = set(self.___slots)
-    for k in self.___slots:
-      if k in x:
-        self._Immutable___set(k, x[k]); del x[k]
-      else:
-        self._Immutable___set(k, None)
+    public, private = self._slot_table(); slots = self.___slots
+    missing = self.args_are_mandatory and \
+              [ k for k in slots if k not in x ]
+    for k in slots: _setattr(self, k, x.pop(k, None))
+    for k in private: _setattr(self, k, None)
     if len(x):
       raise TypeError("unknown keys: {}".format(", ".join(x.keys())))
-    if self.args_are_mandatory and ks != ss:
-      raise TypeError("missing keys: {}".format(", ".join(ss - ks)))
+    if missing:
+      raise TypeError("missing keys: {}".format(", ".join(missing)))
+
+  # NB: for internal use by callers that know the values are valid
+  @classmethod
+  def _make(cls, **kw):
+    """new instance w/ (all) slots set from kw (or None), w/o
+    defaults or validation"""
+    self = cls.__new__(cls)
+    for k in cls.__slots__: _setattr(self, k, kw.get(k))
+    return self
 
   def ___set(self, k, v):
-    super(Immutable, self).__setattr__(k, v)
+    _setattr(self, k, v)
 
   def __setattr__(self, k, v):
     if k in self.___slots:
@@ -202,6 +397,13 @@ if sys.version_info.major == 2:
   def BY(x):
     """-> bytes"""
     return bytes(x)
+  def BUF(x):
+    """-> bytes (python2 file objects only take str)"""
+    if isinstance(x, memoryview): return x.tobytes()
+    return bytes(x)
+  def LATIN1(x):
+    """bytes (header block) -> str"""
+    return bytes(x)
 else:
   def STR(x):
     """-> str"""
@@ -211,6 +413,13 @@ else:
     """-> bytes"""
     if isinstance(x, bytes): return x
     return bytes(x, encoding = "utf8")
+  def BUF(x):
+    """-> bytes-like (bytes, bytearray or memoryview; w/o copying)"""
+    if isinstance(x, (bytes, bytearray, memoryview)): return x
+    return BY(x)
+  def LATIN1(x):
+    """bytes (header block) -> str"""
+    return bytes(x).decode("latin-1")
 
 # ...
 
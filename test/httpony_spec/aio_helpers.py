@@ -0,0 +1,112 @@
+# --                                                            ; {{{1
+#
+# File        : aio_helpers.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+# NB: python >= 3.6 only; the specs import this conditionally
+
+import asyncio
+import concurrent.futures
+import httpony.aserver as AS
+import httpony.astream as A
+import httpony.handler as H
+import threading
+
+def run(coro):
+  loop = asyncio.new_event_loop()
+  try:
+    return loop.run_until_complete(coro)
+  finally:
+    loop.close()
+
+async def collect(xs):
+  return [ x async for x in xs ]
+
+async def chunker(si):
+  while True:
+    n = int(await si.readline())
+    if n == 0: break
+    yield await si.split(n)[0].read()
+    await si.readline()
+
+async def roundtrip():
+  async def serve(r, w):
+    si, so = A.reader_streams(r, w)
+    t, d = si.split(int(await si.readline()))
+    await so.writev([b"<", await t.read(), b">"])
+    await so.write(bytearray(await d.readline())); await so.close()
+  server  = await asyncio.start_server(serve, "127.0.0.1", 0)
+  port    = server.sockets[0].getsockname()[1]
+  si, so  = A.reader_streams(
+              *await asyncio.open_connection("127.0.0.1", port))
+  await so.write(memoryview(b"3\nfoobar\n")); await so.flush()
+  data = await si.read()
+  await so.close(); server.close(); await server.wait_closed()
+  return data
+
+async def read_exact_and_read1(data):
+  r = asyncio.StreamReader(); r.feed_data(data.encode())
+  r.feed_eof(); si = A.AsyncIReaderStream(r)
+  return [await si.read1(2), await si.read(3), await si.read(5),
+          await si.read()]
+
+class RecordingExecutor(concurrent.futures.ThreadPoolExecutor):
+  def __init__(self):
+    super().__init__(1); self.calls = 0
+  def submit(self, *args, **kwargs):
+    self.calls += 1; return super().submit(*args, **kwargs)
+
+AX = H.Handler("AX")
+
+@AX.get("/async/:id")
+async def get_async(self, id):
+  await asyncio.sleep(0.01)
+  self.headers["X-Async"] = "yes"
+  return "async {}".format(id)
+
+@AX.post("/echo")
+def post_echo(self):
+  return self.request.force_body
+
+streaming = threading.Event()
+
+@AX.get("/stream")
+def get_stream(self):
+  def body():
+    yield "foo"; streaming.wait(5); yield "bar"
+  return dict(body = body())
+
+@AX.any("/:id")
+def get_id(self, id):
+  return "id {}".format(id)
+
+async def serve_requests(server, data, timeout = None):
+  aserver = await AS.start(server, "127.0.0.1", 0, timeout = timeout)
+  port    = aserver.sockets[0].getsockname()[1]
+  r, w    = await asyncio.open_connection("127.0.0.1", port)
+  w.write(data); data = await r.read()
+  w.close(); aserver.close(); await aserver.wait_closed()
+  return data
+
+# NB: the head must arrive before the body is finished
+async def stream_head(server):
+  aserver = await AS.start(server, "127.0.0.1", 0)
+  port    = aserver.sockets[0].getsockname()[1]
+  r, w    = await asyncio.open_connection("127.0.0.1", port)
+  streaming.clear()
+  try:
+    w.write(b"GET /stream HTTP/1.1\r\nConnection: close\r\n\r\n")
+    head = await asyncio.wait_for(r.readuntil(b"\r\n\r\n"), 2)
+    streaming.set(); data = await r.read()
+  finally:
+    streaming.set()
+    w.close(); aserver.close(); await aserver.wait_closed()
+  return head, data
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -0,0 +1,96 @@
+# --                                                            ; {{{1
+#
+# File        : aserver_spec.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+import httpony.server as S
+import httpony.stream as ST
+import os
+import sys
+import unittest
+
+try:
+  from .aio_helpers import run, serve_requests, stream_head, AX
+except (ImportError, SyntaxError):
+  AX = None
+
+def bodies(data):
+  return [ x.split(b"\r\n\r\n", 1)[1]
+           for x in data.split(b"HTTP/1.1 ")[1:] ]
+
+@unittest.skipIf(AX is None, "python >= 3.6 only")
+class Test_aserver(unittest.TestCase):                          # {{{1
+
+  def setUp(self):
+    self.stdout = sys.stdout; sys.stdout = open(os.devnull, "w")
+
+  def tearDown(self):
+    sys.stdout.close(); sys.stdout = self.stdout
+
+  def request(self, data, **kw):
+    return run(serve_requests(S.Server(AX, **kw), data))
+
+  def test_pipelining(self):
+    reqs = b"".join(
+      "GET /{} HTTP/1.1\r\nHost: x\r\n\r\n".format(i).encode()
+      for i in range(10)
+    ) + b"GET /x HTTP/1.1\r\nConnection: close\r\n\r\n"
+    self.assertEqual(bodies(self.request(reqs)),
+                     [ "id {}".format(i).encode()
+                       for i in list(range(10)) + ["x"] ])
+
+  def test_async_route(self):
+    data = self.request(b"GET /async/1 HTTP/1.1\r\n\r\n"
+                        b"GET /async/2 HTTP/1.1\r\n"
+                        b"Connection: close\r\n\r\n")
+    self.assertEqual(data.count(b"X-Async: yes\r\n"), 2)
+    self.assertEqual(bodies(data), [b"async 1", b"async 2"])
+
+  def test_bodies(self):
+    data = self.request(
+      b"POST /echo HTTP/1.1\r\nContent-Length: 3\r\n\r\nfoo"
+      b"POST /echo HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+      b"3\r\nbar\r\n3\r\nbaz\r\n0\r\n\r\n"
+      b"HEAD /1 HTTP/1.1\r\nConnection: close\r\n\r\n"
+    )
+    self.assertEqual(bodies(data), [b"foo", b"barbaz", b""])
+    self.assertIn(b"Connection: close\r\n", data)
+
+  def test_spilled_body(self):
+    body = b"x" * (ST.DEFAULT_SPILL_SIZE + 1)
+    data = self.request(b"POST /echo HTTP/1.1\r\nConnection: close"
+                        b"\r\nContent-Length: " +
+                        str(len(body)).encode() + b"\r\n\r\n" + body)
+    self.assertEqual(bodies(data), [body])
+
+  def test_streaming_head(self):
+    head, data = run(stream_head(S.Server(AX)))
+    self.assertIn(b"Transfer-Encoding: chunked", head)
+    self.assertTrue(data.endswith(b"bar\r\n0\r\n\r\n"))
+
+  def test_limits(self):
+    data = self.request(b"GET /1 HTTP/1.1\r\n\r\n"
+                        b"GET /2 HTTP/1.1\r\n" + b"X-Foo: 1\r\n" * 5 +
+                        b"\r\nGET /3 HTTP/1.1\r\n\r\n",
+                        limits = dict(max_headers = 4))
+    self.assertEqual(bodies(data), [b"id 1", b""])
+    self.assertIn(b"431 Request Header Fields Too Large", data)
+
+  def test_timeout(self):
+    req  = b"GET /1 HTTP/1.1\r\n\r\n"       # w/o Connection: close
+    data = run(serve_requests(S.Server(AX), req, timeout = 0.1))
+    self.assertEqual(bodies(data), [b"id 1"])
+                                                                # }}}1
+
+# ...
+
+if __name__ == "__main__":
+  unittest.main()
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
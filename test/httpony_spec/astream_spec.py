@@ -0,0 +1,147 @@
+# --                                                            ; {{{1
+#
+# File        : astream_spec.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+import httpony.stream as S
+import unittest
+
+try:
+  import httpony.astream as A
+  from .aio_helpers import run, collect, chunker, roundtrip, \
+                           read_exact_and_read1, RecordingExecutor
+except (ImportError, SyntaxError):
+  A = None
+
+@unittest.skipIf(A is None, "python >= 3.6 only")
+class Test_AsyncIBytesStream(unittest.TestCase):                # {{{1
+
+  def test_read(self):
+    s = A.AsyncIBytesStream("foo bar baz")
+    self.assertEqual(run(s.read(7)), b"foo bar")
+    self.assertEqual(run(s.read()), b" baz")
+
+  def test_readlines(self):
+    s = A.AsyncIBytesStream("foo\nbar\nbaz\n")
+    self.assertEqual(run(collect(s)), [b"foo\n", b"bar\n", b"baz\n"])
+
+  def test_readchunks(self):
+    s = A.AsyncIBytesStream("foo\nbar\nbaz\n")
+    self.assertEqual(run(collect(s.readchunks(8))),
+                     [b"foo\nbar\n", b"baz\n"])
+
+  def test_split(self):
+    s     = A.AsyncIBytesStream("foo\nbar\nbaz\n")
+    t, d  = s.split(10, 1)
+    self.assertEqual(run(t.readline()), b"foo\n")
+    self.assertEqual(run(d.read()), b"z\n")
+    self.assertEqual(run(collect(t)), [b"bar\n", b"ba"])
+
+  def test_split_readinto(self):
+    s     = A.AsyncIBytesStream("foo\nbar\nbaz\n")
+    t, d  = s.split(10, 2)
+    b     = bytearray(6)
+    self.assertEqual(run(t.peek()), b"fo")
+    self.assertEqual(run(t.readinto(b)), 6)
+    self.assertEqual(b, b"foo\nba")
+
+  def test_split_readline_max_line(self):
+    s     = A.AsyncIBytesStream("foo\n" + "x" * 100)
+    t, d  = s.split(104, 8)
+    self.assertEqual(run(t.readline(4)), b"foo\n")
+    with self.assertRaises(S.LineTooLong):
+      run(t.readline(50))
+
+  def test_splitchunked(self):
+    s     = A.AsyncIBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux")
+    t, d  = s.splitchunked(chunker, 2)
+    self.assertEqual(run(t.read(4)), b"foob")
+    self.assertEqual(run(d.read()), b"qux")
+    self.assertEqual(run(t.read()), b"ar\nbaz")
+                                                                # }}}1
+
+@unittest.skipIf(A is None, "python >= 3.6 only")
+class Test_AsyncIConnectionStream(unittest.TestCase):           # {{{1
+
+  def test_split(self):
+    s     = A.AsyncIConnectionStream(
+              A.AsyncIBytesStream("foo\nbar\nbaz\n"))
+    t, d  = s.split(4)
+    self.assertIs(d, s)
+    self.assertEqual(run(d.readline()), b"bar\n")
+    self.assertEqual(run(t.read()), b"foo\n")
+    u, e  = d.split(2)
+    self.assertEqual(run(u.read()), b"ba")
+    self.assertEqual(run(e.read()), b"z\n")
+
+  def test_splitchunked_spill(self):
+    s     = A.AsyncIConnectionStream(
+              A.AsyncIBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux"),
+              "spill", 4)
+    t, d  = s.splitchunked(chunker, 2)
+    self.assertEqual(run(t.read(2)), b"fo")
+    self.assertEqual(run(d.read()), b"qux")
+    self.assertFalse(t.done())
+    self.assertEqual(run(t.read()), b"obar\nbaz")
+    self.assertTrue(t.done())
+    self.assertTrue(t._spooled.file.closed)
+
+  def test_split_spill_executor(self):
+    e     = RecordingExecutor()
+    p     = A.AsyncIBytesStream("foo\nbar\nbaz\n"); p.executor = e
+    s     = A.AsyncIConnectionStream(p, "spill", 4)
+    t, d  = s.split(8, 2)
+    try:
+      self.assertEqual(run(d.read()), b"baz\n")
+      self.assertGreater(e.calls, 0)
+      self.assertEqual(run(t.read()), b"foo\nbar\n")
+      self.assertTrue(t._spooled.file.closed)
+    finally:
+      e.shutdown()
+
+  def test_split_discard(self):
+    s     = A.AsyncIConnectionStream(
+              A.AsyncIBytesStream("foo\nbar\nbaz\n"), "discard")
+    t, d  = s.split(8, 2)
+    self.assertEqual(run(d.read()), b"baz\n")
+    self.assertEqual(run(t.read()), b"")
+                                                                # }}}1
+
+@unittest.skipIf(A is None, "python >= 3.6 only")
+class Test_AsyncReaderWriterStreams(unittest.TestCase):         # {{{1
+
+  def test_roundtrip(self):
+    self.assertEqual(run(roundtrip()), b"<foo>bar\n")
+
+  def test_sendfile_fallback(self):
+    so = A.AsyncOBytesStream()
+    si = S.IBytesStream("foo bar")
+    self.assertEqual(run(so.sendfile(si, 5)), 5)
+    self.assertEqual(so.getvalue(), b"foo b")
+
+  def test_sendfile_fallback_executor(self):
+    e  = RecordingExecutor(); so = A.AsyncOBytesStream()
+    si = S.IBytesStream("foo bar"); so.executor = e
+    try:
+      self.assertEqual(run(so.sendfile(si)), 7)
+      self.assertGreater(e.calls, 0)
+    finally:
+      e.shutdown()
+
+  def test_read_exact_and_read1(self):
+    self.assertEqual(run(read_exact_and_read1("foo bar")),
+                     [b"fo", b"o b", b"ar", b""])
+                                                                # }}}1
+
+# ...
+
+if __name__ == "__main__":
+  unittest.main()
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -0,0 +1,100 @@
+# --                                                            ; {{{1
+#
+# File        : compress_spec.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+import httpony.compress as C
+import httpony.http as H
+import httpony.stream as S
+import unittest
+import zlib
+
+HTML = b"<li>foo</li>\n" * 200
+
+def gunzip(data):
+  return zlib.decompress(data, zlib.MAX_WBITS | 16)
+
+class Test_compress(unittest.TestCase):                         # {{{1
+
+  def setUp(self):
+    self.req = H.Request(headers = { "Accept-Encoding": "gzip" })
+
+  def test_accepted_encoding(self):
+    self.assertEqual(C.accepted_encoding("gzip, deflate"), "gzip")
+    self.assertEqual(C.accepted_encoding("deflate;q=1, gzip;q=0.5"),
+                     "deflate")
+    self.assertEqual(C.accepted_encoding("gzip;q=0, *"), "deflate")
+    self.assertEqual(C.accepted_encoding("br, identity"), None)
+    self.assertEqual(C.accepted_encoding(None), None)
+
+  def test_compressible(self):
+    self.assertTrue(C.compressible("text/html; charset=utf-8"))
+    self.assertTrue(C.compressible("application/json"))
+    self.assertTrue(C.compressible("image/svg+xml"))
+    self.assertFalse(C.compressible("image/png"))
+    self.assertFalse(C.compressible("application/zip"))
+
+  def test_compress_response(self):
+    resp = H.Response(headers = { "Content-Type": "text/html",
+                                  "ETag": '"foo"' }, body = HTML)
+    r = C.compress_response(self.req, resp)
+    self.assertEqual(r.headers["Content-Encoding"], "gzip")
+    self.assertEqual(r.headers["Vary"], "Accept-Encoding")
+    self.assertEqual(r.headers["ETag"], 'W/"foo"')
+    self.assertEqual(gunzip(r.force_body), HTML)
+    self.assertIn(b"Content-Length:", r.unparse())
+
+  def test_compress_response_deflate(self):
+    req   = H.Request(headers = { "Accept-Encoding": "deflate" })
+    resp  = H.Response(body = HTML)
+    r     = C.compress_response(req, resp)
+    self.assertEqual(r.headers["Content-Encoding"], "deflate")
+    self.assertEqual(zlib.decompress(r.force_body), HTML)
+
+  def test_compress_response_streaming(self):
+    resp  = H.Response(body = (x for x in [HTML, b"", HTML]))
+    r     = C.compress_response(self.req, resp)
+    data  = r.unparse()
+    self.assertIn(b"Transfer-Encoding: chunked", data)
+    body  = next(H.responses(S.IBytesStream(data))).force_body
+    self.assertEqual(gunzip(body), HTML * 2)
+
+  def test_compress_chunks_flush(self):
+    xs = list(C.compress_chunks([HTML, H.FLUSH, HTML], "deflate"))
+    i  = xs.index(H.FLUSH)
+    z  = zlib.decompressobj()
+    self.assertEqual(z.decompress(b"".join(xs[:i])), HTML)
+    self.assertEqual(z.decompress(b"".join(xs[i+1:])), HTML)
+
+  def test_compress_response_skip(self):
+    small = H.Response(body = b"foo")
+    png   = H.Response(headers = { "Content-Type": "image/png" },
+                       body = HTML)
+    nm    = H.Response(status = 304)
+    part  = H.Response(status = 206, body = HTML)
+    rng   = H.Response(headers = { "Content-Range": "bytes 0-9/99" },
+                       body = HTML)
+    for r in [small, png, nm, part, rng]:
+      self.assertIs(C.compress_response(self.req, r), r)
+    self.assertNotIn("Vary", small.headers)
+
+  def test_compress_response_not_accepted(self):
+    resp  = H.Response(headers = { "Vary": "Cookie" }, body = HTML)
+    r     = C.compress_response(H.Request(), resp)
+    self.assertIs(r, resp)
+    self.assertEqual(r.headers["Vary"], "Cookie, Accept-Encoding")
+    self.assertEqual(r.force_body, HTML)
+                                                                # }}}1
+
+# ...
+
+if __name__ == "__main__":
+  unittest.main()
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
@@ -11,8 +11,12 @@
 
 import httpony.handler as H
 import httpony.http as HTTP
+import httpony.stream as S
+import os
 import unittest
 
+TEST_DATA = os.path.join(os.path.dirname(__file__), "../../test-data")
+
 X = H.Handler("X")
 
 @X.get("/foo/:id")
@@ -23,10 +27,21 @@ def get_foo(self, id):
 def oops(self):
   return (404, {}, "oops")
 
+@X.get("/old/:id")
+def old(self, id):
+  return self.redirect("/foo/{}".format(id))
+
 @X.any("/*")
 def the_rest(self, splat):
   return (404, {}, splat)
 
+Z = H.Handler("Z")
+
+@Z.post("/sum")
+def post_sum(self):
+  body = self.request.force_body
+  return "{} {}".format(body.decode(), self.request.trailers["X-Sum"])
+
 @H.handler
 class Y:                                                        # {{{1
 
@@ -62,6 +77,16 @@ class Test_Handler(unittest.TestCase):                          # {{{1
     resp  = X()(req)
     self.assertEqual(resp, HTTP.Response(status = 404,
                                          body = "some/where"))
+
+  def test_redirect(self):
+    n     = len(HTTP._canned)
+    req   = HTTP.Request(uri = "/old/42")
+    resp  = X()(req)
+    self.assertEqual(resp, HTTP.Response(
+      status = 302, headers = dict(Location = "/foo/42")
+    ))
+    self.assertNotIsInstance(resp, HTTP.CannedResponse)
+    self.assertEqual(len(HTTP._canned), n)
                                                                 # }}}1
 
 class Test_handler(unittest.TestCase):                          # {{{1
@@ -77,6 +102,33 @@ class Test_handler(unittest.TestCase):                          # {{{1
     self.assertEqual(resp, HTTP.Response(status = 404))
                                                                 # }}}1
 
+class Test_static(unittest.TestCase):                           # {{{1
+
+  def test_content_type(self):
+    h = H.static(path = TEST_DATA)
+    for uri, ct in [("/dir/index.html", "text/html"),
+                    ("/dir/img/1.png", "image/png"),
+                    ("/dir/", "text/html")]:
+      resp = H.handle(h, HTTP.Request(uri = uri))
+      self.assertEqual(resp.headers["Content-Type"], ct)
+      resp._file.close()
+                                                                # }}}1
+
+class Test_context(unittest.TestCase):                          # {{{1
+
+  def test_trailers(self):
+    r     = b"POST /api/sum HTTP/1.1\r\nTransfer-Encoding: chunked" \
+            b"\r\n\r\n3\r\n1+2\r\n0\r\nX-Sum: 3\r\n\r\n"
+    req   = next(HTTP.requests(S.IBytesStream(r)))
+    resp  = H.handle(H.context(("/api", Z)), req)
+    self.assertEqual(resp, HTTP.Response(body = "1+2 3"))
+
+  def test_copy(self):
+    r     = b"POST /api/sum HTTP/1.1\r\nContent-Length: 3\r\n\r\n1+2"
+    req   = next(HTTP.requests(S.IBytesStream(r)))
+    self.assertEqual(req.with_uri("/sum")._content_length, 3)
+                                                                # }}}1
+
 # ...
 
 if __name__ == "__main__":
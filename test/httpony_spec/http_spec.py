@@ -12,8 +12,14 @@
 import httpony.http as H
 import httpony.stream as S
 import httpony.util as U
+import os
+import tempfile
+import time
 import unittest
 
+INDEX_HTML = os.path.join(os.path.dirname(__file__),
+                          "../../test-data/dir/index.html")
+
 class Test_URI(unittest.TestCase):                              # {{{1
 
   def setUp(self):
@@ -75,6 +81,30 @@ class Test_URI(unittest.TestCase):                              # {{{1
     self.assertEqual(self.x, self.x.uri)
     self.assertEqual(self.x, self.x.uri_with_fragment)
     self.assertEqual(self.y, self.y.uri_with_fragment)
+
+  def test_relative(self):
+    x = H.URI("/foo;bar?x=1#baz")
+    self.assertEqual(x, "http:///foo;bar?x=1#baz")
+    self.assertEqual((x.host, x.port, x.path, x.query, x.fragment),
+                     ("", 80, "/foo;bar", "x=1", "baz"))
+
+  def test_lazy(self):
+    x = H.URI("/lazy?x=1")
+    self.assertIsNone(x._parts)
+    self.assertEqual(x.path, "/lazy")
+    self.assertIs(H.URI("/lazy?x=1")._parsed(), x._parts)
+
+  def test_with(self):
+    x = self.y.with_host_and_port("Example.org:8080")
+    self.assertEqual(x, "http://foo@example.org:8080"
+                        "/foo?x=42&y=37&x=99")
+    self.assertEqual(x.with_scheme("https").port, 8080)
+    self.assertEqual(self.y.with_scheme("https").port, 443)
+    self.assertEqual(self.z.with_path("qux").uri,
+                     "https://example.org/qux")
+    self.assertEqual(self.z.with_path("/qux?y=2").query, "y=2")
+    self.assertEqual(H.URI("/").with_host_and_port("[::1]:81").uri,
+                     "http://[::1]:81/")
                                                                 # }}}1
 
 class Test_Request(unittest.TestCase):                          # {{{1
@@ -189,8 +219,47 @@ class Test_Request(unittest.TestCase):                          # {{{1
       U.STR(x.unparse()),
       "\\APOST /foo HTTP/1.1\r\n((Foo|X|Transfer-Encoding): "
       "(bar|42|chunked)\r\n)+"
-      "\r\n3\r\n<bo\r\n3\r\ndy>\r\n0\r\n\r\n\\Z"
+      "\r\n6\r\n<body>\r\n0\r\n\r\n\\Z"
     )
+
+  def test_unparse_chunked_pieces(self):
+    x = H.Request(method = "POST", uri = "/foo",
+                  body = (x for x in ["<bo", "", "dy>", H.FLUSH,
+                                      "!"]))
+    self.assertEqual(list(x.unparse_chunked())[1:], [
+      b"6\r\n", b"<bo", b"dy>", b"\r\n", b"1\r\n", b"!", b"\r\n",
+      b"0\r\n\r\n"
+    ])
+
+  def test_unparse_chunked_min_size(self):
+    class R(H.Request): chunk_min_size = 4
+    x = R(method = "POST", uri = "/foo",
+          body = (x for x in ["<bo", "dy>", "<", "/body>"]))
+    self.assertEqual(list(x.unparse_chunked())[1:], [
+      b"6\r\n", b"<bo", b"dy>", b"\r\n", b"7\r\n", b"<", b"/body>",
+      b"\r\n", b"0\r\n\r\n"
+    ])
+
+  def test_unparse_to_flush(self):
+    class S_(S.OBytesStream):
+      def flush(self): self.flushes.append(self.getvalue())
+    x = H.Request(method = "POST", uri = "/foo",
+                  body = (x for x in ["<bo", H.FLUSH, "dy>"]))
+    s = S_(); s.flushes = []
+    x.unparse_to(s)
+    self.assertEqual(len(s.flushes), 3)   # head & each frame
+    self.assertTrue(s.flushes[0].endswith(b"\r\n\r\n"))
+    self.assertTrue(s.flushes[1].endswith(b"3\r\n<bo\r\n"))
+    self.assertTrue(s.flushes[2].endswith(b"3\r\ndy>\r\n"))
+
+  def test_unparse_to(self):
+    x = H.Request(method = "POST", uri = "/foo",
+                  body = (x for x in ["<bo", "dy>"]))
+    y = H.Request(method = "POST", uri = "/foo",
+                  body = (x for x in ["<bo", "dy>"]))
+    s = S.OBytesStream()
+    x.unparse_to(s)
+    self.assertEqual(s.getvalue(), y.unparse())
                                                                 # }}}1
 
 class Test_Response(unittest.TestCase):                         # {{{1
@@ -265,10 +334,109 @@ class Test_Response(unittest.TestCase):                         # {{{1
       "\\AHTTP/1.1 200 OK\r\n((Foo|X|Content-Length): "
       "(bar|42|6)\r\n)+\r\n<body>\\Z"
     )
+
+  def test_unparse_status_line(self):
+    x = H.Response(status = 404, headers = { "x-foo": 1 })
+    y = H.Response(status = 404, reason = "Gone Fishing")
+    z = H.Response(status = 599, reason = "Custom")
+    self.assertIs(x._start_line_bytes(), H.STATUS_LINES[404])
+    self.assertEqual(sorted(x.unparse().split(b"\r\n")),
+                     [b"", b"", b"Content-Length: 0",
+                      b"HTTP/1.1 404 Not Found", b"x-foo: 1"])
+    self.assertEqual(y._start_line_bytes(),
+                     b"HTTP/1.1 404 Gone Fishing\r\n")
+    self.assertEqual(z._start_line_bytes(),
+                     b"HTTP/1.1 599 Custom\r\n")
+
+  def test_canned(self):
+    x = H.CannedResponse(status = 404, body = "oops")
+    y = H.Response(status = 404, body = "oops")
+    self.assertEqual(x, y)
+    self.assertEqual(x.unparse(), y.unparse())
+    self.assertEqual(x.unparse_canned(dict(Connection = "close")),
+                     b"HTTP/1.1 404 Not Found\r\n"
+                     b"Content-Length: 4\r\nConnection: close\r\n"
+                     b"\r\noops")
+    self.assertEqual(x.unparse_canned(with_body = False),
+                     b"HTTP/1.1 404 Not Found\r\n"
+                     b"Content-Length: 4\r\n\r\n")
+    self.assertEqual(x.headers, {})
+
+  def test_canned_extra_headers(self):
+    x = H.CannedResponse((301, dict(Location = "/foo"), ""))
+    self.assertEqual(
+      sorted(x.unparse_canned(dict(Location = "/bar",
+                                   Date = "today")).split(b"\r\n")),
+      [b"", b"", b"Content-Length: 0", b"Date: today",
+       b"HTTP/1.1 301 Moved Permanently", b"Location: /foo"]
+    )
+
+  def test_canned_thaw(self):
+    x = H.canned(403); y = x.thaw()
+    self.assertIs(H.canned(403), x)
+    self.assertIsNot(H.canned(403, dict(X = "y")), x)
+    self.assertNotIsInstance(y, H.CannedResponse)
+    y.headers["X"] = "y"
+    self.assertEqual(x.headers, {})
+
+  def test_unparse_file(self):
+    with open(INDEX_HTML, "rb") as f: data = f.read()
+    si    = S.ifile_stream(INDEX_HTML); self.addCleanup(si.close)
+    x     = H.Response(body = si)
+    self.assertEqual(
+      x.unparse(), b"HTTP/1.1 200 OK\r\nContent-Length: " +
+      U.BY(str(len(data))) + b"\r\n\r\n" + data
+    )
+
+  def test_unparse_to_file(self):
+    si    = S.ifile_stream(INDEX_HTML); self.addCleanup(si.close)
+    ti    = S.ifile_stream(INDEX_HTML); self.addCleanup(ti.close)
+    x     = H.Response(body = si)
+    y     = H.Response(body = ti)
+    so    = S.OBytesStream()
+    x.unparse_to(so)
+    self.assertEqual(so.getvalue(), y.unparse())
+
+  def test_unparse_to_pipe(self):
+    r, w  = os.pipe(); os.write(w, b"foo"); os.close(w)
+    si    = S.IFileStream(os.fdopen(r, "rb"), 3)
+    self.addCleanup(si.close)
+    x     = H.Response(body = si)
+    so    = S.OBytesStream()
+    self.assertIsNone(x._file)
+    x.unparse_to(so)
+    self.assertEqual(so.getvalue(), b"HTTP/1.1 200 OK\r\n"
+                                    b"Content-Length: 3\r\n\r\nfoo")
+
+  def test_unparse_to_truncated_file(self):
+    f     = tempfile.TemporaryFile(); f.write(b"foo"); f.seek(0)
+    si    = S.IFileStream(f, 7); self.addCleanup(si.close)
+    x     = H.Response(body = si)
+    self.assertIs(x._file, si)
+    with self.assertRaisesRegexp(H.Error, "sent 3 of 7 bytes"):
+      x.unparse_to(S.OBytesStream())
                                                                 # }}}1
 
 class Test_http(unittest.TestCase):                             # {{{1
 
+  def test_coalesce(self):
+    xs = ["a", "", "bc", H.FLUSH, "d", "efgh", "i"]
+    self.assertEqual(list(H.coalesce(xs, 4)), [
+      [b"a", b"bc"], H.FLUSH, [b"d", b"efgh"], [b"i"]
+    ])
+
+  def test_coalesce_delay(self):
+    def slow():
+      yield "a"; yield "b"; time.sleep(0.02); yield "c"; yield "d"
+    self.assertEqual(list(H.coalesce(slow(), 100, 0.01)),
+                     [[b"a", b"b", b"c"], [b"d"]])
+
+  def test_coalesce_flush_delay(self):
+    def slow():
+      yield "a"; time.sleep(0.02); yield H.FLUSH; yield "b"; yield "c"
+    self.assertEqual(list(H.coalesce(slow(), 100, 0.01)),
+                     [[b"a"], H.FLUSH, [b"b", b"c"]])
+
   def test_requests_w_forced_bodies(self):
     r1  = "GET /foo HTTP/1.1\r\nContent-Length: 7\r\n\r\n<body1>"
     r2  = "GET /bar HTTP/1.1\r\nContent-Length: 7\r\n\r\n<body2>"
@@ -286,6 +454,70 @@ class Test_http(unittest.TestCase):                             # {{{1
       ]
     )
 
+  def test_requests_unread_bodies(self):
+    r   = "GET /foo HTTP/1.1\r\nContent-Length: 7\r\n\r\n<body1>"
+    xs  = list(H.requests(S.IBytesStream(r * 100)))
+    self.assertEqual(len(xs), 100)
+    self.assertEqual(xs[-1].force_body, b"<body1>")
+    self.assertEqual(xs[0].force_body, b"<body1>")
+
+  def test_requests_from_head(self):
+    r = "GET /foo HTTP/1.1\r\nHost: example.com:8080\r\n\r\n"
+    x = next(H.requests(S.IBytesStream(r)))
+    self.assertEqual(x.uri.uri, "http://example.com:8080/foo")
+    self.assertEqual((x.env, x.force_body), ({}, b""))
+    self.assertEqual(x, H.Request(uri = "/foo", headers = {
+                                    "Host": "example.com:8080" }))
+    r = "HTTP/1.1 404 Nope\r\n\r\n"
+    y = next(H.force_bodies(H.responses(S.IBytesStream(r))))
+    self.assertEqual(y, H.Response(status = 404, reason = "Nope",
+                                   body = ""))
+
+  def test_requests_trailers(self):
+    r   = "POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n" \
+          "3;x=y\r\nfoo\r\n0\r\nX-Sum: 42\r\n\r\n" \
+          "GET / HTTP/1.1\r\n\r\n"
+    x, y = H.requests(S.IBytesStream(r))
+    self.assertEqual(x.force_body, b"foo")
+    self.assertEqual(x.trailers, { "X-Sum": "42" })
+    self.assertEqual(y.trailers, None)
+
+  def test_responses_passthrough(self):
+    r = b"HTTP/1.1 200 OK\r\nx-FOO: bar\r\nContent-Length: 3\r\n" \
+        b"Vary: Cookie\r\nvary: Accept\r\n\r\nfoo"
+    x = next(H.responses(S.IBytesStream(r)))      # body not forced
+    self.assertEqual(x.headers["Vary"], "Accept")
+    self.assertEqual(x.unparse(), r)
+    self.assertNotIn("_data", vars(x.headers))    # not decoded
+    x = next(H.responses(S.IBytesStream(r))); x.force_body
+    x.headers["X-Bar"] = "baz"; y = x.unparse()
+    self.assertEqual(len(y), len(r) - len(b"Vary: Cookie\r\n") +
+                             len(b"X-Bar: baz\r\n"))
+    for h in [b"x-FOO: bar", b"vary: Accept", b"X-Bar: baz"]:
+      self.assertIn(h + b"\r\n", y)
+
+  def test_unparse_te_and_cl(self):
+    raw = b"Content-Length: 3\r\nTransfer-Encoding: chunked\r\n"
+    x = H.Response(status = 200, headers = U.raw_idict(raw),
+                   body = (c for c in ["foo"]))
+    self.assertEqual(x.unparse(),
+                     b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked"
+                     b"\r\n\r\n3\r\nfoo\r\n0\r\n\r\n")
+    r = b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n" \
+        b"3\r\nfoo\r\n0\r\n\r\n"
+    x = next(H.responses(S.IBytesStream(r))); x.force_body
+    self.assertEqual(x.unparse(), b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Length: 3\r\n\r\nfoo")
+    self.assertEqual(next(H.responses(S.IBytesStream(r))).unparse(),
+                     r)
+
+  def test_requests_passthrough(self):
+    r = b"POST /foo HTTP/1.1\r\nHost: x\r\nContent-Length: 3\r\n" \
+        b"\r\nfoo"
+    x = next(H.requests(S.IBytesStream(r + r))); s = S.OBytesStream()
+    x.unparse_to(s)
+    self.assertEqual(s.getvalue(), r)
+
   def test_responses_w_forced_bodies(self):
     r1  = "HTTP/1.1 200 OK\r\nContent-Length: 6\r\n\r\n<body>"
     r2  = "HTTP/1.1 404 Not Found\r\n\r\n"
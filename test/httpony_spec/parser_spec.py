@@ -0,0 +1,311 @@
+# --                                                            ; {{{1
+#
+# File        : parser_spec.py
+# Maintainer  : Felix C. Stegerman <flx@obfusk.net>
+# Date        : 2026-10-18
+#
+# Copyright   : Copyright (C) 2015  Felix C. Stegerman
+# Licence     : LGPLv3+
+#
+# --                                                            ; }}}1
+
+import httpony.parser as P
+import httpony.stream as S
+import unittest
+
+REQS = b"POST /foo HTTP/1.1\r\nHost: example.com\r\n" \
+       b"Content-Length: 5\r\n\r\nhello\r\n" \
+       b"PUT /bar HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n" \
+       b"3;x=y\r\nfoo\r\n4\r\nbar!\r\n0\r\nX-Foo: 1\r\n\r\n"
+
+def all_events(p):
+  evs = []
+  while True:
+    ev = p.next_event()
+    if ev is P.NEED_DATA: return evs
+    evs.append(ev)
+    if isinstance(ev, P.ConnectionClosed): return evs
+
+def feed(p, data, n):
+  evs = []
+  for i in range(0, len(data), n):
+    p.receive_data(data[i:i+n]); evs += all_events(p)
+  p.receive_data(b""); return evs + all_events(p)
+
+def summary(evs):
+  out, data = [], False
+  for ev in evs:
+    if isinstance(ev, P.Data):
+      if data:
+        out[-1] += bytes(bytearray(ev.data))
+      else:
+        out.append(bytes(bytearray(ev.data)))
+    else:
+      out.append(type(ev).__name__)
+    data = isinstance(ev, P.Data)
+  return out
+
+class Test_RequestParser(unittest.TestCase):                    # {{{1
+
+  def test_events(self):
+    evs = feed(P.RequestParser(), REQS, len(REQS))
+    self.assertEqual(evs[0].method, "POST")
+    self.assertEqual(evs[0].uri, "/foo")
+    self.assertEqual(evs[0].headers["host"], "example.com")
+    self.assertEqual(evs[3].method, "PUT")
+    self.assertEqual(summary(evs), [
+      "RequestHead", b"hello", "EndOfMessage", "RequestHead",
+      b"foobar!", "EndOfMessage", "ConnectionClosed"
+    ])
+
+  def test_partial(self):
+    expected = summary(feed(P.RequestParser(), REQS, len(REQS)))
+    for n in [1, 2, 3, 7, 64]:
+      self.assertEqual(summary(feed(P.RequestParser(), REQS, n)),
+                       expected)
+
+  def test_head(self):
+    p = P.RequestParser()
+    p.receive_data(b"\r\nGET / HTTP/1.1\nHost: x\nX-Foo:  bar \n\n")
+    ev = p.next_event()
+    self.assertEqual(ev.version, "HTTP/1.1")
+    self.assertEqual(ev.headers, { "host": "x", "x-foo": "bar" })
+    self.assertIsInstance(p.next_event(), P.EndOfMessage)
+
+  def test_head_raw(self):
+    p = P.RequestParser()
+    p.receive_data(b"GET / HTTP/1.1\r\nHost: x\r\n\r\n"
+                   b"GET / HTTP/1.1\r\n\r\n")
+    self.assertEqual(p.next_event().headers.raw(), b"Host: x\r\n")
+    p.next_event()
+    self.assertEqual(p.next_event().headers.raw(), b"")
+    p = P.RequestParser()
+    p.receive_data(b"GET / HTTP/1.1\nHost: x\n\n")  # bare LFs
+    self.assertEqual(p.next_event().headers.raw(), None)
+
+  def test_head_latin1(self):
+    p = P.RequestParser()
+    p.receive_data(b"GET / HTTP/1.1\r\nX-Foo: \xe9\r\n\r\n")
+    self.assertEqual(p.next_event().headers["X-Foo"],
+                     b"\xe9".decode("latin-1") if str is not bytes
+                     else b"\xe9")
+
+  def test_size_hint(self):
+    p = P.RequestParser()
+    p.receive_data(b"POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\n12")
+    self.assertEqual(p.size_hint(), 0)
+    all_events(p)
+    self.assertEqual(p.size_hint(), 8)
+
+  def test_line_too_long(self):
+    p = P.RequestParser(max_line = 16)
+    p.receive_data(b"GET /" + b"x" * 16)
+    with self.assertRaises(P.RequestLineTooLong):
+      p.next_event()
+    p = P.RequestParser(max_line = 16)
+    p.receive_data(b"GET /" + b"x" * 12 + b"\r\nX: y\r\n\r\n")
+    with self.assertRaises(P.RequestLineTooLong):
+      p.next_event()
+    self.assertEqual(P.RequestLineTooLong.status, 414)
+    p = P.RequestParser(max_line = 16)
+    p.receive_data(b"GET / HTTP/1.1\r\nX-Foo: " + b"x" * 8 + b"\r\n")
+    self.assertIs(p.next_event(), P.NEED_DATA)
+    p.receive_data(b"\r\n")
+    with self.assertRaises(P.LineTooLong) as c:
+      p.next_event()
+    self.assertEqual(c.exception.status, 431)
+
+  def test_incomplete(self):
+    p = P.RequestParser()
+    p.receive_data(b"POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\n12")
+    p.receive_data(b"")
+    with self.assertRaisesRegexp(P.Error, "closed in the middle"):
+      all_events(p)
+
+  def test_invalid(self):
+    for x in [b"foo", b": foo", b"X-Foo: bar\r\n bar"]:
+      p = P.RequestParser()
+      p.receive_data(b"GET / HTTP/1.1\r\n" + x + b"\r\n\r\n")
+      with self.assertRaisesRegexp(P.Error, "invalid header line"):
+        all_events(p)
+
+  def test_limits(self):
+    head = b"GET / HTTP/1.1\r\n" + b"X-Foo: bar\r\n" * 10
+    p = P.RequestParser(max_header_size = 128)
+    p.receive_data(head)
+    with self.assertRaisesRegexp(P.HeadersTooLarge, "exceeds 128"):
+      p.next_event()
+    try:
+      p.next_event()
+    except P.Error as e:
+      self.assertTrue(e.in_head)
+    p = P.RequestParser(max_headers = 9)
+    p.receive_data(head + b"\r\n")
+    with self.assertRaisesRegexp(P.HeadersTooLarge, "more than 9"):
+      p.next_event()
+    p = P.RequestParser(max_header_size = 256, max_headers = 10)
+    p.receive_data(head + b"\r\n")
+    self.assertEqual(len(p.next_event().headers), 1)
+    self.assertEqual(P.HeadersTooLarge.status, 431)
+    self.assertEqual(P.BodyTooLarge.status, 413)
+
+  def test_invalid_content_length(self):
+    for x in [b"x", b"-1", b"1, 2", u"\u0661".encode("utf8"),
+              b"\xb2"]:
+      p = P.RequestParser()
+      p.receive_data(b"POST / HTTP/1.1\r\nContent-Length: " + x +
+                     b"\r\n\r\n")
+      with self.assertRaisesRegexp(P.Error, "invalid Content-Length"):
+        p.next_event()
+
+  def test_duplicate_content_length(self):
+    head = b"POST / HTTP/1.1\r\nContent-Length: 3\r\nX-Foo: 1\r\n"
+    p = P.RequestParser()
+    p.receive_data(head + b"content-length: 4\r\n\r\n")
+    with self.assertRaisesRegexp(P.Error, "conflicting"):
+      p.next_event()
+    p = P.RequestParser()
+    p.receive_data(head + b"Content-Length:  3\r\n\r\nfoo")
+    self.assertEqual(summary(all_events(p)),
+                     ["RequestHead", b"foo", "EndOfMessage"])
+
+  def test_transfer_encoding_and_content_length(self):
+    for p in [P.RequestParser(), P.ResponseParser()]:
+      start = b"POST / HTTP/1.1" if isinstance(p, P.RequestParser) \
+              else b"HTTP/1.1 200 OK"
+      p.receive_data(start + b"\r\nContent-Length: 3\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+      with self.assertRaisesRegexp(P.Error, "both Transfer-Enc"):
+        p.next_event()
+
+  def test_unsupported_transfer_encoding(self):
+    for x in [b"gzip", b"gzip, chunked", b"identity"]:
+      p = P.ResponseParser()
+      p.receive_data(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: " + x +
+                     b"\r\n\r\n")
+      with self.assertRaisesRegexp(P.Error,
+                                   "unsupported Transfer-Encoding"):
+        p.next_event()
+
+  def test_memoryview(self):
+    p = P.RequestParser()
+    p.receive_data(REQS[:65]); ev = all_events(p)[1]
+    self.assertIsInstance(ev.data, memoryview)
+    p.receive_data(REQS[65:])       # w/ the buffer still exported
+    self.assertEqual(bytes(bytearray(ev.data)), b"hello")
+    self.assertEqual(summary(all_events(p)),
+                     ["RequestHead", b"foobar!", "EndOfMessage"])
+                                                                # }}}1
+
+class Test_chunked(unittest.TestCase):                          # {{{1
+
+  def chunked(self, body, **kw):
+    p = P.RequestParser(**kw)
+    p.receive_data(b"POST / HTTP/1.1\r\n"
+                   b"Transfer-Encoding: chunked\r\n\r\n" + body)
+    return all_events(p)[1:]
+
+  def test_coalesce(self):
+    evs = self.chunked(b"3\r\nfoo\r\n4\r\nbar!\r\n0\r\n\r\n")
+    self.assertEqual(summary(evs), [b"foobar!", "EndOfMessage"])
+    self.assertEqual(evs[0].extensions, None)
+    self.assertEqual(evs[1].trailers, None)
+
+  def test_extensions(self):
+    evs = self.chunked(b'3 ; a=1;b = "x;\\"y"\r\nfoo\r\n'
+                       b'1;c\r\n!\r\n1\r\n?\r\n0;d=2\r\n\r\n')
+    self.assertEqual(summary(evs[:1]), [b"foo"])
+    self.assertEqual(evs[0].extensions,
+                     (("a", "1"), ("b", 'x;"y')))
+    self.assertEqual(evs[1].extensions, (("c", None),))
+    self.assertEqual(summary(evs[1:]), [b"!?", "EndOfMessage"])
+
+  def test_extensions_partial(self):
+    p = P.RequestParser()
+    p.receive_data(b"POST / HTTP/1.1\r\n"
+                   b"Transfer-Encoding: chunked\r\n\r\n3;x\r\n")
+    self.assertEqual(len(all_events(p)), 1)
+    p.receive_data(b"foo\r\n0\r\n\r\n")
+    self.assertEqual(p.next_event().extensions, (("x", None),))
+
+  def test_trailers(self):
+    data = b"3\r\nfoo\r\n0\r\nX-Foo: 1\r\nX-Bar:2\r\n\r\n"
+    for n in [1, 2, 5, len(data)]:
+      evs = summary(feed(P.RequestParser(), b"POST / HTTP/1.1\r\n"
+                         b"Transfer-Encoding: chunked\r\n\r\n" +
+                         data, n))
+      self.assertEqual(evs, ["RequestHead", b"foo", "EndOfMessage",
+                             "ConnectionClosed"])
+    ev = self.chunked(data)[1]
+    self.assertEqual(ev.trailers, { "x-foo": "1", "x-bar": "2" })
+
+  def test_invalid_size(self):
+    for x in [b"", b"x", b"0x3", b"-3", b"+3", b"1_0", b"1" * 17]:
+      with self.assertRaisesRegexp(P.Error, "invalid chunk size"):
+        self.chunked(x + b"\r\n")
+
+  def test_invalid_extension(self):
+    with self.assertRaisesRegexp(P.Error, "invalid chunk extension"):
+      self.chunked(b'3;a="foo\r\nfoo\r\n')
+
+  def test_size_line_too_long(self):
+    with self.assertRaises(P.LineTooLong):
+      self.chunked(b"3;" + b"x" * P.MAX_CHUNK_LINE)
+
+  def test_body_too_large(self):
+    self.chunked(b"8\r\n", max_body_size = 8)
+    with self.assertRaises(P.BodyTooLarge):
+      self.chunked(b"4\r\nfoo!\r\n5\r\n", max_body_size = 8)
+    p = P.RequestParser(max_body_size = 8)
+    p.receive_data(b"POST / HTTP/1.1\r\nContent-Length: 9\r\n\r\n")
+    with self.assertRaises(P.BodyTooLarge):
+      p.next_event()
+                                                                # }}}1
+
+class Test_ResponseParser(unittest.TestCase):                   # {{{1
+
+  def test_no_body(self):
+    data = b"HTTP/1.1 304 Not Modified\r\nContent-Length: 3\r\n\r\n" \
+           b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nfoo"
+    evs  = feed(P.ResponseParser(), data, 5)
+    self.assertEqual(evs[0].status, 304)
+    self.assertEqual(evs[0].reason, "Not Modified")
+    self.assertEqual(summary(evs), [
+      "ResponseHead", "EndOfMessage", "ResponseHead", b"foo",
+      "EndOfMessage", "ConnectionClosed"
+    ])
+                                                                # }}}1
+
+class Test_parser(unittest.TestCase):                           # {{{1
+
+  def test_events(self):
+    evs = P.events(P.RequestParser(), S.IBytesStream(REQS), 4)
+    self.assertEqual(summary(evs)[:3],
+                     ["RequestHead", b"hello", "EndOfMessage"])
+
+  def test_has_head(self):
+    p = P.RequestParser()
+    p.receive_data(b"POST / HTTP/1.1\r\nContent-Length: 3\r\n\r\n"
+                   b"foo\r\nGET / HTTP/1.1\r\n")
+    self.assertTrue(p.has_head())
+    self.assertIsInstance(p.next_event(), P.RequestHead)
+    self.assertFalse(p.has_head())
+    p.receive_data(b"\r\n")
+    self.assertTrue(p.has_head())   # w/ the body still unread
+
+  def test_events_pool(self):
+    p   = S.BufferPool(4)
+    evs = P.events(P.RequestParser(), S.IBytesStream(REQS), 4, p)
+    self.assertEqual(summary(evs)[:3],
+                     ["RequestHead", b"hello", "EndOfMessage"])
+    st  = p.stats()
+    self.assertEqual((st["misses"], st["in_use"]), (1, 0))
+    self.assertGreater(st["hits"], 0)
+                                                                # }}}1
+
+# ...
+
+if __name__ == "__main__":
+  unittest.main()
+
+# vim: set tw=70 sw=2 sts=2 et fdm=marker :
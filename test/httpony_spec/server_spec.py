@@ -9,9 +9,163 @@
 #
 # --                                                            ; }}}1
 
+import httpony.handler as H
 import httpony.server as S
+import httpony.stream as ST
+import os
+import socket
+import sys
+import threading
 import unittest
 
+X = H.Handler("X")
+streaming = threading.Event()
+
+@X.get("/stream")
+def get_stream(self):
+  def body():
+    yield "foo"; streaming.wait(5); yield "bar"
+  return dict(body = body())
+
+@X.any("/:id")
+def get_id(self, id):
+  return "id {}".format(id)
+
+# NB: counts the writes (sendmsg() calls) of the server
+class _Socket(object):
+  def __init__(self, sock):
+    self.sock = sock; self.sends = 0
+  def sendmsg(self, buffers):
+    self.sends += 1; return self.sock.sendmsg(buffers)
+  def __getattr__(self, name):
+    return getattr(self.sock, name)
+
+class _TCPServer(object):
+  scheme          = "http"
+  server_address  = ("localhost", 0)
+
+def serve(server, sock):
+  try:
+    server._requesthandler()(sock, ("localhost", 0), _TCPServer())
+  finally:
+    sock.close()
+
+class Test_Server(unittest.TestCase):                           # {{{1
+
+  def setUp(self):
+    self.stdout = sys.stdout; sys.stdout = open(os.devnull, "w")
+
+  def tearDown(self):
+    sys.stdout.close(); sys.stdout = self.stdout
+
+  def request(self, server, data):
+    a, b = socket.socketpair()
+    try:
+      t = threading.Thread(target = serve, args = (server, b))
+      a.sendall(data); a.shutdown(socket.SHUT_WR); t.start()
+      data = ST.ISocketStream(a).read(); t.join()
+    finally:
+      a.close()
+    return data
+
+  def test_pipelining(self):
+    reqs = b"".join(
+      "GET /{} HTTP/1.1\r\nHost: x\r\n\r\n".format(i).encode()
+      for i in range(10)
+    )
+    data = self.request(S.Server(X), reqs)
+    bodies = [ x.split(b"\r\n\r\n")[1]
+               for x in data.split(b"HTTP/1.1 200 OK\r\n")[1:] ]
+    self.assertEqual(bodies, [ "id {}".format(i).encode()
+                               for i in range(10) ])
+
+  @unittest.skipUnless(hasattr(socket.socket, "sendmsg"),
+                       "no sendmsg()")
+  def test_pipelining_one_write(self):
+    reqs = b"GET /1 HTTP/1.1\r\nHost: x\r\n\r\n" * 10
+    a, b = socket.socketpair(); c = _Socket(b)
+    try:
+      t = threading.Thread(target = serve, args = (S.Server(X), c))
+      a.sendall(reqs); a.shutdown(socket.SHUT_WR); t.start()
+      data = ST.ISocketStream(a).read(); t.join()
+    finally:
+      a.close()
+    self.assertEqual(data.count(b"HTTP/1.1 200 OK"), 10)
+    self.assertEqual(c.sends, 1)
+
+  def test_streaming_head(self):
+    a, b = socket.socketpair(); streaming.clear()
+    try:
+      t = threading.Thread(target = serve, args = (S.Server(X), b))
+      a.sendall(b"GET /stream HTTP/1.1\r\nConnection: close\r\n"
+                b"\r\n")
+      t.start(); a.settimeout(2); data = b""
+      while b"\r\n\r\n" not in data:  # before the body is done
+        x = a.recv(4096); data += x
+        if not x: break
+      streaming.set(); a.settimeout(None)
+      data += ST.ISocketStream(a).read(); t.join()
+    finally:
+      streaming.set(); a.close()
+    self.assertIn(b"Transfer-Encoding: chunked", data)
+    self.assertTrue(data.endswith(b"bar\r\n0\r\n\r\n"))
+
+  def test_limits(self):
+    s     = S.Server(X, limits = dict(max_headers = 4,
+                                      max_body_size = 8))
+    ok    = b"GET /1 HTTP/1.1\r\n\r\n"
+    cases = [
+      (b"GET /2 HTTP/1.1\r\n" + b"X-Foo: 1\r\n" * 5 + b"\r\n",
+       b"431 Request Header Fields Too Large"),
+      (b"POST /3 HTTP/1.1\r\nContent-Length: 9\r\n\r\n",
+       b"413 Request Entity Too Large"),
+      (b"GET /4 HTTP/1.1\r\nContent-Length: x\r\n\r\n",
+       b"400 Bad Request"),
+      (b"POST /5 HTTP/1.1\r\nContent-Length: 5\r\n"
+       b"Transfer-Encoding: chunked\r\n\r\n0\r\n\r\n",
+       b"400 Bad Request"),
+    ]
+    for req, status in cases:
+      data = self.request(s, ok + req + ok)
+      self.assertEqual(data.count(b"HTTP/1.1 "), 2)
+      self.assertIn(b"id 1", data)
+      self.assertIn(b"HTTP/1.1 " + status, data)
+      self.assertIn(b"Connection: close", data)
+
+  def test_limits_answered(self):
+    s     = S.Server(X, limits = dict(max_body_size = 8))
+    req   = b"POST /1 HTTP/1.1\r\nTransfer-Encoding: chunked\r\n" \
+            b"\r\n5\r\n12345\r\n5\r\n67890\r\n0\r\n\r\n"
+    data  = self.request(s, req + req)
+    self.assertEqual(data.count(b"HTTP/1.1 "), 1)
+    self.assertIn(b"id 1", data)
+
+  def test_bufsize(self):
+    rh = S.Server(X)._requesthandler()
+    self.assertEqual((rh.rbufsize, rh.wbufsize), (-1, 0))  # defaults
+    self.assertEqual(S.Server(X).bufsize, ST.DEFAULT_BUFSIZE)
+    rh = S.Server(X, bufsize = 65536)._requesthandler()
+    self.assertEqual((rh.rbufsize, rh.wbufsize), (65536, 65536))
+
+  def test_run_unknown_engine(self):
+    with self.assertRaisesRegexp(ValueError, "unknown engine"):
+      S.Server(X).run(engine = "gevent")
+
+  @unittest.skipIf(sys.version_info >= (3, 6), "python < 3.6 only")
+  def test_run_asyncio_engine_py2(self):
+    with self.assertRaisesRegexp(ValueError, "python >= 3.6"):
+      S.Server(X).run(engine = "asyncio")
+
+  def test_finish_response_pending(self):
+    class Awaitable(object):
+      closed = False
+      def close(self): self.closed = True
+    a = Awaitable()
+    with self.assertRaisesRegexp(TypeError, "asyncio engine"):
+      S.Server(X).finish_response(None, None, H.Pending(X, a))
+    self.assertTrue(a.closed)
+                                                                # }}}1
+
 # ...
 
 if __name__ == "__main__":
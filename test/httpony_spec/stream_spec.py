@@ -9,9 +9,17 @@
 #
 # --                                                            ; }}}1
 
+from contextlib import closing
 import httpony.stream as S
+import os
+import socket
+import tempfile
+import threading
 import unittest
 
+INDEX_HTML = os.path.join(os.path.dirname(__file__),
+                          "../../test-data/dir/index.html")
+
 def chunker(si):
   while True:
     n = int(si.readline())
@@ -25,6 +33,26 @@ class IBytesStream_(S.IBytesStream):                            # {{{1
     return S.IStream.readlines(self)
                                                                 # }}}1
 
+class Test_BufferPool(unittest.TestCase):                       # {{{1
+
+  def test_stats(self):
+    p = S.BufferPool(16, 1)
+    x = p.get(); y = p.get()
+    self.assertEqual(len(x), 16)
+    p.put(x); p.put(y)
+    self.assertIs(p.get(), x)
+    self.assertEqual(p.stats(), dict(hits = 1, misses = 2,
+                                     in_use = 1, high_water = 2,
+                                     free = 0, bufsize = 16))
+
+  def test_buffer(self):
+    p = S.BufferPool(16)
+    with p.buffer() as buf:
+      self.assertEqual(p.stats()["in_use"], 1)
+    self.assertEqual(p.stats()["in_use"], 0)
+    self.assertEqual(p.stats()["free"], 1)
+                                                                # }}}1
+
 class Test_IBytesStrean(unittest.TestCase):                     # {{{1
 
   def test_read(self):
@@ -37,6 +65,21 @@ class Test_IBytesStrean(unittest.TestCase):                     # {{{1
     y = b"foo bar"
     self.assertEqual(s.read(7), y)
 
+  def test_readinto(self):
+    s = S.IBytesStream("foo bar baz")
+    b = bytearray(7)
+    self.assertEqual(s.readinto(b), 7)
+    self.assertEqual(b, b"foo bar")
+    self.assertEqual(s.readinto(memoryview(b)[2:]), 4)
+    self.assertEqual(b, b"fo bazr")
+    self.assertEqual(s.readinto(b), 0)
+
+  def test_readinto_from_istream(self):
+    s = S.IStreamTakeChunks(iter([b"foo", b"bar"]))
+    b = bytearray(4)
+    self.assertEqual(S.IStream.readinto(s, b), 4)
+    self.assertEqual(b, b"foob")
+
   def test_readline(self):
     s = S.IBytesStream("foo\nbar\nbaz\n")
     y = b"foo\n"
@@ -44,6 +87,12 @@ class Test_IBytesStrean(unittest.TestCase):                     # {{{1
     self.assertEqual(s.readline(), y)
     self.assertEqual(s.readline(), z)
 
+  def test_readline_max_line(self):
+    s = S.IBytesStream("foo\nbar baz\n")
+    self.assertEqual(s.readline(4), b"foo\n")
+    with self.assertRaises(S.LineTooLong):
+      s.readline(4)
+
   def test_readlines(self):
     s = S.IBytesStream("foo\nbar\nbaz\n")
     y = [b"foo\n", b"bar\n", b"baz\n"]
@@ -59,6 +108,11 @@ class Test_IBytesStrean(unittest.TestCase):                     # {{{1
     y = [b"foo\nbar\n", b"baz\n"]
     self.assertEqual(list(s.readchunks(8)), y)
 
+  def test_readchunks_adaptive(self):
+    s = S.IBytesStream("x" * 100)
+    self.assertEqual([ len(x) for x in s.readchunks(8, 32) ],
+                     [8, 16, 32, 32, 12])
+
   def test_split_chunks(self):
     s     = S.IBytesStream("foo\nbar\nbaz\n")
     t, d  = s.split(10)
@@ -75,6 +129,20 @@ class Test_IBytesStrean(unittest.TestCase):                     # {{{1
     self.assertEqual(d.read(), z)
     self.assertEqual(list(t.readchunks(2)), y)
 
+  def test_split_readinto(self):
+    s     = S.IBytesStream("foo\nbar\nbaz\n")
+    t, d  = s.split(10, 2)
+    b     = bytearray(4)
+    self.assertEqual(t.peek(), b"fo")
+    self.assertEqual(t.readinto(b), 4)
+    self.assertEqual(b, b"foo\n")
+    self.assertEqual(t.readinto(b), 4)
+    self.assertEqual(b, b"bar\n")
+    self.assertEqual(t.readinto(b), 2)
+    self.assertEqual(b[:2], b"ba")
+    self.assertTrue(t.done())
+    self.assertEqual(d.read(), b"z\n")
+
   def test_split_readline(self):
     s     = S.IBytesStream("foo\nbar\nbaz\n")
     t, d  = s.split(10, 1)  # test bufsize too
@@ -85,6 +153,16 @@ class Test_IBytesStrean(unittest.TestCase):                     # {{{1
     self.assertEqual(d.readline(), z)
     self.assertEqual(t.readline(), y[2])
 
+  def test_split_readline_max_line(self):
+    s     = S.IBytesStream("foo\n" + "x" * 100 + "\nbar")
+    t, d  = s.split(105 + 3, 8)
+    self.assertEqual(t.readline(4), b"foo\n")
+    with self.assertRaises(S.LineTooLong):
+      t.readline(50)
+    self.assertEqual(t.readline(101), b"x" * 100 + b"\n")
+    self.assertEqual(t.readline(4), b"bar")
+    self.assertEqual(t.readline(4), b"")
+
   def test_split_readlines(self):
     s     = S.IBytesStream("foo\nbar\nbaz\n")
     t, d  = s.split(10)
@@ -93,6 +171,18 @@ class Test_IBytesStrean(unittest.TestCase):                     # {{{1
     self.assertEqual(list(t), y)
     self.assertEqual(list(d), z)
 
+  def test_split_peek_and_read_pieces(self):
+    x     = bytes(bytearray(97 + i % 26 for i in range(5000)))
+    s     = S.IBytesStream(x + b"rest")
+    t, d  = s.split(5000, 16)
+    self.assertEqual(t.peek(-1), x)
+    ys    = []
+    while not t.done():
+      self.assertEqual(t.peek(3), x[len(b"".join(ys)):][:3])
+      ys.append(t.read(7))
+    self.assertEqual(b"".join(ys), x)
+    self.assertEqual(d.read(), b"rest")
+
   def test_splitchunked(self):
     s     = S.IBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux")
     t, d  = s.splitchunked(chunker)
@@ -112,6 +202,29 @@ class Test_IBytesStrean(unittest.TestCase):                     # {{{1
                      [b"fo", b"ob", b"ar", b"\nb", b"az"])
     self.assertEqual(d.read(), b"qux")
 
+  def test_splitchunked_peek_and_read_pieces(self):
+    s     = S.IBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux")
+    t, d  = s.splitchunked(chunker, 2)
+    self.assertEqual(t.peek(4), b"foob")
+    self.assertEqual([ t.read(3) for i in range(4) ],
+                     [b"foo", b"bar", b"\nba", b"z"])
+    self.assertEqual(t.read(3), b"")
+    self.assertTrue(t.done())
+    self.assertEqual(d.read(), b"qux")
+
+  def test_splitchunked_readinto(self):
+    s     = S.IBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux")
+    t, d  = s.splitchunked(chunker)
+    b     = bytearray(5)
+    self.assertEqual(t.readinto(b), 5)
+    self.assertEqual(b, b"fooba")
+    self.assertEqual(t.peek(2), b"r\n")
+    self.assertEqual(t.readinto(b), 5)
+    self.assertEqual(b, b"r\nbaz")
+    self.assertEqual(t.readinto(b), 0)
+    self.assertTrue(t.done())
+    self.assertEqual(d.read(), b"qux")
+
   def test_splitchunked_readline(self):
     s     = S.IBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux")
     t, d  = s.splitchunked(chunker, 1)  # test bufsize too
@@ -121,6 +234,15 @@ class Test_IBytesStrean(unittest.TestCase):                     # {{{1
     self.assertEqual(d.readline(), z)
     self.assertEqual(t.readline(), y[1])
 
+  def test_splitchunked_readline_max_line(self):
+    s     = S.IBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux")
+    t, d  = s.splitchunked(chunker, 1)
+    with self.assertRaises(S.LineTooLong):
+      t.readline(6)
+    self.assertEqual(t.readline(7), b"foobar\n")
+    self.assertEqual(t.readline(7), b"baz")
+    self.assertTrue(t.done())
+
   def test_splitchunked_readlines(self):
     s     = S.IBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux")
     t, d  = s.splitchunked(chunker)
@@ -132,6 +254,177 @@ class Test_IBytesStrean(unittest.TestCase):                     # {{{1
   # ...
                                                                 # }}}1
 
+class Test_IConnectionStream(unittest.TestCase):                # {{{1
+
+  def test_split(self):
+    s     = S.IConnectionStream(S.IBytesStream("foo\nbar\nbaz\n"))
+    t, d  = s.split(4)
+    self.assertIs(d, s)
+    self.assertEqual(t.read(), b"foo\n")
+    self.assertEqual(d.readline(), b"bar\n")
+    self.assertEqual(d.read(), b"baz\n")
+
+  def test_split_forced(self):
+    s     = S.IConnectionStream(S.IBytesStream("foo\nbar\nbaz\n"))
+    t, d  = s.split(4)
+    u, e  = d.split(4)
+    self.assertIs(e, s)
+    self.assertEqual(e.read(), b"baz\n")
+    self.assertEqual(u.read(), b"bar\n")
+    self.assertEqual(t.read(), b"foo\n")
+
+  def test_split_does_not_nest(self):
+    s = S.IConnectionStream(S.IBytesStream("x" * 100))
+    for i in range(100):
+      t, d = s.split(1)
+      self.assertIs(d.parent, s.parent)
+    self.assertEqual(d.read(), b"")
+
+  def test_split_discard(self):
+    s     = S.IConnectionStream(S.IBytesStream("foo\nbar\nbaz\n"),
+                                "discard")
+    t, d  = s.split(8, 2)
+    self.assertEqual(t.read(2), b"fo")
+    self.assertEqual(d.read(), b"baz\n")
+    self.assertEqual(t.read(), b"")
+    self.assertTrue(t.done())
+
+  def test_split_spill(self):
+    s     = S.IConnectionStream(S.IBytesStream("foo\nbar\nbaz\n"),
+                                "spill", 2)
+    t, d  = s.split(8, 2)
+    self.assertEqual(t.read(2), b"fo")
+    self.assertEqual(d.read(), b"baz\n")
+    self.assertEqual(t.readline(), b"o\n")
+    self.assertFalse(t._spooled.file.closed)
+    self.assertEqual(t.read(), b"bar\n")
+    self.assertTrue(t._spooled.file.closed)
+
+  def test_splitchunked_discard(self):
+    s     = S.IConnectionStream(
+              S.IBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux"), "discard")
+    t, d  = s.splitchunked(chunker)
+    self.assertEqual(t.read(2), b"fo")
+    self.assertEqual(d.read(), b"qux")
+    self.assertEqual(t.read(), b"")
+
+  def test_splitchunked_spill(self):
+    s     = S.IConnectionStream(
+              S.IBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux"), "spill", 4)
+    t, d  = s.splitchunked(chunker, 2)
+    self.assertEqual(t.read(2), b"fo")
+    self.assertEqual(d.read(), b"qux")
+    self.assertEqual(t.read(), b"obar\nbaz")
+
+  def test_splitchunked_spill_done(self):
+    s     = S.IConnectionStream(
+              S.IBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux"),
+              "spill", 4)
+    t, d  = s.splitchunked(chunker, 2)
+    self.assertEqual(d.read(), b"qux")
+    self.assertFalse(t.done())
+    self.assertEqual(t.read(8), b"foobar\nb")
+    self.assertFalse(t.done())
+    self.assertEqual(t.read(8), b"az")
+    self.assertEqual(t.read(8), b"")
+    self.assertTrue(t.done())
+    self.assertTrue(t._spooled.file.closed)
+
+  def test_split_pool(self):
+    p     = S.BufferPool(4)
+    s     = S.IConnectionStream(S.IBytesStream("foo\nbar\nbaz\n"),
+                                "discard", pool = p)
+    t, d  = s.split(8)
+    self.assertEqual(t.read(2), b"fo")
+    self.assertEqual(d.read(), b"baz\n")
+    u, e  = s.split(0, 2)
+    self.assertEqual(p.stats()["misses"], 1)
+    self.assertEqual(p.stats()["in_use"], 0)
+
+  def test_split_spill_pool(self):
+    s     = S.IConnectionStream(S.IBytesStream("foo\nbar\nbaz\n"),
+                                "spill", 2, S.BufferPool(3))
+    t, d  = s.split(8, 2)
+    self.assertEqual(t.read(2), b"fo")
+    self.assertEqual(d.read(), b"baz\n")
+    self.assertEqual(t.read(), b"o\nbar\n")
+
+  def test_unread_unknown(self):
+    s     = S.IConnectionStream(S.IBytesStream("foo"), "keep")
+    t, d  = s.split(2)
+    with self.assertRaisesRegexp(ValueError, "unread must be one of"):
+      d.read()
+
+  def test_splitchunked(self):
+    s     = S.IConnectionStream(
+              S.IBytesStream("3\nfoo\n7\nbar\nbaz\n0\nqux"))
+    t, d  = s.splitchunked(chunker)
+    self.assertIs(d, s)
+    self.assertEqual(d.read(), b"qux")
+    self.assertEqual(t.read(), b"foobar\nbaz")
+                                                                # }}}1
+
+class Test_IMmapStream(unittest.TestCase):                      # {{{1
+
+  def setUp(self):
+    with open(INDEX_HTML, "rb") as f: self.data = f.read()
+    self.f = tempfile.NamedTemporaryFile()
+    self.addCleanup(self.f.close)
+    self.f.write(self.data); self.f.flush()
+    self.s = S.immap_stream(self.f.name)
+    self.addCleanup(self.s.close)
+
+  def test_read(self):
+    self.assertEqual(self.s.length(), len(self.data))
+    self.assertEqual(self.s.read(5), self.data[:5])
+    self.assertEqual(self.s.read(), self.data[5:])
+    self.assertEqual(self.s.read(), b"")
+
+  def test_readline(self):
+    lines = self.data.splitlines(True)
+    self.assertEqual(self.s.readline(), lines[0])
+    with self.assertRaises(S.LineTooLong):
+      self.s.readline(len(lines[1]) - 1)
+    self.assertEqual(list(self.s), lines[1:])
+
+  def test_readinto(self):
+    b = bytearray(10)
+    self.assertEqual(self.s.readinto(b), 10)
+    self.assertEqual(b, self.data[:10])
+
+  def test_peek_and_view(self):
+    self.assertEqual(bytes(self.s.peek(5)), self.data[:5])
+    self.assertEqual(bytes(self.s.view(3, 8)), self.data[3:8])
+    self.assertEqual(self.s.read(5), self.data[:5])
+
+  def test_peek_bufsize(self):
+    with closing(S.immap_stream(self.f.name, 16)) as s:
+      self.assertEqual(bytes(s.peek()), self.data[:16])
+      self.assertEqual(bytes(s.reader(4).peek()), self.data[4:20])
+
+  def test_reader(self):
+    r = self.s.reader(10, 20)
+    self.assertIs(r.map, self.s.map)
+    self.assertEqual(r.length(), 10)
+    self.assertEqual(r.read(), self.data[10:20])
+    self.assertEqual(bytes(r.view(2, 4)), self.data[12:14])
+    self.assertEqual(self.s.read(3), self.data[:3])
+
+  def test_shared_mapping(self):
+    with closing(S.immap_stream(self.f.name)) as s:
+      self.assertIs(s.map, self.s.map)
+    self.f.write(b"more"); self.f.flush()
+    with closing(S.immap_stream(self.f.name)) as s:
+      self.assertIsNot(s.map, self.s.map)
+      self.assertEqual(s.read()[-4:], b"more")
+
+  def test_empty(self):
+    with tempfile.NamedTemporaryFile() as f:
+      with closing(S.immap_stream(f.name)) as s:
+        self.assertEqual(s.length(), 0)
+        self.assertEqual(s.read(), b"")
+                                                                # }}}1
+
 class Test_OBytesStream(unittest.TestCase):                     # {{{1
 
   def test_write(self):
@@ -142,6 +435,112 @@ class Test_OBytesStream(unittest.TestCase):                     # {{{1
     self.assertEqual(s.getvalue(), y)
     s.write(z)
     self.assertEqual(s.getvalue(), y + z)
+
+  def test_writev(self):
+    s = S.OBytesStream()
+    self.assertEqual(s.writev([b"foo", b"", "bar"]), 6)
+    self.assertEqual(s.getvalue(), b"foobar")
+
+  def test_writev_joined(self):
+    s = S.OBytesStream(); write = s.write; sizes = []
+    s.write = lambda x: (sizes.append(len(x)), write(x))[1]
+    xs    = [b"foo"] * 30000 + [bytearray(b"x" * 70000), b"bar"]
+    data  = b"".join(bytes(x) for x in xs)
+    self.assertEqual(s.writev(xs), len(data))
+    self.assertEqual(sizes, [65535, 24465, 70000, 3])
+    self.assertEqual(s.getvalue(), data)
+
+  def test_sendfile(self):
+    s = S.OBytesStream()
+    self.assertEqual(s.sendfile(S.IBytesStream("foo bar"), 5), 5)
+    self.assertEqual(s.getvalue(), b"foo b")
+
+  def test_sendfile_pool(self):
+    s = S.OBytesStream(); s.pool = S.BufferPool(2)
+    self.assertEqual(s.sendfile(S.IBytesStream("foo bar"), 5), 5)
+    self.assertEqual(s.sendfile(S.IBytesStream("baz")), 3)
+    self.assertEqual(s.getvalue(), b"foo bbaz")
+    self.assertEqual(s.pool.stats()["hits"], 1)
+                                                                # }}}1
+
+class Test_OSocketStream(unittest.TestCase):                    # {{{1
+
+  def test_bufsize(self):
+    a, b = socket.socketpair()
+    try:
+      self.assertEqual(S.ISocketStream(a, 4096).bufsize, 4096)
+      self.assertEqual(S.OSocketStream(b, 8192).bufsize, 8192)
+    finally:
+      a.close(); b.close()
+
+  def test_writev(self):
+    a, b  = socket.socketpair()
+    xs    = [b"x" * 10000, b"", b"y", bytearray(b"z" * 3)] * 1000
+    data  = b"".join(bytes(x) for x in xs)
+    try:
+      so = S.OSocketStream(a); so.write(b"<")
+      t  = threading.Thread(target = lambda: (
+             so.writev(xs), so.write(b">"), so.flush(),
+             a.shutdown(socket.SHUT_WR)
+           ))
+      t.start()
+      self.assertEqual(S.ISocketStream(b).read(), b"<" + data + b">")
+      t.join()
+    finally:
+      a.close(); b.close()
+
+  def test_sendfile(self):
+    a, b  = socket.socketpair()
+    with open(INDEX_HTML, "rb") as f: data = f.read()
+    try:
+      so = S.OSocketStream(a); so.write(b"<")
+      si = S.ifile_stream(INDEX_HTML); self.addCleanup(si.close)
+      self.assertEqual(so.sendfile(si), len(data))
+      so.write(b">"); so.flush(); a.shutdown(socket.SHUT_WR)
+      self.assertEqual(S.ISocketStream(b).read(), b"<" + data + b">")
+    finally:
+      a.close(); b.close()
+                                                                # }}}1
+
+class _OCountingStream(S.OBytesStream):
+  def __init__(self):
+    super(_OCountingStream, self).__init__(); self.writevs = []
+  def writev(self, buffers):
+    self.writevs.append(len(buffers))
+    return super(_OCountingStream, self).writev(buffers)
+
+class Test_OBatchedStream(unittest.TestCase):                   # {{{1
+
+  def test_batch(self):
+    p   = _OCountingStream(); so = S.OBatchedStream(p)
+    buf = bytearray(b"y")
+    so.write(b"x"); so.write(buf); so.writev(["z", b"!"])
+    buf[0] = ord("?")
+    self.assertEqual(so.pending(), 4)
+    self.assertEqual(p.getvalue(), b"")
+    so.flush()
+    self.assertEqual(p.getvalue(), b"xyz!")
+    self.assertEqual(p.writevs, [4])
+    so.flush()
+    self.assertEqual(p.writevs, [4])
+
+  def test_max_size(self):
+    p = _OCountingStream(); so = S.OBatchedStream(p, 4)
+    so.write(b"foo"); so.write(b"bar"); so.write(b"baz")
+    self.assertEqual(p.getvalue(), b"foobar")
+    so.sendfile(S.IBytesStream(b"!"))
+    self.assertEqual(p.getvalue(), b"foobarbaz!")
+
+  def test_flushing(self):
+    p = _OCountingStream(); so = S.OBatchedStream(p)
+    si = S.IFlushingStream(S.IBytesStream(b"foo\nbar"), so)
+    so.write(b"1"); so.write(b"2")
+    self.assertEqual(si.readline(), b"foo\n")
+    self.assertEqual(p.getvalue(), b"12")
+    so.write(b"3")
+    self.assertEqual(si.read1(2), b"ba")
+    self.assertEqual(p.getvalue(), b"123")
+    self.assertEqual(p.writevs, [2, 1])
                                                                 # }}}1
 
 class Test_stream(unittest.TestCase):                           # {{{1
@@ -21,6 +21,11 @@ class Test_idict(unittest.TestCase):                            # {{{1
     self.assertEqual(x['fOO'], 42)
     self.assertEqual(x['Bar'], 37)
 
+  def test_from_items(self):
+    x = U.idict.from_items([("Foo", 42), ("Bar", 37)])
+    self.assertEqual(x['foo'], 42)
+    self.assertEqual(sorted(x.keys()), ["Bar", "Foo"])
+
   def test_set(self):
     x = U.idict(); x['Foo'] = 42; x['Bar'] = 37
     self.assertEqual(x['Foo'], 42)
@@ -87,12 +92,65 @@ class Test_idict(unittest.TestCase):                            # {{{1
     self.assertEqual(str(x), "idict({'x': 42})")
                                                                 # }}}1
 
+RAW = b"Host: x\r\nX-FOO:  bar \r\n" \
+      b"Accept: a\r\naccept: b\r\n"
+
+class Test_raw_idict(unittest.TestCase):                        # {{{1
+
+  def test_lookup(self):
+    x = U.raw_idict(RAW)
+    self.assertEqual(x["host"], "x")
+    self.assertEqual(x.get("x-foo"), "bar")
+    self.assertEqual(x.get("Accept"), "b")
+    self.assertEqual(x.get("nope", 42), 42)
+    self.assertIn("X-Foo", x)
+    self.assertNotIn("Foo", x)
+    with self.assertRaises(KeyError): x["nope"]
+    self.assertNotIn("_data", vars(x))            # not decoded
+    self.assertEqual(x.raw(), RAW)
+
+  def test_decode(self):
+    x = U.raw_idict(RAW)
+    self.assertEqual(len(x), 3)
+    self.assertEqual(sorted(x), ["Host", "X-FOO", "accept"])
+    self.assertEqual(x, { "host": "x", "x-foo": "bar",
+                          "accept": "b" })
+    self.assertEqual(x.raw(), RAW)
+
+  def test_modify(self):
+    x = U.raw_idict(RAW); y = x.copy(); x["Foo"] = "baz"
+    self.assertEqual(x.raw(), None)
+    self.assertEqual(x["foo"], "baz")
+    self.assertEqual(x["Host"], "x")
+    del x["host"]
+    self.assertNotIn("Host", x)
+    self.assertIsInstance(x.copy(), U.idict)
+    self.assertEqual(x.copy(), x)
+    self.assertEqual(y.raw(), RAW)
+    self.assertEqual(U.idict().raw(), None)
+                                                                # }}}1
+
 class X(U.Immutable):
   __slots__ = "foo bar baz".split()
 
 class Y(X):
   args_are_mandatory = True
 
+class Z(U.Immutable):
+  __slots__ = "foo _bar".split()
+
+class Test_LRUCache(unittest.TestCase):                         # {{{1
+
+  def test_lru(self):
+    c = U.LRUCache(2); c["x"] = 1; c["y"] = 2
+    self.assertEqual(c.get("x"), 1)
+    c["z"] = 3
+    self.assertEqual(len(c), 2)
+    self.assertEqual(c.get("y"), None)
+    self.assertEqual(c.get("x"), 1)
+    self.assertEqual(c.get("z"), 3)
+                                                                # }}}1
+
 class Test_Immutable(unittest.TestCase):                        # {{{1
 
   def test_init_ok(self):
@@ -107,6 +165,17 @@ class Test_Immutable(unittest.TestCase):                        # {{{1
     with self.assertRaisesRegexp(TypeError, "missing keys"):
       Y(foo = 42)
 
+  def test_slot_table(self):
+    self.assertEqual(Z._slot_table(), (("foo",), ("_bar",)))
+    self.assertIs(Z._slot_table(), Z._slot_table())
+    self.assertEqual(Z(foo = 1)._bar, None)
+    with self.assertRaisesRegexp(TypeError, "unknown keys"):
+      Z(_bar = 2)
+
+  def test_make(self):
+    z = Z._make(_bar = 2)
+    self.assertEqual((z.foo, z._bar), (None, 2))
+
   def test_no_setattr(self):
     x = X()
     with self.assertRaisesRegexp(AttributeError, "'X' object " +